@@ -0,0 +1,153 @@
+"""
+Concurrent Upload Benchmark
+Measures throughput and tail latency of image uploads per executor backend
+
+Starts the API under uvicorn once per IMAGE_EXECUTOR backend, fires
+concurrent uploads at /api/ai-extraction/extract-colors (no LLM call) and
+probes /health at the same time, so a blocked event loop shows up as
+health-check latency.
+
+Usage:
+    python benchmarks/bench_concurrent_uploads.py --concurrency 32 --requests 256
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List
+
+import httpx
+from PIL import Image, ImageDraw
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def make_upload(width: int = 3840, height: int = 2160) -> bytes:
+    """Build a screenshot-like PNG upload"""
+    image = Image.new("RGB", (width, height), (245, 246, 248))
+    draw = ImageDraw.Draw(image)
+    for y in range(0, height, 48):
+        draw.rectangle((40, y + 8, width - 40, y + 30), fill=((y * 7) % 255, 90, 160))
+        draw.text((60, y + 12), "AI Wonderland benchmark row %d" % y, fill=(20, 20, 20))
+    buffered = io.BytesIO()
+    image.save(buffered, format="PNG")
+    return buffered.getvalue()
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def wait_until_ready(client: httpx.AsyncClient, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("Server did not become ready")
+
+
+async def drive(base_url: str, payload: bytes, concurrency: int, total: int) -> Dict[str, Any]:
+    upload_latencies: List[float] = []
+    health_latencies: List[float] = []
+    errors = 0
+    remaining = total
+    done = asyncio.Event()
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=120.0) as client:
+        await wait_until_ready(client)
+
+        async def uploader() -> None:
+            nonlocal remaining, errors
+            while remaining > 0:
+                remaining -= 1
+                started = time.perf_counter()
+                response = await client.post(
+                    "/api/ai-extraction/extract-colors",
+                    files={"file": ("bench.png", payload, "image/png")}
+                )
+                upload_latencies.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    errors += 1
+
+        async def prober() -> None:
+            while not done.is_set():
+                started = time.perf_counter()
+                await client.get("/health")
+                health_latencies.append(time.perf_counter() - started)
+                await asyncio.sleep(0.05)
+
+        probe_task = asyncio.create_task(prober())
+        started = time.perf_counter()
+        await asyncio.gather(*(uploader() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await probe_task
+
+    return {
+        "requests": total,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "rps": round(total / elapsed, 2),
+        "upload_p50_ms": round(percentile(upload_latencies, 50) * 1000, 1),
+        "upload_p99_ms": round(percentile(upload_latencies, 99) * 1000, 1),
+        "health_p50_ms": round(percentile(health_latencies, 50) * 1000, 1),
+        "health_p99_ms": round(percentile(health_latencies, 99) * 1000, 1)
+    }
+
+
+def run_backend(backend: str, payload: bytes, args: argparse.Namespace) -> Dict[str, Any]:
+    port = free_port()
+    env = dict(os.environ)
+    env.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    env["IMAGE_EXECUTOR"] = backend
+    env["IMAGE_QUEUE_SIZE"] = str(max(args.concurrency, 64))
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env=env
+    )
+    try:
+        result = asyncio.run(drive(f"http://127.0.0.1:{port}", payload, args.concurrency, args.requests))
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+    result["backend"] = backend
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=256)
+    parser.add_argument("--backends", default="inline,thread,process")
+    args = parser.parse_args()
+
+    payload = make_upload()
+    print(f"upload size: {len(payload)} bytes", file=sys.stderr)
+    results = [run_backend(backend, payload, args) for backend in args.backends.split(",")]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Downscale Benchmark
+Compares transform time and output SSIM for each resize mode
+
+Each mode's output is compared against the "quality" mode (full decode +
+LANCZOS) at the same target size. Requires numpy.
+
+Usage:
+    python benchmarks/bench_downscale.py --repeat 5
+"""
+
+import argparse
+import io
+import json
+import os
+import sys
+import time
+from typing import List, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.image_processor import JPEG_QUALITY, MAX_DIMENSION, RESIZE_MODES, transform_image  # noqa: E402
+from utils.processed_image import ProcessedImage  # noqa: E402
+from utils.resize_planner import DETAIL_PRESET, plan_resize  # noqa: E402
+
+SIZES = [(2560, 1440), (3840, 2160), (5120, 2880), (7680, 4320)]
+
+
+def make_screenshot(width: int, height: int, image_format: str = "JPEG") -> bytes:
+    """Synthetic UI screenshot with text, gradients and sharp edges"""
+    image = Image.new("RGB", (width, height), (248, 249, 251))
+    draw = ImageDraw.Draw(image)
+    unit = max(1, width // 160)
+    for row, y in enumerate(range(0, height, unit * 12)):
+        shade = (row * 37) % 200
+        draw.rectangle((unit * 4, y + unit, width - unit * 4, y + unit * 9), outline=(shade, 80, 200), width=unit // 2 + 1)
+        for x in range(unit * 8, width - unit * 40, unit * 30):
+            draw.text((x, y + unit * 3), "Lorem ipsum dolor", fill=(30, 30, 30))
+    gradient = np.linspace(0, 255, width, dtype=np.uint8)
+    pixels = np.asarray(image).copy()
+    pixels[: height // 6, :, 2] = gradient
+    buffered = io.BytesIO()
+    Image.fromarray(pixels).save(buffered, format=image_format, quality=92)
+    return buffered.getvalue()
+
+
+def decode(result: ProcessedImage) -> np.ndarray:
+    return np.asarray(Image.open(io.BytesIO(result.data)).convert("L"), dtype=np.float64)
+
+
+def box_filter(values: np.ndarray, window: int) -> np.ndarray:
+    """Mean over every window x window block (valid region only)"""
+    summed = values.cumsum(axis=0).cumsum(axis=1)
+    summed = np.pad(summed, ((1, 0), (1, 0)))
+    total = (
+        summed[window:, window:] - summed[:-window, window:]
+        - summed[window:, :-window] + summed[:-window, :-window]
+    )
+    return total / (window * window)
+
+
+def ssim(first: np.ndarray, second: np.ndarray, window: int = 8) -> float:
+    """Mean structural similarity of two greyscale images"""
+    c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+    mean_x, mean_y = box_filter(first, window), box_filter(second, window)
+    var_x = box_filter(first * first, window) - mean_x ** 2
+    var_y = box_filter(second * second, window) - mean_y ** 2
+    covariance = box_filter(first * second, window) - mean_x * mean_y
+    score = ((2 * mean_x * mean_y + c1) * (2 * covariance + c2)) / (
+        (mean_x ** 2 + mean_y ** 2 + c1) * (var_x + var_y + c2)
+    )
+    return float(score.mean())
+
+
+def time_mode(content: bytes, mode: str, repeat: int, preset: str = DETAIL_PRESET) -> Tuple[float, ProcessedImage]:
+    source = Image.open(io.BytesIO(content))
+    plan = plan_resize(source.width, source.height, preset, MAX_DIMENSION)
+    timings: List[float] = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        # Always JPEG, so SSIM differences come from the resize mode alone
+        result = transform_image(content, source.format, (plan.width, plan.height), JPEG_QUALITY, mode, "jpeg")
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--preset", default=DETAIL_PRESET, help="detail preset deciding the output size")
+    args = parser.parse_args()
+
+    rows = []
+    for width, height in SIZES:
+        content = make_screenshot(width, height)
+        reference_time, reference = time_mode(content, "quality", args.repeat, args.preset)
+        reference_pixels = decode(reference)
+        for mode in RESIZE_MODES:
+            elapsed, result = (reference_time, reference) if mode == "quality" else time_mode(content, mode, args.repeat, args.preset)
+            rows.append({
+                "source": f"{width}x{height}",
+                "output": f"{result.width}x{result.height}",
+                "mode": mode,
+                "ms": round(elapsed * 1000, 1),
+                "speedup": round(reference_time / elapsed, 2),
+                "ssim": round(ssim(reference_pixels, decode(result)), 4)
+            })
+    print(json.dumps(rows, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Output Encoding Benchmark
+Reports encoded bytes and encode time per format on a screenshot corpus
+
+Pass a directory of real screenshots with --corpus; without it a small
+synthetic corpus of UI screens plus one photographic image is generated.
+
+Usage:
+    python benchmarks/bench_encoding.py --corpus ~/screenshots
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from typing import Dict, List, Tuple
+
+from PIL import Image, ImageDraw, ImageFilter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.image_processor import OUTPUT_FORMATS, encode_image, is_flat_content  # noqa: E402
+
+
+def synthetic_corpus() -> List[Tuple[str, Image.Image]]:
+    """Dashboard, form, landing page and photo images at model-ready sizes"""
+    rng = random.Random(7)
+    corpus = []
+    for name, (width, height), rows in [("dashboard", (1365, 768), 14), ("form", (1024, 640), 8), ("landing", (768, 1365), 20)]:
+        image = Image.new("RGB", (width, height), (248, 250, 252))
+        draw = ImageDraw.Draw(image)
+        draw.rectangle((0, 0, width, 56), fill=(17, 24, 39))
+        draw.text((24, 20), "AI Wonderland", fill=(255, 255, 255))
+        step = (height - 80) // rows
+        for row in range(rows):
+            top = 72 + row * step
+            draw.rounded_rectangle((24, top, width - 24, top + step - 8), 8, fill=(255, 255, 255), outline=(226, 232, 240))
+            draw.text((40, top + 10), f"Item {row} - " + "lorem ipsum " * rng.randint(2, 6), fill=(51, 65, 85))
+            draw.rounded_rectangle((width - 160, top + 8, width - 40, top + step - 16), 6, fill=(37, 99, 235))
+        corpus.append((name, image))
+
+    noise = Image.merge("RGB", [Image.effect_noise((1365 // 4, 768 // 4), sigma) for sigma in (48, 64, 80)])
+    photo = noise.resize((1365, 768), Image.Resampling.BICUBIC).filter(ImageFilter.GaussianBlur(1.5))
+    corpus.append(("photo", photo))
+    return corpus
+
+
+def load_corpus(directory: str) -> List[Tuple[str, Image.Image]]:
+    corpus = []
+    for name in sorted(os.listdir(directory)):
+        try:
+            corpus.append((name, Image.open(os.path.join(directory, name)).convert("RGB")))
+        except OSError:
+            continue
+    return corpus
+
+
+def measure(image: Image.Image, output_format: str, repeat: int) -> Dict:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        encoded, chosen = encode_image(image, output_format)
+        timings.append(time.perf_counter() - started)
+    return {"bytes": len(encoded), "ms": round(min(timings) * 1000, 1), "chosen": chosen}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", help="Directory of screenshots")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus) if args.corpus else synthetic_corpus()
+    rows = []
+    for name, image in corpus:
+        row = {"image": name, "size": f"{image.width}x{image.height}", "flat": is_flat_content(image)}
+        for output_format in OUTPUT_FORMATS:
+            row[output_format] = measure(image, output_format, args.repeat)
+        rows.append(row)
+    print(json.dumps(rows, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,398 @@
+"""
+End-to-End Benchmark
+Throughput, latency percentiles, CPU and peak RSS of the whole API per concurrency level
+
+Starts main:app under uvicorn once per concurrency level, with the model
+calls answered by the in-process fake LLM server (LLM_FAKE_SERVER=asgi)
+so the real SDK and streaming paths run without network or cost, and
+drives a mixed workload of conversion, extraction and export requests
+with synthetic screenshots of several sizes and formats. Caches are off
+unless --warm is given, so every request does the full work.
+
+CPU and peak RSS cover the server process and its children (the image
+process pool), sampled from /proc; they are null where /proc is missing.
+
+Results are JSON. Pass a previous run with --baseline to compare: any
+level whose throughput drops, or whose p95/p99 latency, CPU per request
+or peak RSS grows, by more than --threshold is reported and the script
+exits with status 1.
+
+Usage:
+    python benchmarks/bench_end_to_end.py --levels 1,8,32 --requests 200 --output e2e.json
+    python benchmarks/bench_end_to_end.py --output new.json --baseline e2e.json --threshold 0.15
+"""
+
+import argparse
+import asyncio
+import io
+import itertools
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+from PIL import Image, ImageDraw
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SIZES = [(800, 600), (1920, 1080), (3840, 2160)]
+FORMATS = ["PNG", "JPEG", "WEBP"]
+MIME_TYPES = {"PNG": "image/png", "JPEG": "image/jpeg", "WEBP": "image/webp"}
+
+EXPORT_CODE = "export default function App() {\n  return <main className=\"app\">Benchmark</main>;\n}\n" * 40
+
+# Lower is better for every compared metric except throughput
+COMPARED = [("rps", -1), ("p95_ms", 1), ("p99_ms", 1), ("cpu_ms_per_request", 1), ("peak_rss_mb", 1)]
+
+Upload = Tuple[str, bytes, str]
+Request = Callable[[httpx.AsyncClient, Upload], Any]
+
+
+def make_screenshot(width: int, height: int, image_format: str) -> bytes:
+    """Synthetic UI screenshot: nav bar, cards with text and buttons"""
+    image = Image.new("RGB", (width, height), (246, 247, 250))
+    draw = ImageDraw.Draw(image)
+    unit = max(1, width // 100)
+    draw.rectangle((0, 0, width, unit * 6), fill=(32, 40, 64))
+    draw.text((unit * 2, unit * 2), "AI Wonderland", fill=(255, 255, 255))
+    for row, y in enumerate(range(unit * 10, height - unit * 12, unit * 14)):
+        for column, x in enumerate(range(unit * 2, width - unit * 30, unit * 32)):
+            draw.rectangle((x, y, x + unit * 30, y + unit * 12), fill=(255, 255, 255), outline=(210, 214, 222))
+            draw.text((x + unit, y + unit), f"Card {row}.{column}", fill=(20, 24, 32))
+            draw.text((x + unit, y + unit * 4), "Lorem ipsum dolor sit amet", fill=(90, 96, 110))
+            shade = (row * 40 + column * 25) % 200
+            draw.rectangle((x + unit, y + unit * 8, x + unit * 10, y + unit * 11), fill=(shade, 110, 230))
+    buffered = io.BytesIO()
+    image.save(buffered, format=image_format, quality=90)
+    return buffered.getvalue()
+
+
+def make_corpus() -> List[Upload]:
+    return [
+        (f"screen-{width}x{height}.{image_format.lower()}", make_screenshot(width, height, image_format), MIME_TYPES[image_format])
+        for width, height in SIZES
+        for image_format in FORMATS
+    ]
+
+
+def upload(path: str, extra: Optional[Dict[str, str]] = None) -> Request:
+    def send(client: httpx.AsyncClient, item: Upload) -> Any:
+        return client.post(path, files={"file": item}, data=extra or {})
+    return send
+
+
+def export(path: str) -> Request:
+    def send(client: httpx.AsyncClient, item: Upload) -> Any:
+        body = {"code": EXPORT_CODE, "framework": "react", "projectName": "benchmark-app"}
+        return client.post(path, json=body)
+    return send
+
+
+SCENARIOS: Dict[str, Request] = {
+    "convert": upload("/api/image-to-code/convert", {"framework": "react", "model": "gpt-4o"}),
+    "elements": upload("/api/ai-extraction/extract-elements"),
+    "colors": upload("/api/ai-extraction/extract-colors"),
+    "typography": upload("/api/ai-extraction/extract-typography"),
+    "export-files": export("/api/export/generate-files"),
+    "export-zip": export("/api/export/download-zip")
+}
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize(latencies: List[float], elapsed: float, errors: int, busy: int) -> Dict[str, Any]:
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "busy": busy,
+        "rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1)
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def process_tree(pid: int) -> List[int]:
+    """The process and all of its descendants, from /proc"""
+    pids = [pid]
+    for current in pids:
+        try:
+            for task in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{task}/children") as children:
+                    pids.extend(int(child) for child in children.read().split())
+        except OSError:
+            continue
+    return pids
+
+
+def tree_usage(pid: int) -> Optional[Tuple[float, int]]:
+    """CPU seconds and resident bytes summed over the process tree, or None without /proc"""
+    if not os.path.isdir(f"/proc/{pid}"):
+        return None
+    ticks = os.sysconf("SC_CLK_TCK")
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    cpu = 0.0
+    rss = 0
+    for current in process_tree(pid):
+        try:
+            with open(f"/proc/{current}/stat") as stat:
+                # The command name may contain spaces, so split after its closing parenthesis
+                fields = stat.read().rpartition(")")[2].split()
+            cpu += (int(fields[11]) + int(fields[12])) / ticks
+            rss += int(fields[21]) * page_size
+        except (OSError, IndexError, ValueError):
+            continue
+    return cpu, rss
+
+
+async def wait_until_ready(client: httpx.AsyncClient, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("Server did not become ready")
+
+
+async def drive(
+    base_url: str,
+    server_pid: int,
+    corpus: List[Upload],
+    scenarios: List[str],
+    concurrency: int,
+    args: argparse.Namespace
+) -> Dict[str, Any]:
+    headers = {} if args.warm else {"X-LLM-Cache": "bypass"}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    latencies: Dict[str, List[float]] = {name: [] for name in scenarios}
+    errors = dict.fromkeys(scenarios, 0)
+    busy = dict.fromkeys(scenarios, 0)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=300.0, headers=headers, limits=limits) as client:
+        await wait_until_ready(client)
+
+        async def run(jobs: "itertools.count[int]", total: int, record: bool) -> None:
+            for index in jobs:
+                if index >= total:
+                    return
+                # Different strides, so every scenario sees every image
+                name = scenarios[index % len(scenarios)]
+                item = corpus[(index // len(scenarios) + index) % len(corpus)]
+                started = time.perf_counter()
+                try:
+                    response = await SCENARIOS[name](client, item)
+                    status = response.status_code
+                except httpx.HTTPError:
+                    status = 0
+                if not record:
+                    continue
+                latencies[name].append(time.perf_counter() - started)
+                if status == 503:
+                    busy[name] += 1
+                elif status != 200:
+                    errors[name] += 1
+
+        # Warm up the worker pool, connections and imports outside the measurement
+        warmup = itertools.count()
+        await asyncio.gather(*(run(warmup, args.warmup, False) for _ in range(concurrency)))
+
+        peak_rss = 0
+        sampling = True
+
+        async def sampler() -> None:
+            nonlocal peak_rss
+            while sampling:
+                usage = tree_usage(server_pid)
+                if usage is not None:
+                    peak_rss = max(peak_rss, usage[1])
+                await asyncio.sleep(args.sample_interval)
+
+        before = tree_usage(server_pid)
+        sample_task = asyncio.create_task(sampler())
+        jobs = itertools.count()
+        started = time.perf_counter()
+        await asyncio.gather(*(run(jobs, args.requests, True) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        after = tree_usage(server_pid)
+        sampling = False
+        await sample_task
+
+    every = [latency for name in scenarios for latency in latencies[name]]
+    result = {"concurrency": concurrency, "elapsed_s": round(elapsed, 3)}
+    result.update(summarize(every, elapsed, sum(errors.values()), sum(busy.values())))
+    if before is not None and after is not None:
+        cpu = after[0] - before[0]
+        result["cpu_s"] = round(cpu, 3)
+        result["cpu_percent"] = round(cpu / elapsed * 100, 1)
+        result["cpu_ms_per_request"] = round(cpu / max(1, len(every)) * 1000, 2)
+        result["peak_rss_mb"] = round(max(peak_rss, after[1]) / 1048576, 1)
+    else:
+        result.update(cpu_s=None, cpu_percent=None, cpu_ms_per_request=None, peak_rss_mb=None)
+    result["scenarios"] = {
+        name: summarize(latencies[name], elapsed, errors[name], busy[name])
+        for name in scenarios
+    }
+    return result
+
+
+def server_env(concurrency: int, args: argparse.Namespace) -> Dict[str, str]:
+    env = dict(os.environ)
+    env["LLM_FAKE_SERVER"] = "asgi"
+    env["FAKE_LLM_LATENCY"] = args.llm_latency
+    env["FAKE_LLM_TOKENS_PER_SECOND"] = str(args.tokens_per_second)
+    env["FAKE_LLM_SEED"] = str(args.seed)
+    env.setdefault("LLM_PROVIDERS", "openai")
+    # Measure the service, not the default per-model budget against a real account
+    env.setdefault("LLM_RPM", "0")
+    env.setdefault("IMAGE_QUEUE_SIZE", str(max(concurrency, 64)))
+    if not args.warm:
+        env["IMAGE_CACHE_MAX_BYTES"] = "0"
+        env["LLM_CACHE_MAX_BYTES"] = "0"
+        env["LLM_CACHE_PATH"] = ""
+    return env
+
+
+def run_level(concurrency: int, corpus: List[Upload], scenarios: List[str], args: argparse.Namespace) -> Dict[str, Any]:
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env=server_env(concurrency, args)
+    )
+    try:
+        return asyncio.run(drive(f"http://127.0.0.1:{port}", server.pid, corpus, scenarios, concurrency, args))
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float, min_delta_ms: float) -> List[str]:
+    """Regressions of `current` against `baseline`, one line each, for levels run in both"""
+    if current["config"] != baseline.get("config"):
+        print("warning: baseline was run with a different configuration", file=sys.stderr)
+    previous = {level["concurrency"]: level for level in baseline.get("levels", [])}
+    regressions = []
+    for level in current["levels"]:
+        old = previous.get(level["concurrency"])
+        if old is None:
+            continue
+        for metric, direction in COMPARED:
+            new_value, old_value = level.get(metric), old.get(metric)
+            if new_value is None or old_value is None or old_value <= 0:
+                continue
+            change = (new_value - old_value) / old_value * direction
+            # Tiny latencies are noisy in relative terms
+            if metric.endswith("_ms") and abs(new_value - old_value) < min_delta_ms:
+                continue
+            if change > threshold:
+                regressions.append(
+                    f"concurrency {level['concurrency']}: {metric} {old_value} -> {new_value} ({change:+.0%} worse)"
+                )
+        if level["errors"] > old.get("errors", 0):
+            regressions.append(f"concurrency {level['concurrency']}: errors {old.get('errors', 0)} -> {level['errors']}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--levels", default="1,4,16,32", help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=120, help="measured requests per level")
+    parser.add_argument("--warmup", type=int, default=12, help="unmeasured requests per level")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma-separated subset of: " + ", ".join(SCENARIOS))
+    parser.add_argument("--llm-latency", default="lognormal:400,0.4", help="fake LLM time to first token, see utils.fake_llm_server")
+    parser.add_argument("--tokens-per-second", type=float, default=400)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--warm", action="store_true", help="keep the image and LLM response caches on")
+    parser.add_argument("--sample-interval", type=float, default=0.1, help="seconds between RSS samples")
+    parser.add_argument("--output", help="write the JSON results here as well as to stdout")
+    parser.add_argument("--baseline", help="previous results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.15, help="relative change counted as a regression")
+    parser.add_argument("--min-delta-ms", type=float, default=5.0, help="latency changes smaller than this are ignored")
+    args = parser.parse_args()
+
+    scenarios = args.scenarios.split(",")
+    unknown = [name for name in scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+
+    corpus = make_corpus()
+    for name, data, _ in corpus:
+        print(f"{name}: {len(data)} bytes", file=sys.stderr)
+
+    levels = []
+    for concurrency in (int(level) for level in args.levels.split(",")):
+        result = run_level(concurrency, corpus, scenarios, args)
+        print(
+            f"concurrency {concurrency}: {result['rps']} req/s, p95 {result['p95_ms']} ms, "
+            f"{result['errors']} errors, {result['busy']} busy",
+            file=sys.stderr
+        )
+        levels.append(result)
+
+    report = {
+        "commit": git_commit(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "config": {
+            "requests": args.requests,
+            "scenarios": scenarios,
+            "llm_latency": args.llm_latency,
+            "tokens_per_second": args.tokens_per_second,
+            "seed": args.seed,
+            "warm": args.warm,
+            "corpus": [name for name, _, _ in corpus]
+        },
+        "levels": levels
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as handle:
+            handle.write(output + "\n")
+
+    if args.baseline:
+        with open(args.baseline) as handle:
+            baseline = json.load(handle)
+        regressions = compare(report, baseline, args.threshold, args.min_delta_ms)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print(f"no regressions against {baseline.get('commit') or args.baseline}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
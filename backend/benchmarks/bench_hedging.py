@@ -0,0 +1,107 @@
+"""
+Hedging Benchmark
+Measures upstream latency percentiles with and without retries and hedging
+
+Calls go through utils.resilience against the in-process fake client with
+injected slow calls and failures, so the tail the hedge is meant to cut
+is reproducible offline. Each mode warms the latency history first so
+hedges start at the measured p95.
+
+Usage:
+    python benchmarks/bench_hedging.py --requests 1000 --slow-rate 0.05 --error-rate 0.02
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import resilience  # noqa: E402
+from utils.fake_llm import FakeAsyncOpenAI  # noqa: E402
+
+MESSAGES = [{"role": "user", "content": "Convert this image"}]
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    samples = sorted(samples)
+    pick = lambda q: round(samples[min(len(samples) - 1, int(q * len(samples)))] * 1000, 1)
+    return {"p50_ms": pick(0.50), "p95_ms": pick(0.95), "p99_ms": pick(0.99), "max_ms": pick(1.0)}
+
+
+async def run_mode(args: argparse.Namespace, max_attempts: int, hedge: bool) -> Dict[str, object]:
+    client = FakeAsyncOpenAI(
+        content="x" * 400,
+        latency_ms=args.latency_ms,
+        tokens_per_second=1e6,
+        error_rate=args.error_rate,
+        slow_rate=args.slow_rate,
+        slow_factor=args.slow_factor,
+        seed=7
+    )
+    resilience.latency_tracker = resilience.LatencyTracker()
+    resilience.counters = resilience.ResilienceCounters()
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies: List[float] = []
+    failures = 0
+
+    async def one(record: bool) -> None:
+        nonlocal failures
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await resilience.call_with_retries(
+                    lambda: client.chat.completions.create(model="fake", messages=MESSAGES),
+                    latency_key="bench",
+                    timeout=args.timeout,
+                    max_attempts=max_attempts,
+                    hedge=hedge
+                )
+            except Exception:
+                if record:
+                    failures += 1
+                return
+            if record:
+                latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(one(False) for _ in range(args.warmup)))
+    calls_before = client.chat.completions.calls
+    started = time.perf_counter()
+    await asyncio.gather(*(one(True) for _ in range(args.requests)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        **percentiles(latencies),
+        "failed": failures,
+        "upstream_calls_per_request": round((client.chat.completions.calls - calls_before) / args.requests, 3),
+        "throughput_rps": round(args.requests / elapsed, 1),
+        **{key: value for key, value in resilience.counters.stats().items() if key in ("retries", "hedges", "hedge_wins")}
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--warmup", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--slow-rate", type=float, default=0.05)
+    parser.add_argument("--slow-factor", type=float, default=10)
+    parser.add_argument("--error-rate", type=float, default=0.02)
+    parser.add_argument("--timeout", type=float, default=5)
+    args = parser.parse_args()
+
+    results = {
+        "no_retry": await run_mode(args, max_attempts=1, hedge=False),
+        "retry": await run_mode(args, max_attempts=3, hedge=False),
+        "retry_hedge": await run_mode(args, max_attempts=3, hedge=True)
+    }
+    print(json.dumps({"settings": vars(args), "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
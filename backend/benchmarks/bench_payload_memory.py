@@ -0,0 +1,70 @@
+"""
+Payload Memory Benchmark
+Compares peak per-request allocation of the dict payload and ProcessedImage
+
+Traces allocations from an already-encoded image buffer to the two
+vision-model message payloads built for code generation and element
+extraction.
+
+Usage:
+    python benchmarks/bench_payload_memory.py --megabytes 4
+"""
+
+import argparse
+import base64
+import io
+import json
+import os
+import sys
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.processed_image import ProcessedImage  # noqa: E402
+
+
+def legacy_payloads(encoded: bytes) -> List[Dict[str, Any]]:
+    """Previous flow: BytesIO, getvalue, b64 bytes, decoded str, one f-string per call"""
+    buffered = io.BytesIO()
+    buffered.write(encoded)
+    image_data = {"base64": base64.b64encode(buffered.getvalue()).decode()}
+    return [
+        {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{image_data.get('base64')}"}}
+        for _ in range(2)
+    ]
+
+
+def processed_payloads(encoded: bytes) -> List[Dict[str, Any]]:
+    image = ProcessedImage(data=encoded, mime_type="image/jpeg", format="JPEG", width=2048, height=1152)
+    return [{"type": "image_url", "image_url": {"url": image.data_url}} for _ in range(2)]
+
+
+def peak_allocation(build: Callable[[bytes], List[Dict[str, Any]]], encoded: bytes) -> int:
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    payloads = build(encoded)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del payloads
+    return peak
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--megabytes", type=float, default=4.0)
+    args = parser.parse_args()
+
+    encoded = os.urandom(int(args.megabytes * 1024 * 1024))
+    legacy = peak_allocation(legacy_payloads, encoded)
+    processed = peak_allocation(processed_payloads, encoded)
+    print(json.dumps({
+        "encoded_bytes": len(encoded),
+        "legacy_peak_bytes": legacy,
+        "processed_image_peak_bytes": processed,
+        "reduction": round(1 - processed / legacy, 3)
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
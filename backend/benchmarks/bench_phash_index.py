@@ -0,0 +1,82 @@
+"""
+Perceptual Hash Index Benchmark
+Measures HammingIndex build time and lookup latency at scale
+
+Hashes are uniformly random, plus a clustered set that mimics many
+screenshots of the same app. Queries are near neighbours (a few flipped
+bits) of indexed hashes, and misses.
+
+Usage:
+    python benchmarks/bench_phash_index.py --entries 1000000
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.phash_index import HammingIndex  # noqa: E402
+
+
+def flip_bits(value: int, count: int, rng: random.Random) -> int:
+    for position in rng.sample(range(64), count):
+        value ^= 1 << position
+    return value
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    samples = sorted(samples)
+    pick = lambda q: round(samples[min(len(samples) - 1, int(q * len(samples)))] * 1e6, 1)
+    return {"p50_us": pick(0.50), "p99_us": pick(0.99), "max_us": round(samples[-1] * 1e6, 1)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=1000000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--max-distance", type=int, default=4)
+    parser.add_argument("--clustered", type=float, default=0.2, help="Fraction of entries near 100 base layouts")
+    args = parser.parse_args()
+
+    rng = random.Random(12)
+    bases = [rng.getrandbits(64) for _ in range(100)]
+    hashes = [
+        flip_bits(rng.choice(bases), rng.randint(3, 12), rng) if rng.random() < args.clustered else rng.getrandbits(64)
+        for _ in range(args.entries)
+    ]
+
+    index = HammingIndex(args.entries)
+    started = time.perf_counter()
+    for position, value in enumerate(hashes):
+        index.add(value, position)
+    build_seconds = time.perf_counter() - started
+
+    results = {}
+    for name, make_query in [
+        ("near", lambda: flip_bits(rng.choice(hashes), rng.randint(0, args.max_distance), rng)),
+        ("miss", lambda: rng.getrandbits(64))
+    ]:
+        timings, found = [], 0
+        for _ in range(args.queries):
+            query = make_query()
+            started = time.perf_counter()
+            match = index.search(query, args.max_distance)
+            timings.append(time.perf_counter() - started)
+            found += match is not None
+        results[name] = {**percentiles(timings), "found": found}
+
+    print(json.dumps({
+        "entries": args.entries,
+        "max_distance": args.max_distance,
+        "build_seconds": round(build_seconds, 2),
+        **results
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,8 @@ FastAPI Backend for AI Wonderland Image-to-Code
 Main entry point for the backend API
 """
 
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 import os
@@ -12,12 +13,33 @@ import os
 load_dotenv()
 
 # Import routes
-from routes import image_to_code, ai_extraction, export
+from routes import image_to_code, ai_extraction, export, jobs
+from utils.executor import image_executor
+from utils.image_cache import image_cache
+from utils.image_processor import get_pipeline_stats
+from utils.phash_index import code_index
+from utils.llm_cache import llm_cache
+from utils.openai_handler import llm_flight
+from utils.rate_limiter import llm_governor
+from utils.resilience import get_resilience_stats
+from utils.llm_providers import llm_router
+from utils.jobs import job_queue
+from utils.metrics import PROMETHEUS_CONTENT_TYPE, MeteredJSONResponse, registry
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start up and tear down shared resources"""
+    job_queue.start()
+    yield
+    await job_queue.stop()
+    image_executor.shutdown()
 
 app = FastAPI(
     title="AI Wonderland Backend API",
     description="FastAPI backend for Image-to-Code and AI Wonderland builder",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=MeteredJSONResponse
 )
 
 # CORS middleware
@@ -33,6 +55,7 @@ app.add_middleware(
 app.include_router(image_to_code.router, prefix="/api/image-to-code", tags=["image-to-code"])
 app.include_router(ai_extraction.router, prefix="/api/ai-extraction", tags=["ai-extraction"])
 app.include_router(export.router, prefix="/api/export", tags=["export"])
+app.include_router(jobs.router, prefix="/api/jobs", tags=["jobs"])
 
 @app.get("/")
 async def root():
@@ -48,6 +71,56 @@ async def health_check():
     """Health check endpoint"""
     return {"status": "healthy"}
 
+@app.get("/stats")
+async def runtime_stats():
+    """Image pipeline counters"""
+    return {
+        "image_executor": image_executor.stats(),
+        "image_cache": image_cache.stats(),
+        "image_pipeline": get_pipeline_stats(),
+        "phash_index": code_index.stats(),
+        "llm_cache": llm_cache.stats(),
+        "llm_singleflight": llm_flight.stats(),
+        "llm_governor": llm_governor.stats(),
+        "llm_resilience": get_resilience_stats(),
+        "llm_router": llm_router.stats(),
+        "jobs": await job_queue.stats()
+    }
+
+def cache_samples():
+    """Hits and misses per cache and tier, from the caches' own counters"""
+    samples = {}
+    for cache, stats in (("image", image_cache.stats()), ("llm", llm_cache.stats())):
+        for tier in ("memory", "disk"):
+            if stats[tier] is not None:
+                samples[(cache, tier, "hit")] = stats[tier]["hits"]
+                samples[(cache, tier, "miss")] = stats[tier]["misses"]
+    return samples
+
+async def queue_depth_samples():
+    """Work waiting for a slot in each bounded queue"""
+    return {
+        ("image_executor",): image_executor.queue_depth,
+        ("llm_governor",): llm_governor.stats()["queue_depth"],
+        ("jobs",): (await job_queue.stats())["queued"]
+    }
+
+# Read when scraped, so they cost nothing on the request path
+registry.collected(
+    "image_to_code_cache_requests_total", "Cache lookups by cache, tier and result",
+    ("cache", "tier", "result"), cache_samples, type="counter"
+)
+registry.collected("image_to_code_queue_depth", "Items waiting in each bounded queue", ("queue",), queue_depth_samples)
+registry.collected(
+    "image_to_code_in_flight", "Items running or waiting",
+    ("queue",), lambda: {("image_executor",): image_executor.in_flight, ("llm_governor",): llm_governor.stats()["running"]}
+)
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: stage latencies, tokens, payload sizes, cache hits and queue depths"""
+    return Response(await registry.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8000))
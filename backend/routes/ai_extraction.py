@@ -3,20 +3,31 @@ AI Extraction API Route
 Extracts UI elements and components from images using AI
 """
 
-from fastapi import APIRouter, File, UploadFile, HTTPException
-from typing import List, Dict
+from fastapi import APIRouter, File, Form, Header, UploadFile, HTTPException
+from fastapi.responses import StreamingResponse
+from typing import AsyncIterator, List, Dict, Optional
 from utils.image_processor import process_image
-from utils.openai_handler import extract_ui_elements
+from utils.executor import ExecutorBusyError, image_executor
+from utils.color_palette import extract_palette_from_bytes
+from utils.typography import estimate_typography_from_bytes
+from utils.openai_handler import ELEMENTS_MODEL, extract_ui_elements, stream_ui_elements
+from utils.llm_cache import LLM_CACHE_HEADER, cache_allowed
+from utils.rate_limiter import UpstreamBusyError, llm_governor
+from routes.image_to_code import sse_event
 
 router = APIRouter()
 
 @router.post("/extract-elements")
-async def extract_elements(file: UploadFile = File(...)):
+async def extract_elements(
+    file: UploadFile = File(...),
+    llm_cache_mode: Optional[str] = Header(default=None, alias=LLM_CACHE_HEADER)
+):
     """
     Extract UI elements from an image
     
     Args:
         file: Image file to analyze
+        llm_cache_mode: "bypass" skips the LLM response cache lookup
     
     Returns:
         List of detected UI elements with positions and properties
@@ -26,7 +37,7 @@ async def extract_elements(file: UploadFile = File(...)):
             raise HTTPException(status_code=400, detail="File must be an image")
         
         image_data = await process_image(file)
-        elements = await extract_ui_elements(image_data)
+        elements = await extract_ui_elements(image_data, use_cache=cache_allowed(llm_cache_mode))
         
         return {
             "success": True,
@@ -34,19 +45,74 @@ async def extract_elements(file: UploadFile = File(...)):
             "count": len(elements)
         }
     
+    except ExecutorBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except UpstreamBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": e.retry_after_header})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error extracting elements: {str(e)}")
 
+@router.post("/extract-elements/stream")
+async def stream_elements(
+    file: UploadFile = File(...),
+    llm_cache_mode: Optional[str] = Header(default=None, alias=LLM_CACHE_HEADER)
+):
+    """
+    Extract UI elements from an image, streamed as Server-Sent Events
+    
+    Each `element` event carries one element as soon as the model has
+    finished writing it, so long lists start arriving well before the
+    completion ends. One `done` event follows with the count, how many
+    malformed items were dropped, whether the list was complete, model,
+    usage and timings (or an `error` event, as for /convert/stream).
+    
+    Args:
+        file: Image file to analyze
+        llm_cache_mode: "bypass" skips the LLM response cache lookup
+    
+    Returns:
+        text/event-stream response
+    """
+    try:
+        if not file.content_type.startswith("image/"):
+            raise HTTPException(status_code=400, detail="File must be an image")
+        
+        image_data = await process_image(file)
+        llm_governor.check_capacity(ELEMENTS_MODEL)
+    
+    except ExecutorBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except UpstreamBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": e.retry_after_header})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error extracting elements: {str(e)}")
+    
+    async def events() -> AsyncIterator[str]:
+        async for event in stream_ui_elements(image_data, use_cache=cache_allowed(llm_cache_mode)):
+            yield sse_event(event.pop("type"), event)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.post("/extract-colors")
-async def extract_colors(file: UploadFile = File(...)):
+async def extract_colors(
+    file: UploadFile = File(...),
+    count: int = Form(6, ge=1, le=16),
+    perceptual: bool = Form(False)
+):
     """
     Extract color palette from an image
     
     Args:
         file: Image file to analyze
+        count: Maximum number of colors to return (1-16)
+        perceptual: Cluster in CIE Lab space instead of RGB
     
     Returns:
-        Color palette with hex codes and usage
+        Color palette with hex codes, usage percentages and role guesses
     """
     try:
         if not file.content_type.startswith("image/"):
@@ -54,19 +120,16 @@ async def extract_colors(file: UploadFile = File(...)):
         
         image_data = await process_image(file)
         
-        # Extract dominant colors (placeholder implementation)
-        colors = [
-            {"hex": "#1a202c", "name": "Primary", "usage": 40},
-            {"hex": "#2d3748", "name": "Secondary", "usage": 30},
-            {"hex": "#4a5568", "name": "Accent", "usage": 20},
-            {"hex": "#edf2f7", "name": "Background", "usage": 10}
-        ]
+        # Quantize locally in the image executor; no LLM call is needed
+        colors = await image_executor.run(extract_palette_from_bytes, image_data.data, count, perceptual)
         
         return {
             "success": True,
             "colors": colors
         }
     
+    except ExecutorBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error extracting colors: {str(e)}")
 
@@ -79,32 +142,25 @@ async def extract_typography(file: UploadFile = File(...)):
         file: Image file to analyze
     
     Returns:
-        Typography details (fonts, sizes, weights)
+        Typography details (heading/body/small levels with sizes, weights, line height)
     """
     try:
         if not file.content_type.startswith("image/"):
             raise HTTPException(status_code=400, detail="File must be an image")
         
-        image_data = await process_image(file)
+        # Small glyphs need resolution and this image is never sent to a model
+        image_data = await process_image(file, detail_preset="max")
         
-        # Extract typography (placeholder implementation)
-        typography = {
-            "headings": [
-                {"level": "h1", "size": "48px", "weight": "bold", "font": "sans-serif"},
-                {"level": "h2", "size": "36px", "weight": "semibold", "font": "sans-serif"}
-            ],
-            "body": {
-                "size": "16px",
-                "weight": "normal",
-                "font": "sans-serif",
-                "line_height": "1.5"
-            }
-        }
+        # Measure text lines locally; sizes are reported in original upload pixels
+        scale = image_data.original_width / image_data.width
+        typography = await image_executor.run(estimate_typography_from_bytes, image_data.data, scale)
         
         return {
             "success": True,
             "typography": typography
         }
     
+    except ExecutorBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error extracting typography: {str(e)}")
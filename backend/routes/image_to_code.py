@@ -3,11 +3,22 @@ Image-to-Code API Route
 Converts uploaded images to HTML/React/Next.js code using AI
 """
 
-from fastapi import APIRouter, File, UploadFile, HTTPException, Form
-from typing import Optional
+from fastapi import APIRouter, File, UploadFile, HTTPException, Form, Header
+from fastapi.responses import StreamingResponse
+from typing import Any, AsyncIterator, Awaitable, Dict, List, Optional, Tuple
+import asyncio
+import json
 import os
+import time
 from utils.image_processor import process_image
-from utils.openai_handler import generate_code_from_image
+from utils.executor import ExecutorBusyError, image_executor
+from utils.typography import estimate_typography_from_bytes, typography_hint
+from utils.image_analysis import analyze_upload
+from utils.conversion import convert_upload
+from utils.llm_cache import LLM_CACHE_HEADER, cache_allowed
+from utils.openai_handler import generate_code_from_image, extract_ui_elements, stream_code_from_image
+from utils.rate_limiter import UpstreamBusyError, llm_governor
+from utils.batch import BATCH_MAX_ITEMS, BatchError, BatchItem, open_archive, run_batch
 
 router = APIRouter()
 
@@ -16,7 +27,12 @@ async def convert_image_to_code(
     file: UploadFile = File(...),
     framework: str = Form(default="react"),
     include_styling: bool = Form(default=True),
-    model: str = Form(default="gpt-4-vision-preview")
+    model: str = Form(default="gpt-4-vision-preview"),
+    resize_mode: Optional[str] = Form(default=None),
+    detail_preset: Optional[str] = Form(default=None),
+    typography_hints: bool = Form(default=False),
+    tiled: bool = Form(default=False),
+    llm_cache_mode: Optional[str] = Header(default=None, alias=LLM_CACHE_HEADER)
 ):
     """
     Convert an uploaded image to code
@@ -26,6 +42,11 @@ async def convert_image_to_code(
         framework: Target framework (html, react, nextjs, vue)
         include_styling: Whether to include CSS/Tailwind styling
         model: AI model to use for conversion
+        resize_mode: Downscale mode (quality, balanced, fast)
+        detail_preset: Output size preset (economy, balanced, max)
+        typography_hints: Measure typography locally and add it to the prompt
+        tiled: Split tall pages into sections generated concurrently
+        llm_cache_mode: "bypass" skips the LLM response cache lookup
     
     Returns:
         Generated code and metadata
@@ -35,30 +56,289 @@ async def convert_image_to_code(
         if not file.content_type.startswith("image/"):
             raise HTTPException(status_code=400, detail="File must be an image")
         
-        # Process image
-        image_data = await process_image(file)
+        return await convert_upload(
+            file,
+            framework=framework,
+            include_styling=include_styling,
+            model=model,
+            resize_mode=resize_mode,
+            detail_preset=detail_preset,
+            typography_hints=typography_hints,
+            tiled=tiled,
+            use_cache=cache_allowed(llm_cache_mode)
+        )
+    
+    except ExecutorBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except UpstreamBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": e.retry_after_header})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
+
+@router.post("/convert/stream")
+async def stream_image_to_code(
+    file: UploadFile = File(...),
+    framework: str = Form(default="react"),
+    include_styling: bool = Form(default=True),
+    model: str = Form(default="gpt-4-vision-preview"),
+    resize_mode: Optional[str] = Form(default=None),
+    detail_preset: Optional[str] = Form(default=None),
+    typography_hints: bool = Form(default=False),
+    llm_cache_mode: Optional[str] = Header(default=None, alias=LLM_CACHE_HEADER)
+):
+    """
+    Convert an uploaded image to code, streamed as Server-Sent Events
+    
+    The image is processed before the stream opens, so upload errors are
+    still returned as normal HTTP errors, as is a full model request
+    queue. The stream then carries `code` events with fence-free code
+    chunks and ends with one `done` event holding model, token usage and
+    timings (or an `error` event, with status 503 and retry_after when
+    the call was shed).
+    
+    Args:
+        file: Image file to convert
+        framework: Target framework (html, react, nextjs, vue)
+        include_styling: Whether to include CSS/Tailwind styling
+        model: AI model to use for conversion
+        resize_mode: Downscale mode (quality, balanced, fast)
+        detail_preset: Output size preset (economy, balanced, max)
+        typography_hints: Measure typography locally and add it to the prompt
+        llm_cache_mode: "bypass" skips the LLM response cache lookup
+    
+    Returns:
+        text/event-stream response
+    """
+    try:
+        if not file.content_type.startswith("image/"):
+            raise HTTPException(status_code=400, detail="File must be an image")
+        
+        started = time.perf_counter()
+        image_data = await process_image(file, resize_mode=resize_mode, detail_preset=detail_preset)
+        
+        hints = None
+        if typography_hints:
+            scale = image_data.original_width / image_data.width
+            typography = await image_executor.run(estimate_typography_from_bytes, image_data.data, scale)
+            hints = typography_hint(typography) or None
+        process_ms = round((time.perf_counter() - started) * 1000, 3)
         
-        # Generate code using AI
+        # Refuse now while a 503 is still possible; once streaming, shedding is an error event
+        llm_governor.check_capacity(model)
+    
+    except ExecutorBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except UpstreamBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": e.retry_after_header})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
+    
+    async def events() -> AsyncIterator[str]:
+        async for event in stream_code_from_image(
+            image_data=image_data,
+            framework=framework,
+            include_styling=include_styling,
+            model=model,
+            hints=hints,
+            use_cache=cache_allowed(llm_cache_mode)
+        ):
+            kind = event.pop("type")
+            if kind == "done":
+                event["timings"]["process_ms"] = process_ms
+                event["image_dimensions"] = image_data.dimensions
+                event["reencoded"] = image_data.reencoded
+                event["image_tokens"] = image_data.image_tokens
+            yield sse_event(kind, event)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Format one Server-Sent Event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@router.post("/convert/batch")
+async def convert_batch(
+    files: List[UploadFile] = File(default=[]),
+    archive: Optional[UploadFile] = File(default=None),
+    framework: str = Form(default="react"),
+    include_styling: bool = Form(default=True),
+    model: str = Form(default="gpt-4-vision-preview"),
+    resize_mode: Optional[str] = Form(default=None),
+    detail_preset: Optional[str] = Form(default=None),
+    llm_cache_mode: Optional[str] = Header(default=None, alias=LLM_CACHE_HEADER)
+):
+    """
+    Convert many images, streaming one NDJSON line per image as it finishes
+    
+    Images come as repeated `files` parts, a zip `archive`, or both
+    (files first). Up to BATCH_CONCURRENCY images are converted at once;
+    lines arrive in completion order, each tagged with the item's index.
+    A failed item produces a line with success false, an error and the
+    status a single /convert call would have returned, and the batch
+    carries on. The last line is a summary.
+    
+    Args:
+        files: Image files to convert
+        archive: Zip archive of images
+        framework: Target framework (html, react, nextjs, vue)
+        include_styling: Whether to include CSS/Tailwind styling
+        model: AI model to use for conversion
+        resize_mode: Downscale mode (quality, balanced, fast)
+        detail_preset: Output size preset (economy, balanced, max)
+        llm_cache_mode: "bypass" skips the LLM response cache lookup
+    
+    Returns:
+        application/x-ndjson response
+    """
+    items = [BatchItem(file.filename or f"file-{index}", upload=file) for index, file in enumerate(files)]
+    if archive is not None:
+        try:
+            items += await asyncio.to_thread(open_archive, archive, BATCH_MAX_ITEMS - len(items))
+        except BatchError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    if not items:
+        raise HTTPException(status_code=400, detail="No images in the batch")
+    if len(items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Batch holds {len(items)} images; the limit is {BATCH_MAX_ITEMS}")
+    use_cache = cache_allowed(llm_cache_mode)
+    
+    async def convert_item(item: BatchItem) -> Dict[str, Any]:
+        if item.upload is not None and not (item.upload.content_type or "").startswith("image/"):
+            raise ValueError("File must be an image")
+        image_data = await process_image(await item.open(), resize_mode=resize_mode, detail_preset=detail_preset)
         code_result = await generate_code_from_image(
             image_data=image_data,
             framework=framework,
             include_styling=include_styling,
-            model=model
+            model=model,
+            use_cache=use_cache
+        )
+        # Unlike /convert, a mock fallback is reported as a failure so imports can retry it
+        if "error" in code_result:
+            raise RuntimeError(f"Code generation failed: {code_result['error']}")
+        return {
+            "code": code_result["code"],
+            "metadata": {
+                "model_used": code_result["model"],
+                "provider": code_result.get("provider"),
+                "image_dimensions": image_data.dimensions,
+                "image_tokens": image_data.image_tokens,
+                "cached": code_result.get("cached", False)
+            }
+        }
+    
+    async def lines() -> AsyncIterator[str]:
+        async for line in run_batch(items, convert_item):
+            yield json.dumps(line) + "\n"
+    
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/analyze")
+async def analyze_image_to_code(
+    file: UploadFile = File(...),
+    framework: str = Form(default="react"),
+    include_styling: bool = Form(default=True),
+    model: str = Form(default="gpt-4-vision-preview"),
+    resize_mode: Optional[str] = Form(default=None),
+    detail_preset: Optional[str] = Form(default=None),
+    color_count: int = Form(default=6, ge=1, le=16),
+    perceptual: bool = Form(default=False),
+    typography_hints: bool = Form(default=True),
+    llm_cache_mode: Optional[str] = Header(default=None, alias=LLM_CACHE_HEADER)
+):
+    """
+    Generate code, UI elements, colors and typography from one upload
+    
+    The image is decoded once in the image executor, which builds the model
+    payload and runs the local color and typography analyses on the same
+    pyramid. The code and element LLM calls then run concurrently.
+    
+    Args:
+        file: Image file to analyze
+        framework: Target framework (html, react, nextjs, vue)
+        include_styling: Whether to include CSS/Tailwind styling
+        model: AI model to use for conversion
+        resize_mode: Downscale mode (quality, balanced, fast)
+        detail_preset: Output size preset (economy, balanced, max)
+        color_count: Maximum number of palette colors (1-16)
+        perceptual: Cluster the palette in CIE Lab space
+        typography_hints: Add the measured typography to the code prompt
+        llm_cache_mode: "bypass" skips the LLM response cache lookup
+    
+    Returns:
+        Combined code, elements, colors and typography with per-stage timings
+    """
+    try:
+        if not file.content_type.startswith("image/"):
+            raise HTTPException(status_code=400, detail="File must be an image")
+        
+        started = time.perf_counter()
+        image_data, analysis = await analyze_upload(
+            file,
+            resize_mode=resize_mode,
+            detail_preset=detail_preset,
+            palette_count=color_count,
+            perceptual=perceptual
+        )
+        
+        hints = typography_hint(analysis["typography"]) if typography_hints else ""
+        use_cache = cache_allowed(llm_cache_mode)
+        (code_result, code_ms), (elements, elements_ms) = await asyncio.gather(
+            timed(generate_code_from_image(
+                image_data=image_data,
+                framework=framework,
+                include_styling=include_styling,
+                model=model,
+                hints=hints or None,
+                use_cache=use_cache
+            )),
+            timed(extract_ui_elements(image_data, use_cache=use_cache))
         )
         
+        timings = analysis["timings"]
+        timings["code_ms"] = code_ms
+        timings["elements_ms"] = elements_ms
+        timings["total_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        
         return {
             "success": True,
             "code": code_result["code"],
             "framework": framework,
+            "elements": elements,
+            "colors": analysis["colors"],
+            "typography": analysis["typography"],
             "metadata": {
                 "model_used": model,
+                "provider": code_result.get("provider"),
                 "include_styling": include_styling,
-                "image_dimensions": image_data.get("dimensions")
-            }
+                "image_dimensions": image_data.dimensions,
+                "reencoded": image_data.reencoded,
+                "image_tokens": image_data.image_tokens,
+                "cached": code_result.get("cached", False)
+            },
+            "timings": timings
         }
     
+    except ExecutorBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except UpstreamBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": e.retry_after_header})
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error analyzing image: {str(e)}")
+
+async def timed(awaitable: Awaitable[Any]) -> Tuple[Any, float]:
+    """Await and return (result, elapsed milliseconds)"""
+    started = time.perf_counter()
+    result = await awaitable
+    return result, round((time.perf_counter() - started) * 1000, 3)
 
 @router.get("/frameworks")
 async def get_supported_frameworks():
@@ -0,0 +1,140 @@
+"""
+Jobs API Route
+Queues image-to-code conversions and reports their progress
+"""
+
+from fastapi import APIRouter, File, UploadFile, HTTPException, Form, Header, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse
+from typing import Optional
+import asyncio
+from utils.image_processor import read_upload
+from utils.llm_cache import LLM_CACHE_HEADER, cache_allowed
+from utils.jobs import JOB_POLL_INTERVAL, JobQueueFullError, job_queue
+
+router = APIRouter()
+
+@router.post("", status_code=202)
+async def submit_job(
+    file: UploadFile = File(...),
+    framework: str = Form(default="react"),
+    include_styling: bool = Form(default=True),
+    model: str = Form(default="gpt-4-vision-preview"),
+    resize_mode: Optional[str] = Form(default=None),
+    detail_preset: Optional[str] = Form(default=None),
+    typography_hints: bool = Form(default=False),
+    tiled: bool = Form(default=False),
+    llm_cache_mode: Optional[str] = Header(default=None, alias=LLM_CACHE_HEADER)
+):
+    """
+    Queue an image-to-code conversion and return at once
+
+    Takes the same fields as /api/image-to-code/convert. The upload is
+    validated (type, size, header) before it is queued; everything else
+    happens in a worker. Poll the returned status URL, or subscribe to
+    the WebSocket URL, until the job is succeeded or failed; a succeeded
+    job's `result` is what /convert would have returned.
+
+    Args:
+        file: Image file to convert
+        framework: Target framework (html, react, nextjs, vue)
+        include_styling: Whether to include CSS/Tailwind styling
+        model: AI model to use for conversion
+        resize_mode: Downscale mode (quality, balanced, fast)
+        detail_preset: Output size preset (economy, balanced, max)
+        typography_hints: Measure typography locally and add it to the prompt
+        tiled: Split tall pages into sections generated concurrently
+        llm_cache_mode: "bypass" skips the LLM response cache lookup
+
+    Returns:
+        Job id, status and the URLs to follow it
+    """
+    try:
+        if not file.content_type.startswith("image/"):
+            raise HTTPException(status_code=400, detail="File must be an image")
+
+        try:
+            data, _ = await read_upload(file)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        job = await job_queue.submit(
+            {
+                "framework": framework,
+                "include_styling": include_styling,
+                "model": model,
+                "resize_mode": resize_mode,
+                "detail_preset": detail_preset,
+                "typography_hints": typography_hints,
+                "tiled": tiled,
+                "use_cache": cache_allowed(llm_cache_mode)
+            },
+            data,
+            filename=file.filename,
+            content_type=file.content_type
+        )
+        return {
+            "job_id": job.id,
+            "status": job.status,
+            "status_url": f"/api/jobs/{job.id}",
+            "ws_url": f"/api/jobs/{job.id}/ws"
+        }
+
+    except HTTPException:
+        raise
+    except JobQueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error queueing job: {str(e)}")
+
+@router.get("/{job_id}")
+async def get_job(job_id: str):
+    """
+    Current state of a job
+
+    Returns:
+        status (queued, running, succeeded, failed), stage (queued,
+        decode, llm, done), attempts and timestamps, plus `result` or
+        `error` once finished
+    """
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return JSONResponse(job.view(), headers={"Cache-Control": "no-store"})
+
+@router.websocket("/{job_id}/ws")
+async def job_events(websocket: WebSocket, job_id: str):
+    """
+    Push a job's state on every change until it finishes
+
+    The current state is sent on connect, then again on each stage or
+    status change; the socket is closed after the final state. Changes
+    made by this process arrive immediately, others (a worker in another
+    process sharing the SQLite store) within JOB_POLL_INTERVAL.
+    """
+    await websocket.accept()
+    job = await job_queue.get(job_id)
+    if job is None:
+        await websocket.send_json({"error": "Job not found or expired"})
+        await websocket.close(code=4404)
+        return
+
+    events = job_queue.subscribe(job_id)
+    try:
+        view = job.view()
+        await websocket.send_json(view)
+        while view["status"] not in ("succeeded", "failed"):
+            try:
+                latest = await asyncio.wait_for(events.get(), JOB_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                job = await job_queue.get(job_id)
+                if job is None:
+                    break
+                latest = job.view()
+            if (latest["status"], latest["stage"]) != (view["status"], view["stage"]):
+                await websocket.send_json(latest)
+            view = latest
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        job_queue.unsubscribe(job_id, events)
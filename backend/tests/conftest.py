@@ -0,0 +1,9 @@
+import os
+import sys
+
+# Tests import modules the way main.py does, relative to backend/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Never reach a real model, and fail fast instead of retrying with backoff
+os.environ.setdefault("LLM_PROVIDER", "fake")
+os.environ.setdefault("LLM_MAX_ATTEMPTS", "1")
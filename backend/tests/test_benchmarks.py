@@ -0,0 +1,20 @@
+"""Benchmarks call internal functions directly; run them small so signature changes fail here"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+
+def test_bench_downscale_runs_every_mode():
+    pytest.importorskip("numpy")
+    import bench_downscale
+
+    content = bench_downscale.make_screenshot(1600, 900)
+    _, reference = bench_downscale.time_mode(content, "quality", 1)
+    for mode in bench_downscale.RESIZE_MODES:
+        _, result = bench_downscale.time_mode(content, mode, 1)
+        assert (result.width, result.height) == (reference.width, reference.height)
+        assert 0.5 < bench_downscale.ssim(bench_downscale.decode(reference), bench_downscale.decode(result)) <= 1.0
@@ -0,0 +1,50 @@
+import random
+
+import pytest
+
+from utils.code_fences import PREAMBLE_MAX_LINES, FenceStripper, strip_code_fences
+
+CASES = [
+    ("```jsx\nA\nB\n```", "A\nB"),
+    ("```\n\nA\n```\nThis component renders A.", "A"),
+    ("Here:\n```jsx\nA\n```", "A"),
+    ("Here is the component:\n\n```jsx\nconst A = 1;\n```\nExplanation.", "const A = 1;"),
+    ("Sure!\nBelow is the code.\n```html\n<p>x</p>\n```", "<p>x</p>"),
+    ("Here:\n```jsx", ""),
+    ("const A = 1;\nexport default A;", "const A = 1;\nexport default A;"),
+    ("\n\nconst A = 1;", "const A = 1;"),
+    ("A\n" * (PREAMBLE_MAX_LINES + 2) + "```\ntrailing", ("A\n" * (PREAMBLE_MAX_LINES + 2)).rstrip()),
+    ("```jsx\nconst s = `a`;\n```", "const s = `a`;"),
+]
+
+
+def stream(chunks):
+    stripper = FenceStripper()
+    return ("".join(stripper.feed(chunk) for chunk in chunks) + stripper.finish()).rstrip()
+
+
+@pytest.mark.parametrize("text, expected", CASES)
+def test_strip_code_fences(text, expected):
+    assert strip_code_fences(text) == expected
+
+
+@pytest.mark.parametrize("text, expected", CASES)
+def test_every_two_chunk_split(text, expected):
+    for cut in range(len(text) + 1):
+        assert stream([text[:cut], text[cut:]]) == expected, cut
+
+
+@pytest.mark.parametrize("text, expected", CASES)
+def test_random_chunk_splits(text, expected):
+    rng = random.Random(text)
+    for _ in range(50):
+        cuts = sorted(rng.sample(range(len(text) + 1), min(len(text) + 1, rng.randint(1, 8))))
+        chunks = [text[start:end] for start, end in zip([0] + cuts, cuts + [len(text)])]
+        assert stream(chunks) == expected, chunks
+
+
+def test_fenced_code_streams_before_the_closing_fence():
+    stripper = FenceStripper()
+    assert stripper.feed("Here:\n```jsx\n") == ""
+    assert stripper.feed("const A") == "const A"
+    assert stripper.feed(" = 1;\n") == " = 1;\n"
@@ -0,0 +1,36 @@
+import os
+import time
+
+from utils.image_cache import DiskCache
+
+
+def age(cache: DiskCache, key: str, seconds: float) -> None:
+    past = time.time() - seconds
+    os.utime(cache._path(key), (past, past))
+
+
+def test_overwrites_count_the_difference_in_size(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=10000)
+    for _ in range(5):
+        cache.put("a", b"x" * 1000)
+    assert cache.total_bytes == 1000
+    cache.put("a", b"x" * 400)
+    assert cache.total_bytes == 400
+    assert cache.evictions == 0
+    assert cache.get("a") == b"x" * 400
+
+
+def test_hits_protect_entries_from_eviction(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=2500)
+    cache.put("old", b"o" * 1000)
+    cache.put("new", b"n" * 1000)
+    age(cache, "old", 60)
+    age(cache, "new", 30)
+
+    assert cache.get("old") is not None
+    cache.put("third", b"t" * 1000)
+
+    assert cache.get("old") == b"o" * 1000
+    assert cache.get("new") is None
+    assert cache.evictions == 1
+    assert cache.total_bytes == 2000
@@ -0,0 +1,176 @@
+"""Hostile uploads must be rejected from the header, before the body is buffered or decoded"""
+
+import asyncio
+import io
+import struct
+import tracemalloc
+import zlib
+
+import pytest
+from fastapi import UploadFile
+from PIL import Image
+
+from utils import image_processor
+from utils.image_header import PNG_SIGNATURE, IncompleteHeaderError, parse_header
+from utils.image_processor import HEADER_READ_SIZE, UPLOAD_CHUNK_SIZE, process_image, read_upload
+
+
+class CountingStream(io.RawIOBase):
+    """Readable upload body that counts the bytes handed out; `tail` repeats forever once `head` is used up"""
+
+    def __init__(self, head: bytes, tail: bytes = b""):
+        self.head = head
+        self.tail = tail
+        self.position = 0
+        self.bytes_read = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            raise AssertionError("upload read without a size limit")
+        if self.position < len(self.head):
+            data = self.head[self.position:self.position + size]
+            self.position += len(data)
+        elif self.tail:
+            data = (self.tail * (size // len(self.tail) + 1))[:size]
+        else:
+            data = b""
+        self.bytes_read += len(data)
+        return data
+
+
+def upload(stream: CountingStream, size=None, filename: str = "upload.png") -> UploadFile:
+    return UploadFile(stream, size=size, filename=filename)
+
+
+def png_chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+
+def png_header(width: int, height: int) -> bytes:
+    return PNG_SIGNATURE + png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+
+
+def png_bomb(width: int = 100000, height: int = 100000, compressed_bytes: int = 4 * HEADER_READ_SIZE) -> bytes:
+    """A PNG claiming width x height RGB pixels, with IDAT data that inflates about a thousandfold"""
+    rows = zlib.compressobj(9)
+    data = b""
+    zeros = b"\0" * 1048576
+    while len(data) < compressed_bytes:
+        data += rows.compress(zeros * 64)
+    data += rows.flush()
+    return png_header(width, height) + png_chunk(b"IDAT", data) + png_chunk(b"IEND", b"")
+
+
+def real_png(width: int = 64, height: int = 48) -> bytes:
+    buffered = io.BytesIO()
+    Image.new("RGB", (width, height), (200, 40, 40)).save(buffered, format="PNG")
+    return buffered.getvalue()
+
+
+def reject(file: UploadFile, match: str) -> int:
+    """Run read_upload, expect a ValueError and return the peak traced allocation in bytes"""
+    tracemalloc.start()
+    try:
+        with pytest.raises(ValueError, match=match):
+            asyncio.run(read_upload(file))
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+@pytest.fixture(autouse=True)
+def no_decoding(monkeypatch):
+    """Any pixel decode during these tests is a failure"""
+    def refuse(*args, **kwargs):
+        raise AssertionError("image was decoded")
+    monkeypatch.setattr(image_processor.Image, "open", refuse)
+    monkeypatch.setattr(image_processor, "transform_image", refuse)
+
+
+def test_png_decompression_bomb_is_rejected_from_the_header():
+    body = png_bomb()
+    stream = CountingStream(body)
+    peak = reject(upload(stream), "exceed the maximum")
+    assert stream.bytes_read <= HEADER_READ_SIZE < len(body)
+    assert peak < 4 * HEADER_READ_SIZE
+
+
+def test_decompression_bomb_never_reaches_the_executor(monkeypatch):
+    async def refuse(*args, **kwargs):
+        raise AssertionError("bomb was sent to the image executor")
+    monkeypatch.setattr(image_processor.image_executor, "run", refuse)
+    with pytest.raises(ValueError, match="exceed the maximum"):
+        asyncio.run(process_image(upload(CountingStream(png_bomb(compressed_bytes=65536)))))
+
+
+@pytest.mark.parametrize("body", [
+    b"%PDF-1.7\n" + b"\0" * 200000,
+    b"<svg xmlns='http://www.w3.org/2000/svg'>" + b" " * 200000,
+    b"BM" + b"\0" * 200000,
+    b"\x89PNX\r\n\x1a\n" + b"\0" * 200000,
+])
+def test_wrong_magic_bytes_are_rejected_after_one_read(body):
+    stream = CountingStream(body)
+    reject(upload(stream), "Unrecognised image signature")
+    assert stream.bytes_read <= HEADER_READ_SIZE
+
+
+def test_file_name_does_not_decide_the_format():
+    assert parse_header(real_png()).format == "PNG"
+    stream = CountingStream(b"GIF89a" + struct.pack("<HH", 32, 16) + b"\0" * 100)
+    header = asyncio.run(read_upload(upload(stream, filename="photo.jpg")))[1]
+    assert header.format == "GIF"
+
+
+@pytest.mark.parametrize("body", [
+    PNG_SIGNATURE + b"\0\0\0\rIHDR\0\0",
+    b"\xff\xd8\xff\xe0\x00\x10JFIF\0",
+    b"\xff\xd8\xff\xe1\xff\xf0" + b"\0" * 1000,
+    b"RIFF\0\0\0\0WEBPVP8X",
+])
+def test_truncated_headers_are_rejected(body):
+    with pytest.raises(IncompleteHeaderError):
+        parse_header(body)
+    stream = CountingStream(body)
+    reject(upload(stream), "Could not read image header")
+    assert stream.bytes_read == len(body)
+
+
+@pytest.mark.parametrize("width, height", [(0, 100), (100, 0), (0, 0)])
+def test_zero_dimensions_are_rejected(width, height):
+    stream = CountingStream(png_header(width, height) + png_chunk(b"IEND", b""))
+    reject(upload(stream), "invalid dimensions")
+
+
+def test_zero_height_jpeg_is_rejected():
+    frame = b"\xff\xc0" + struct.pack(">HBHHB", 11, 8, 0, 640, 3) + b"\0" * 9
+    stream = CountingStream(b"\xff\xd8" + frame + b"\xff\xd9")
+    reject(upload(stream), "invalid dimensions")
+
+
+def test_declared_oversize_upload_is_rejected_without_reading():
+    stream = CountingStream(real_png())
+    reject(upload(stream, size=image_processor.MAX_SIZE + 1), "File size exceeds")
+    assert stream.bytes_read == 0
+
+
+def test_endless_stream_stops_at_the_size_limit(monkeypatch):
+    limit = 4 * UPLOAD_CHUNK_SIZE
+    monkeypatch.setattr(image_processor, "MAX_SIZE", limit)
+    # A valid small image header, then a body that never ends and no declared size
+    stream = CountingStream(real_png(), tail=b"\xa5" * 4096)
+    peak = reject(upload(stream), "File size exceeds")
+    assert stream.bytes_read <= limit + UPLOAD_CHUNK_SIZE
+    # The chunks read so far are held, but never joined into a second copy
+    assert peak < limit + 3 * UPLOAD_CHUNK_SIZE
+
+
+def test_valid_upload_is_read_whole():
+    body = real_png()
+    stream = CountingStream(body)
+    content, header = asyncio.run(read_upload(upload(stream)))
+    assert content == body
+    assert (header.format, header.width, header.height) == ("PNG", 64, 48)
@@ -0,0 +1,108 @@
+import asyncio
+import importlib
+
+import anthropic
+import openai
+import pytest
+
+from utils.llm_providers import EJECT_MIN_CALLS, Completion, Delta, LLMProvider, ModelRouter, is_client_error
+from utils.processed_image import ProcessedImage
+
+IMAGE = ProcessedImage(data=b"\xff\xd8\xff", mime_type="image/jpeg", format="JPEG", width=512, height=512)
+
+
+def status_error(sdk, status: int) -> Exception:
+    """A real SDK status error, built with the SDK's own httpx package"""
+    client_class = sdk.DefaultAsyncHttpxClient
+    base = next(cls for cls in client_class.__mro__ if cls.__name__ == "AsyncClient")
+    http = importlib.import_module(base.__module__.partition(".")[0])
+    response = http.Response(status, request=http.Request("POST", "https://upstream.test/v1"))
+    error_class = sdk.InternalServerError if status >= 500 else sdk.APIStatusError
+    return error_class(f"HTTP {status}", response=response, body=None)
+
+
+class ScriptedProvider(LLMProvider):
+    """Raises `error` on every call, or answers with its name"""
+
+    def __init__(self, name: str, prefix: str, error: Exception = None):
+        super().__init__(f"{prefix}-default")
+        self.name = name
+        self.prefix = prefix
+        self.error = error
+        self.calls = 0
+
+    def owns(self, model: str) -> bool:
+        return model.startswith(self.prefix)
+
+    async def complete(self, model, prompt, image_data, max_tokens, schema=None):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return Completion(self.name, model, self.name)
+
+    async def stream(self, model, prompt, image_data, max_tokens, schema=None):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        yield Delta(self.name)
+
+
+def complete(router: ModelRouter, model: str) -> Completion:
+    return asyncio.run(router.complete("code", model, "prompt", IMAGE, 256))
+
+
+def stream(router: ModelRouter, model: str) -> str:
+    async def collect():
+        return "".join([delta.text async for _, _, delta in router.stream("code", model, "prompt", IMAGE, 256)])
+    return asyncio.run(collect())
+
+
+@pytest.mark.parametrize("sdk", [openai, anthropic])
+@pytest.mark.parametrize("status, client", [(400, True), (404, True), (422, True), (408, False), (429, False), (500, False)])
+def test_is_client_error(sdk, status, client):
+    assert is_client_error(status_error(sdk, status)) is client
+
+
+@pytest.mark.parametrize("call", [complete, stream])
+@pytest.mark.parametrize("status", [400, 404])
+def test_client_errors_are_raised_without_failover(call, status):
+    primary = ScriptedProvider("primary", "gpt-", status_error(openai, status))
+    backup = ScriptedProvider("backup", "claude")
+    router = ModelRouter([primary, backup])
+
+    with pytest.raises(openai.APIStatusError):
+        call(router, "gpt-no-such-model")
+    assert backup.calls == 0
+    assert router.failovers == 0
+    assert router.health("code", primary).stats()["calls"] == 0
+
+
+def test_bad_requests_do_not_eject_the_provider():
+    primary = ScriptedProvider("primary", "gpt-", status_error(openai, 400))
+    router = ModelRouter([primary, ScriptedProvider("backup", "claude")])
+    for _ in range(EJECT_MIN_CALLS * 3):
+        with pytest.raises(openai.APIStatusError):
+            complete(router, "gpt-4o")
+    health = router.health("code", primary)
+    assert not health.ejected
+    assert health.error_rate == 0.0
+
+
+@pytest.mark.parametrize("call", [complete, stream])
+def test_server_errors_fail_over_and_count_against_health(call):
+    primary = ScriptedProvider("primary", "gpt-", status_error(openai, 500))
+    backup = ScriptedProvider("backup", "claude")
+    router = ModelRouter([primary, backup])
+
+    result = call(router, "gpt-4o")
+    assert (result.text if isinstance(result, Completion) else result) == "backup"
+    assert router.failovers == 1
+    assert router.health("code", primary).error_rate == 1.0
+
+
+def test_repeated_server_errors_eject_the_provider():
+    primary = ScriptedProvider("primary", "gpt-", status_error(openai, 500))
+    router = ModelRouter([primary, ScriptedProvider("backup", "claude")])
+    for _ in range(EJECT_MIN_CALLS):
+        complete(router, "gpt-4o")
+    assert router.health("code", primary).ejected
@@ -0,0 +1,141 @@
+import re
+
+from utils.code_fences import strip_code_fences
+from utils.fake_llm import FAKE_CODE
+from utils.openai_handler import generate_mock_code
+from utils.page_tiler import stitch_sections
+from utils.section_fragments import reduce_html, reduce_jsx
+
+STATEFUL = """import React, { useState } from 'react';
+import { Menu } from 'lucide-react';
+
+function NavLink({ label }) {
+  return <a className="px-3">{label}</a>;
+}
+
+export default function Header() {
+  const [open, setOpen] = useState(false);
+  return (
+    <header>
+      <Menu onClick={() => setOpen(!open)} />
+      {open && <NavLink label="Home" />}
+    </header>
+  );
+}"""
+
+ARROW = """import { ArrowRight } from 'lucide-react';
+
+const Footer = () => (
+  <footer className="py-8">
+    <ArrowRight /> (c) 2025 AI Wonderland
+  </footer>
+);
+
+export default Footer;"""
+
+VUE_MODULE = """<template>
+  <div class="hero">
+    <h1>{{ title }}</h1>
+    <template v-if="subtitle"><p>{{ subtitle }}</p></template>
+  </div>
+</template>
+
+<script setup>
+import { ref } from 'vue'
+const title = ref('Welcome')
+const subtitle = ref('')
+</script>
+
+<style scoped>
+.hero { padding: 2rem; }
+</style>"""
+
+
+def module_lines(page: str):
+    """Lines outside any function body (column 0), which must be imports, declarations or closers"""
+    return [line for line in page.splitlines() if line and not line[0].isspace()]
+
+
+def test_full_react_modules_are_reduced_to_jsx():
+    fragments = [generate_mock_code("react"), strip_code_fences(FAKE_CODE), "<section>\n  <p>Bare</p>\n</section>"]
+    page = stitch_sections("react", fragments)
+
+    assert page.count("import React") == 1
+    assert page.startswith("import React from 'react';")
+    assert page.count("export default") == 1
+    assert "function Component" not in page
+    for index in (1, 2, 3):
+        assert f"function Section{index}() {{\n  return (\n    <>\n" in page
+    assert '      <div className="min-h-screen bg-gray-50 flex items-center justify-center">' in page
+    for line in module_lines(page):
+        assert re.match(r"(import |function |export default function |\}|\);)", line), line
+
+
+def test_react_modules_with_state_or_helpers_stay_standalone_components():
+    page = stitch_sections("react", [STATEFUL, ARROW, generate_mock_code("react"), None])
+
+    assert page.splitlines()[:2] == [
+        "import React, { useState } from 'react';",
+        "import { Menu } from 'lucide-react';"
+    ]
+    assert page.count("from 'lucide-react'") == 2  # Menu and ArrowRight, each once
+    # The stateful header keeps its hook and helper, renamed to its section
+    assert "function Section1() {\n  const [open, setOpen] = useState(false);" in page
+    assert "function NavLink({ label })" in page
+    # The arrow component only returns JSX, so it is inlined
+    assert "const Footer" not in page and "<ArrowRight /> (c) 2025 AI Wonderland" in page
+    assert "Section 4 could not be generated" in page
+    assert page.count("export default") == 1
+    assert "Header" not in page
+
+
+def test_standalone_sections_with_the_same_names_do_not_collide():
+    stateful = STATEFUL.replace("export default function Header", "export default function Component")
+    page = stitch_sections("nextjs", ["'use client';\n" + stateful, stateful])
+
+    assert page.startswith("'use client';\n\nimport { useState } from 'react';")
+    assert "function Section1()" in page and "function Section2()" in page
+    assert "function NavLink1(" in page and "function NavLink2(" in page
+    assert "<NavLink2 label" in page and "function Component" not in page
+
+
+def test_reduce_jsx_keeps_modules_it_cannot_parse_standalone():
+    unbalanced = "export default function Smile() {\n  return (\n    <p>Hi :)</p>\n  );\n}"
+    fragment = reduce_jsx(unbalanced)
+    assert fragment.standalone and fragment.component == "Smile"
+    assert fragment.body.startswith("function Smile()")
+
+
+def test_full_vue_components_are_merged_into_one_component():
+    options = "<template><p>{{ count }}</p></template>\n<script>\nexport default { data() { return { count: 1 } } }\n</script>"
+    page = stitch_sections("vue", [VUE_MODULE, options, "<p>Bare</p>"])
+
+    assert page.count("<template>") == 1 and page.count("</template>") == 2  # the page's and section 1's v-if
+    assert page.startswith("<template>\n  <main>\n")
+    assert '<section data-section="1">' in page and "<h1>{{ title }}</h1>" in page
+    assert "<template v-if=\"subtitle\"><p>{{ subtitle }}</p></template>" in page
+    assert page.count("<script") == 1
+    assert "<script setup>\nimport { ref } from 'vue'\n\nconst title = ref('Welcome')" in page
+    assert "Options API script was not merged" in page and "export default" not in page
+    assert "<style scoped>\n.hero { padding: 2rem; }\n</style>" in page
+
+
+def test_full_html_documents_are_reduced_to_their_body():
+    page = stitch_sections("html", [generate_mock_code("html"), generate_mock_code("html"), "<p>Bare</p>"])
+
+    assert page.count("<!DOCTYPE html>") == 1
+    assert page.count("<html") == 1 and page.count("<body>") == 1 and page.count("<head>") == 1
+    assert page.count("<title>") == 0
+    # Identical head styles from both sections are kept once, in the page head
+    assert page.count("<style>") == 1
+    assert page.index("<style>") < page.index("</head>")
+    assert page.count('<div class="container">') == 2
+    assert '<section data-section="3">\n    <p>Bare</p>\n  </section>' in page
+
+
+def test_tailwind_pages_load_the_cdn_once():
+    document = '<html><head><script src="https://cdn.tailwindcss.com"></script></head><body><p class="p-4">x</p></body></html>'
+    markup, assets = reduce_html(document)
+    assert markup == '<p class="p-4">x</p>'
+    page = stitch_sections("tailwind", [document, document])
+    assert page.count("cdn.tailwindcss.com") == 1
@@ -0,0 +1,59 @@
+import base64
+import os
+import pickle
+import sys
+
+import pytest
+
+from utils.processed_image import BASE64_CHUNK_SIZE, ProcessedImage
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+import bench_payload_memory  # noqa: E402
+
+
+def image(data: bytes, mime_type: str = "image/jpeg") -> ProcessedImage:
+    return ProcessedImage(data=data, mime_type=mime_type, format="JPEG", width=2048, height=1152)
+
+
+def test_payloads_peak_below_the_legacy_flow():
+    encoded = os.urandom(4 * 1024 * 1024)
+    legacy = bench_payload_memory.peak_allocation(bench_payload_memory.legacy_payloads, encoded)
+    processed = bench_payload_memory.peak_allocation(bench_payload_memory.processed_payloads, encoded)
+    assert processed < legacy
+    # Only the base64 buffer and the data URL str, each 4/3 of the bytes, are full size
+    assert processed < len(encoded) * 4 // 3 * 2.2
+
+
+@pytest.mark.parametrize("size", [0, 1, 2, 3, BASE64_CHUNK_SIZE - 1, BASE64_CHUNK_SIZE, 3 * BASE64_CHUNK_SIZE + 2])
+def test_data_url_matches_b64encode(size):
+    data = os.urandom(size)
+    processed = image(data, "image/webp")
+    assert processed.data_url == "data:image/webp;base64," + base64.b64encode(data).decode()
+    assert processed.base64 == base64.b64encode(data).decode()
+
+
+def test_with_upload_shares_the_cached_data_url():
+    original = image(os.urandom(1024 * 1024))
+    url = original.data_url
+    copy = original.with_upload("second.png", 123)
+    second = copy.with_upload("third.png", 456)
+
+    assert copy.data is original.data
+    assert copy.data_url is url and second.data_url is url
+    assert (copy.filename, copy.size) == ("second.png", 123)
+    assert original.filename is None
+
+
+def test_copies_made_before_the_data_url_share_it_once_built():
+    original = image(os.urandom(4096))
+    copy = original.with_upload("second.png", 10)
+    assert copy.data_url is original.data_url
+
+
+def test_pickling_drops_the_cached_data_url():
+    original = image(os.urandom(4096))
+    url = original.data_url
+    restored = pickle.loads(pickle.dumps(original.with_upload("copy.png", 10)))
+    assert restored._data_url is None and restored._origin is None
+    assert restored.data_url == url and restored.filename == "copy.png"
@@ -0,0 +1,51 @@
+import asyncio
+
+import pytest
+
+from utils.rate_limiter import UpstreamGovernor
+
+
+def available(governor: UpstreamGovernor, model: str):
+    budget = governor._budget(model)
+    return budget.requests.available(), budget.tokens.available()
+
+
+def test_cancelled_while_waiting_for_a_slot_refunds_the_budget():
+    governor = UpstreamGovernor(max_concurrency=1, rpm=60, tpm=60000)
+
+    async def scenario():
+        async with governor.permit("gpt-4o", 1000):
+            before = available(governor, "gpt-4o")
+            waiter = asyncio.ensure_future(governor.permit("gpt-4o", 5000).__aenter__())
+            await asyncio.sleep(0.01)
+            assert governor.stats()["queue_depth"] == 1
+            assert available(governor, "gpt-4o")[1] < before[1] - 4000
+            waiter.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await waiter
+            return before, available(governor, "gpt-4o")
+
+    before, after = asyncio.run(scenario())
+    assert after[0] == pytest.approx(before[0], abs=0.1)
+    assert after[1] == pytest.approx(before[1], abs=100)
+    assert governor.stats()["queue_depth"] == 0
+
+
+def test_cancelled_while_throttled_refunds_the_budget():
+    governor = UpstreamGovernor(max_concurrency=4, rpm=60, tpm=1000)
+
+    async def scenario():
+        async with governor.permit("gpt-4o", 1000):
+            pass
+        before = available(governor, "gpt-4o")
+        waiter = asyncio.ensure_future(governor.permit("gpt-4o", 500).__aenter__())
+        await asyncio.sleep(0.01)
+        assert governor.stats()["throttled"] == 1
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        return before, available(governor, "gpt-4o")
+
+    before, after = asyncio.run(scenario())
+    assert after[0] == pytest.approx(before[0], abs=0.1)
+    assert after[1] == pytest.approx(before[1], abs=10)
@@ -0,0 +1,25 @@
+import asyncio
+
+import pytest
+
+from utils.resilience import call_with_retries, latency_tracker
+
+
+def test_timed_out_attempts_are_recorded_as_latency():
+    async def slow():
+        await asyncio.sleep(1)
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(call_with_retries(slow, "test-timeout", timeout=0.05, max_attempts=2, hedge=False))
+
+    samples = latency_tracker._samples["test-timeout"]
+    assert len(samples) == 2
+    assert all(0.05 <= seconds < 0.5 for seconds in samples)
+
+
+def test_successful_attempts_are_recorded_once():
+    async def fast():
+        return "done"
+
+    assert asyncio.run(call_with_retries(fast, "test-success", timeout=1, max_attempts=3, hedge=False)) == "done"
+    assert len(latency_tracker._samples["test-success"]) == 1
@@ -0,0 +1,24 @@
+import pytest
+
+from utils.structured_output import SCHEMA_INSTRUCTION, openai_structured, split_schema_prompt
+
+SCHEMA = {"title": "ui_elements", "type": "object"}
+
+
+@pytest.mark.parametrize("model", ["gpt-4o", "gpt-4o-mini", "gpt-4.1", "o4-mini"])
+def test_json_schema_models_get_a_strict_response_format(model):
+    prompt, extra = openai_structured(model, "List the elements", SCHEMA)
+    assert prompt == "List the elements"
+    assert extra["response_format"]["json_schema"] == {"name": "ui_elements", "schema": SCHEMA, "strict": True}
+
+
+@pytest.mark.parametrize("model", ["gpt-4-vision-preview", "gpt-4-turbo", "gpt-4o-2024-05-13"])
+def test_older_models_get_the_schema_in_the_prompt(model):
+    prompt, extra = openai_structured(model, "List the elements", SCHEMA)
+    assert extra == {}
+    assert SCHEMA_INSTRUCTION in prompt
+    assert split_schema_prompt(prompt) == ("List the elements", True)
+
+
+def test_no_schema_changes_nothing():
+    assert openai_structured("gpt-4-vision-preview", "Write code", None) == ("Write code", {})
@@ -0,0 +1,56 @@
+import asyncio
+import io
+
+from PIL import Image, ImageDraw, ImageFont
+
+from utils import conversion, page_tiler
+from utils.processed_image import ProcessedImage
+from utils.typography import estimate_page_typography_from_bytes, estimate_typography_from_bytes
+
+
+def text_section(lines: int, size: int, width: int = 800) -> bytes:
+    image = Image.new("RGB", (width, 60 * lines + 40), "white")
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default(size=size)
+    for index in range(lines):
+        draw.text((40, 30 + 60 * index), "Readable paragraph text with several words", fill="black", font=font)
+    buffered = io.BytesIO()
+    image.save(buffered, format="PNG")
+    return buffered.getvalue()
+
+
+def section(data: bytes, original_width: int) -> ProcessedImage:
+    width, height = Image.open(io.BytesIO(data)).size
+    return ProcessedImage(
+        data=data, mime_type="image/png", format="PNG", width=width, height=height,
+        original_width=original_width, original_height=height * original_width // width,
+        image_tokens={"estimated_tokens": 85}
+    )
+
+
+def test_single_section_page_typography_matches_the_image_estimate():
+    data = text_section(4, 24)
+    assert estimate_page_typography_from_bytes([(data, 1.5)]) == estimate_typography_from_bytes(data, 1.5)
+
+
+def test_tiled_conversion_sends_typography_hints_to_every_section(monkeypatch):
+    sections = [section(text_section(3, 24), 800), section(text_section(3, 24), 800)]
+    prompts = []
+
+    async def tile(*args, **kwargs):
+        return sections
+
+    async def generate(image_data, hints=None, **kwargs):
+        prompts.append(hints)
+        return {"code": "<p>Section</p>", "model": "gpt-4o", "provider": "fake"}
+
+    monkeypatch.setattr(conversion, "tile_upload", tile)
+    monkeypatch.setattr(page_tiler, "generate_code_from_image", generate)
+
+    result = asyncio.run(conversion.convert_upload(None, typography_hints=True, tiled=True))
+
+    assert len(result["metadata"]["sections"]) == 2
+    assert len(prompts) == 2
+    for hints in prompts:
+        assert hints.startswith("Measured typography (in image pixels): body text ")
+        assert "This image is section" in hints
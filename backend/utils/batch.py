@@ -0,0 +1,198 @@
+"""
+Batch
+Collects the images of a batch upload and converts them with bounded concurrency
+"""
+
+import asyncio
+import io
+import os
+import posixpath
+import time
+import zipfile
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from fastapi import UploadFile
+from starlette.datastructures import Headers
+from utils.executor import ExecutorBusyError
+from utils.image_processor import ALLOWED_EXTENSIONS, MAX_SIZE
+from utils.rate_limiter import UpstreamBusyError
+
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", 4))  # items converted at once per batch
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", 500))
+BATCH_ZIP_MAX_BYTES = int(os.getenv("BATCH_ZIP_MAX_BYTES", 536870912))  # 512MB uncompressed per archive
+BATCH_ZIP_MAX_RATIO = float(os.getenv("BATCH_ZIP_MAX_RATIO", 100))  # uncompressed / compressed per entry
+
+
+class BatchError(ValueError):
+    """Raised when a batch upload as a whole is unusable"""
+
+
+class BatchItem:
+    """
+    One image of a batch
+
+    Multipart items wrap the upload as is. Archive items are read from the
+    zip only when their turn comes, so at most `concurrency` decompressed
+    images are held at once.
+    """
+
+    __slots__ = ("filename", "upload", "archive", "info")
+
+    def __init__(
+        self,
+        filename: str,
+        upload: Optional[UploadFile] = None,
+        archive: Optional[zipfile.ZipFile] = None,
+        info: Optional[zipfile.ZipInfo] = None
+    ):
+        self.filename = filename
+        self.upload = upload
+        self.archive = archive
+        self.info = info
+
+    async def open(self) -> UploadFile:
+        """The item as an UploadFile, so it can go through process_image"""
+        if self.upload is not None:
+            return self.upload
+        data = await asyncio.to_thread(read_member, self.archive, self.info)
+        return UploadFile(
+            io.BytesIO(data),
+            size=len(data),
+            filename=self.filename,
+            headers=Headers({"content-type": "application/octet-stream"})
+        )
+
+
+def read_member(archive: zipfile.ZipFile, info: zipfile.ZipInfo) -> bytes:
+    """Read one archive entry, never decompressing more than MAX_SIZE + 1 bytes"""
+    with archive.open(info) as member:
+        data = member.read(MAX_SIZE + 1)
+    if len(data) > MAX_SIZE:
+        raise ValueError(f"File size exceeds maximum allowed size of {MAX_SIZE} bytes")
+    return data
+
+
+def is_image_entry(info: zipfile.ZipInfo) -> bool:
+    """Image files by extension, skipping directories and macOS/hidden metadata"""
+    if info.is_dir():
+        return False
+    parts = info.filename.split("/")
+    if any(part.startswith(".") or part == "__MACOSX" for part in parts):
+        return False
+    return posixpath.splitext(info.filename)[1].lower() in ALLOWED_EXTENSIONS
+
+
+def open_archive(file: UploadFile, max_items: int = BATCH_MAX_ITEMS) -> List[BatchItem]:
+    """
+    List the images in an uploaded zip without extracting them
+
+    Entries are checked against the central directory before anything is
+    decompressed: each declared size against MAX_UPLOAD_SIZE, each
+    compression ratio against BATCH_ZIP_MAX_RATIO and the total against
+    BATCH_ZIP_MAX_BYTES. read_member still caps the actual output, since
+    declared sizes can lie. Blocking; run it in a thread.
+
+    Args:
+        file: Uploaded zip archive
+        max_items: Most images accepted
+
+    Returns:
+        Items in archive order
+
+    Raises:
+        BatchError: If the archive is invalid or breaks a limit
+    """
+    try:
+        archive = zipfile.ZipFile(file.file)
+    except zipfile.BadZipFile:
+        raise BatchError("Archive is not a valid zip file")
+
+    entries = [info for info in archive.infolist() if is_image_entry(info)]
+    if len(entries) > max_items:
+        raise BatchError(f"Archive holds {len(entries)} images; the limit is {max_items}")
+
+    total = 0
+    for info in entries:
+        if info.flag_bits & 0x1:
+            raise BatchError(f"Encrypted entries are not supported: {info.filename}")
+        if info.file_size > MAX_SIZE:
+            raise BatchError(f"{info.filename} exceeds the maximum file size of {MAX_SIZE} bytes")
+        if info.compress_size and info.file_size / info.compress_size > BATCH_ZIP_MAX_RATIO:
+            raise BatchError(f"{info.filename} is compressed suspiciously well; refusing to extract it")
+        total += info.file_size
+    if total > BATCH_ZIP_MAX_BYTES:
+        raise BatchError(f"Archive expands to {total} bytes; the limit is {BATCH_ZIP_MAX_BYTES}")
+
+    return [BatchItem(info.filename, archive=archive, info=info) for info in entries]
+
+
+def error_status(error: Exception) -> int:
+    """HTTP status an item would have got as a single /convert call"""
+    if isinstance(error, (ExecutorBusyError, UpstreamBusyError)):
+        return 503
+    if isinstance(error, ValueError):
+        return 422
+    return 500
+
+
+async def run_batch(
+    items: List[BatchItem],
+    convert: Callable[[BatchItem], Awaitable[Dict[str, Any]]],
+    concurrency: int = BATCH_CONCURRENCY
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Convert every item and yield each result as soon as it is ready
+
+    `concurrency` workers pull items in order, so results arrive roughly
+    in order but are yielded as they complete, tagged with their index.
+    A failing item yields an error result and the batch carries on. A
+    summary follows the last result. Closing the generator (the client
+    went away) cancels the items still running.
+
+    Args:
+        items: Items to convert
+        convert: Coroutine function returning the result fields for one item
+        concurrency: Items converted at once
+
+    Yields:
+        {"type": "result", "index", "filename", "success", ...} per item,
+        then {"type": "summary", ...}
+    """
+    started = time.perf_counter()
+    results: asyncio.Queue = asyncio.Queue()
+    pending = iter(range(len(items)))
+
+    async def worker() -> None:
+        # Workers share one iterator, so each index is taken exactly once
+        for index in pending:
+            item = items[index]
+            item_started = time.perf_counter()
+            line: Dict[str, Any] = {"type": "result", "index": index, "filename": item.filename}
+            try:
+                line.update(success=True, **await convert(item))
+            except Exception as e:
+                line.update(success=False, error=str(e), status=error_status(e))
+                if isinstance(e, UpstreamBusyError):
+                    line["retry_after"] = e.retry_after_header
+            line["elapsed_ms"] = round((time.perf_counter() - item_started) * 1000, 3)
+            await results.put(line)
+
+    workers = [asyncio.create_task(worker()) for _ in range(min(max(1, concurrency), len(items)))]
+    succeeded = 0
+    try:
+        for _ in range(len(items)):
+            line = await results.get()
+            succeeded += line["success"]
+            yield line
+    finally:
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    yield {
+        "type": "summary",
+        "total": len(items),
+        "succeeded": succeeded,
+        "failed": len(items) - succeeded,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 3)
+    }
@@ -0,0 +1,110 @@
+"""
+Code Fences
+Strips Markdown code fences from model output, incrementally or all at once
+"""
+
+from typing import List
+
+# Lines held back before the first fence; more than this without a fence is unfenced code
+PREAMBLE_MAX_LINES = 5
+
+
+def is_fence(line: str) -> bool:
+    return line.strip().startswith("```")
+
+
+def could_become_fence(partial: str) -> bool:
+    """Whether an unfinished line might still turn out to be a fence"""
+    stripped = partial.lstrip()
+    return stripped == "" or "```".startswith(stripped[:3])
+
+
+class FenceStripper:
+    """
+    Removes the Markdown fence a model wraps around code, chunk by chunk
+
+    Text is forwarded as soon as it cannot be part of a fence line; only
+    an unfinished line that could still become ``` is held back. The
+    first fence opens the code block (leading blank lines are dropped)
+    and the next fence closes it; anything after the closing fence, such
+    as an explanation, is discarded.
+
+    Lines before the first fence are held until it arrives, so a preamble
+    like "Here is the component:" is dropped with it. Output with no fence
+    in its first PREAMBLE_MAX_LINES lines is unfenced code and passes
+    through, those lines included.
+    """
+
+    def __init__(self):
+        self._line = ""  # unfinished line not yet forwarded
+        self._line_emitted = False  # part of the unfinished line was already forwarded
+        self._preamble: List[str] = []  # complete lines held back before the first fence
+        self._content = False  # non-blank code has been forwarded
+        self._fenced = False
+        self._closed = False
+
+    def feed(self, text: str) -> str:
+        """Add streamed text and return whatever can be forwarded now"""
+        if self._closed:
+            return ""
+
+        out: List[str] = []
+        self._line += text
+        while "\n" in self._line and not self._closed:
+            line, self._line = self._line.split("\n", 1)
+            out.append(self._complete_line(line))
+
+        if self._closed:
+            self._line = ""
+        elif self._holding():
+            # Wait for the whole line: it may still be preamble
+            pass
+        elif self._line and (self._line_emitted or not could_become_fence(self._line)):
+            if self._content or self._line.strip():
+                out.append(self._line)
+                self._content = True
+                self._line_emitted = True
+            self._line = ""
+        return "".join(out)
+
+    def finish(self) -> str:
+        """Flush the final unfinished line at the end of the stream"""
+        line, self._line = self._line, ""
+        if self._closed or (not self._line_emitted and is_fence(line)):
+            return ""
+        if self._preamble:
+            # The stream ended without a fence, so the held lines were code
+            line, self._preamble = "\n".join(self._preamble + [line]), []
+        return line if self._content or line.strip() else ""
+
+    def _holding(self) -> bool:
+        return not self._fenced and not self._content
+
+    def _complete_line(self, line: str) -> str:
+        emitted = self._line_emitted
+        self._line_emitted = False
+        if not emitted and is_fence(line):
+            if self._holding():
+                self._fenced = True
+                self._preamble = []
+            else:
+                self._closed = True
+            return ""
+        if self._holding():
+            if self._preamble or line.strip():
+                self._preamble.append(line)
+            if len(self._preamble) <= PREAMBLE_MAX_LINES:
+                return ""
+            held, self._preamble = self._preamble, []
+            self._content = True
+            return "\n".join(held) + "\n"
+        if not self._content and not line.strip():
+            return ""
+        self._content = True
+        return line + "\n"
+
+
+def strip_code_fences(code: str) -> str:
+    """Remove the Markdown code fence around a complete response"""
+    stripper = FenceStripper()
+    return (stripper.feed(code) + stripper.finish()).rstrip()
@@ -0,0 +1,219 @@
+"""
+Color Palette
+Extracts a dominant colour palette locally with vectorised k-means
+"""
+
+import io
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+from PIL import Image
+
+SAMPLE_SIDE = 160  # longest side of the downsample that gets clustered
+MAX_CLUSTER_COLORS = 2048  # unique colours above this are bucketed to 5 bits per channel
+KMEANS_ITERATIONS = 12
+
+# sRGB (D65) to XYZ
+RGB_TO_XYZ = np.array([
+    [0.4124564, 0.3575761, 0.1804375],
+    [0.2126729, 0.7151522, 0.0721750],
+    [0.0193339, 0.1191920, 0.9503041]
+], dtype=np.float32)
+D65_WHITE = np.array([0.95047, 1.0, 1.08883], dtype=np.float32)
+
+
+def extract_palette_from_bytes(data: bytes, count: int = 6, perceptual: bool = False) -> List[Dict[str, Any]]:
+    """
+    Decode an encoded image and extract its palette
+
+    Module-level so it can run in the image executor.
+
+    Args:
+        data: Encoded image bytes
+        count: Maximum number of colours to return
+        perceptual: Cluster in CIE Lab instead of RGB
+
+    Returns:
+        Palette entries, most used first
+    """
+    image = Image.open(io.BytesIO(data))
+    image.draft("RGB", (SAMPLE_SIDE, SAMPLE_SIDE))
+    return extract_palette(image, count, perceptual)
+
+
+def extract_palette(image: Image.Image, count: int = 6, perceptual: bool = False) -> List[Dict[str, Any]]:
+    """
+    Extract the dominant colours of an image
+
+    The image is downsampled with nearest-neighbour sampling (so only real
+    colours appear), reduced to unique colours with their pixel counts,
+    and clustered with frequency-weighted k-means.
+
+    Args:
+        image: Image to analyse
+        count: Maximum number of colours to return
+        perceptual: Cluster in CIE Lab instead of RGB
+
+    Returns:
+        Palette entries with hex, rgb, usage percentage and a role name
+    """
+    colors, weights = sample_colors(image)
+    features = rgb_to_lab(colors) if perceptual else colors.astype(np.float32)
+
+    k = max(1, min(count, len(colors)))
+    centers = kmeans(features, weights, k)
+    labels = nearest(features, centers)
+
+    total = float(weights.sum())
+    palette = []
+    for cluster in range(k):
+        members = labels == cluster
+        if not members.any():
+            continue
+        member_weights = weights[members]
+        # Report the most frequent real colour rather than a blended mean
+        representative = colors[members][member_weights.argmax()]
+        palette.append({
+            "hex": "#{:02x}{:02x}{:02x}".format(*representative),
+            "rgb": [int(channel) for channel in representative],
+            "usage": round(float(member_weights.sum()) / total * 100, 1)
+        })
+
+    palette.sort(key=lambda entry: entry["usage"], reverse=True)
+    assign_roles(palette)
+    return palette
+
+
+def sample_colors(image: Image.Image) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Downsample an image and collapse it to unique colours with counts
+
+    Returns:
+        (N, 3) uint8 colours and (N,) float32 pixel counts
+    """
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    if max(image.size) > SAMPLE_SIDE:
+        ratio = SAMPLE_SIDE / max(image.size)
+        image = image.resize(
+            (max(1, round(image.width * ratio)), max(1, round(image.height * ratio))),
+            Image.Resampling.NEAREST
+        )
+
+    pixels = np.asarray(image, dtype=np.uint8).reshape(-1, 3)
+    packed = (pixels[:, 0].astype(np.uint32) << 16) | (pixels[:, 1].astype(np.uint32) << 8) | pixels[:, 2]
+    unique, counts = np.unique(packed, return_counts=True)
+
+    if len(unique) > MAX_CLUSTER_COLORS:
+        # Photographic content: bucket to 5 bits per channel (centred) so
+        # every pixel still counts towards usage but k-means sees far fewer points
+        unique, counts = np.unique((packed & 0xF8F8F8) | 0x040404, return_counts=True)
+
+    colors = np.stack([(unique >> 16) & 0xFF, (unique >> 8) & 0xFF, unique & 0xFF], axis=1).astype(np.uint8)
+    return colors, counts.astype(np.float32)
+
+
+def kmeans(features: np.ndarray, weights: np.ndarray, k: int) -> np.ndarray:
+    """
+    Frequency-weighted k-means with deterministic k-means++ seeding
+
+    Args:
+        features: (N, D) points
+        weights: (N,) point weights
+        k: Number of clusters
+
+    Returns:
+        (k, D) cluster centres
+    """
+    # Seed with the most frequent colour, then repeatedly the point that is
+    # furthest (weighted) from every centre chosen so far
+    centers = [features[weights.argmax()]]
+    distances = ((features - centers[0]) ** 2).sum(axis=1)
+    for _ in range(1, k):
+        candidate = (distances * weights).argmax()
+        centers.append(features[candidate])
+        distances = np.minimum(distances, ((features - features[candidate]) ** 2).sum(axis=1))
+    centers = np.array(centers, dtype=np.float32)
+
+    for _ in range(KMEANS_ITERATIONS):
+        labels = nearest(features, centers)
+        sums = np.zeros_like(centers)
+        np.add.at(sums, labels, features * weights[:, None])
+        totals = np.bincount(labels, weights=weights, minlength=k)[:, None]
+        updated = np.where(totals > 0, sums / np.maximum(totals, 1e-9), centers)
+        if np.allclose(updated, centers, atol=0.5):
+            break
+        centers = updated.astype(np.float32)
+    return centers
+
+
+def nearest(features: np.ndarray, centers: np.ndarray) -> np.ndarray:
+    """Index of the closest centre for each point"""
+    distances = (
+        (features ** 2).sum(axis=1)[:, None]
+        - 2 * features @ centers.T
+        + (centers ** 2).sum(axis=1)[None, :]
+    )
+    return distances.argmin(axis=1)
+
+
+def rgb_to_lab(colors: np.ndarray) -> np.ndarray:
+    """Convert (N, 3) uint8 sRGB colours to CIE Lab"""
+    rgb = colors.astype(np.float32) / 255.0
+    linear = np.where(rgb > 0.04045, ((rgb + 0.055) / 1.055) ** 2.4, rgb / 12.92)
+    xyz = linear @ RGB_TO_XYZ.T / D65_WHITE
+    f = np.where(xyz > 0.008856, np.cbrt(xyz), 7.787 * xyz + 16 / 116)
+    return np.stack([116 * f[:, 1] - 16, 500 * (f[:, 0] - f[:, 1]), 200 * (f[:, 1] - f[:, 2])], axis=1)
+
+
+def relative_luminance(rgb: List[int]) -> float:
+    """WCAG relative luminance of an sRGB colour"""
+    channels = [c / 255.0 for c in rgb]
+    linear = [c / 12.92 if c <= 0.04045 else ((c + 0.055) / 1.055) ** 2.4 for c in channels]
+    return 0.2126 * linear[0] + 0.7152 * linear[1] + 0.0722 * linear[2]
+
+
+def contrast_ratio(first: List[int], second: List[int]) -> float:
+    """WCAG contrast ratio between two colours"""
+    lighter, darker = sorted((relative_luminance(first), relative_luminance(second)), reverse=True)
+    return (lighter + 0.05) / (darker + 0.05)
+
+
+def saturation(rgb: List[int]) -> float:
+    """HSV saturation in [0, 1]"""
+    high, low = max(rgb), min(rgb)
+    return 0.0 if high == 0 else (high - low) / high
+
+
+def assign_roles(palette: List[Dict[str, Any]]) -> None:
+    """
+    Guess a semantic role for each palette entry, in place
+
+    The most used colour is the background, the colour with the highest
+    contrast against it is text, and the most saturated remaining colours
+    become primary and accent. Anything left is a surface or neutral.
+    """
+    if not palette:
+        return
+
+    background = palette[0]
+    background["name"] = "Background"
+    remaining = palette[1:]
+
+    if remaining:
+        text = max(remaining, key=lambda entry: contrast_ratio(entry["rgb"], background["rgb"]))
+        if contrast_ratio(text["rgb"], background["rgb"]) >= 3.0:
+            text["name"] = "Text"
+            remaining = [entry for entry in remaining if entry is not text]
+
+    colorful = sorted(
+        (entry for entry in remaining if saturation(entry["rgb"]) >= 0.25),
+        key=lambda entry: saturation(entry["rgb"]) * (entry["usage"] ** 0.5),
+        reverse=True
+    )
+    for entry, name in zip(colorful, ("Primary", "Accent", "Secondary")):
+        entry["name"] = name
+
+    for entry in remaining:
+        if "name" not in entry:
+            entry["name"] = "Surface" if relative_luminance(entry["rgb"]) > relative_luminance(background["rgb"]) * 0.8 else "Neutral"
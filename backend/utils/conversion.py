@@ -0,0 +1,164 @@
+"""
+Conversion
+Image-to-code conversion shared by the /convert route and background jobs
+"""
+
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from fastapi import UploadFile
+from utils.executor import image_executor
+from utils.image_processor import process_image
+from utils.typography import estimate_page_typography_from_bytes, typography_hint
+from utils.processed_image import ProcessedImage
+from utils.phash_index import PHASH_MAX_DISTANCE, PHASH_REUSE, code_index, dhash_from_bytes
+from utils.page_tiler import generate_tiled_code, tile_upload
+from utils.openai_handler import generate_code_from_image
+
+CONVERSION_STAGES = ("decode", "llm")
+
+
+async def convert_upload(
+    file: UploadFile,
+    framework: str = "react",
+    include_styling: bool = True,
+    model: str = "gpt-4-vision-preview",
+    resize_mode: Optional[str] = None,
+    detail_preset: Optional[str] = None,
+    typography_hints: bool = False,
+    tiled: bool = False,
+    use_cache: bool = True,
+    on_stage: Optional[Callable[[str], Awaitable[None]]] = None
+) -> Dict[str, Any]:
+    """
+    Convert an uploaded image to code
+
+    Args:
+        file: Image file to convert
+        framework: Target framework (html, react, nextjs, vue)
+        include_styling: Whether to include CSS/Tailwind styling
+        model: AI model to use for conversion
+        resize_mode: Downscale mode (quality, balanced, fast)
+        detail_preset: Output size preset (economy, balanced, max)
+        typography_hints: Measure typography locally and add it to the prompt
+        tiled: Split tall pages into sections generated concurrently
+        use_cache: Look the response up in the LLM cache first
+        on_stage: Awaited with each stage in CONVERSION_STAGES as it starts
+
+    Returns:
+        Generated code and metadata, as returned by /convert
+    """
+    async def report(stage: str) -> None:
+        if on_stage is not None:
+            await on_stage(stage)
+
+    await report("decode")
+    if tiled:
+        # Tall pages keep readable text by being cut into sections
+        sections = await tile_upload(file, resize_mode=resize_mode, detail_preset=detail_preset)
+    else:
+        # Process image
+        sections = [await process_image(file, resize_mode=resize_mode, detail_preset=detail_preset)]
+
+    hints = None
+    if typography_hints:
+        # Measured over the whole page, so every section shares one set of levels
+        scaled = [(section.data, section.original_width / section.width) for section in sections]
+        typography = await image_executor.run(estimate_page_typography_from_bytes, scaled)
+        hints = typography_hint(typography) or None
+
+    if len(sections) > 1:
+        await report("llm")
+        return await convert_sections(sections, framework, include_styling, model, hints, use_cache)
+    image_data = sections[0]
+
+    # Near-duplicate screenshots can reuse, or start from, earlier code
+    settings = (framework, include_styling, model, typography_hints)
+    reused = None
+    if PHASH_REUSE != "off":
+        if image_data.perceptual_hash is None:
+            image_data.perceptual_hash = await image_executor.run(dhash_from_bytes, image_data.data)
+        reused = code_index.search(
+            image_data.perceptual_hash,
+            PHASH_MAX_DISTANCE,
+            accept=lambda entry: entry["settings"] == settings
+        )
+
+    if reused is not None and PHASH_REUSE == "return":
+        code_result = reused[1]["result"]
+    else:
+        await report("llm")
+        # Generate code using AI
+        code_result = await generate_code_from_image(
+            image_data=image_data,
+            framework=framework,
+            include_styling=include_styling,
+            model=model,
+            hints=hints,
+            seed_code=reused[1]["result"]["code"] if reused is not None else None,
+            use_cache=use_cache
+        )
+        # Mock fallbacks are never worth reusing
+        if PHASH_REUSE != "off" and code_result["model"] != "mock":
+            code_index.add(image_data.perceptual_hash, {"settings": settings, "result": code_result})
+
+    return {
+        "success": True,
+        "code": code_result["code"],
+        "framework": framework,
+        "metadata": {
+            "model_used": model,
+            "provider": code_result.get("provider"),
+            "include_styling": include_styling,
+            "image_dimensions": image_data.dimensions,
+            "reencoded": image_data.reencoded,
+            "image_tokens": image_data.image_tokens,
+            "reused": {"mode": PHASH_REUSE, "distance": reused[0]} if reused is not None else None,
+            "cached": code_result.get("cached", False)
+        }
+    }
+
+
+async def convert_sections(
+    sections: List[ProcessedImage],
+    framework: str,
+    include_styling: bool,
+    model: str,
+    hints: Optional[str] = None,
+    use_cache: bool = True
+) -> Dict[str, Any]:
+    """Generate and stitch code for a page that was split into sections"""
+    code_result = await generate_tiled_code(
+        sections,
+        framework=framework,
+        include_styling=include_styling,
+        model=model,
+        hints=hints,
+        use_cache=use_cache
+    )
+
+    return {
+        "success": True,
+        "code": code_result["code"],
+        "framework": framework,
+        "metadata": {
+            "model_used": model,
+            "include_styling": include_styling,
+            "image_dimensions": {
+                "width": sections[0].original_width,
+                "height": sum(section.original_height for section in sections)
+            },
+            "sections": [
+                {
+                    "height": section.original_height,
+                    "image_dimensions": section.dimensions,
+                    "image_tokens": section.image_tokens
+                }
+                for section in sections
+            ],
+            "failed_sections": code_result["failed_sections"],
+            "cached_sections": code_result["cached_sections"],
+            "image_tokens": {
+                "estimated_tokens": sum(section.image_tokens["estimated_tokens"] for section in sections)
+            },
+            "reused": None
+        }
+    }
@@ -0,0 +1,108 @@
+"""
+Image Executor
+Runs CPU-bound image work off the event loop with a bounded queue
+"""
+
+import asyncio
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+IMAGE_EXECUTOR = os.getenv("IMAGE_EXECUTOR", "process")  # process, thread or inline
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", os.cpu_count() or 2))
+IMAGE_QUEUE_SIZE = int(os.getenv("IMAGE_QUEUE_SIZE", 64))
+
+EXECUTOR_BACKENDS = ("process", "thread", "inline")
+
+
+class ExecutorBusyError(RuntimeError):
+    """Raised when the image executor queue is full"""
+
+
+class BoundedExecutor:
+    """
+    Executor wrapper that caps the number of queued jobs
+
+    At most `max_workers` jobs run at once and at most `max_queue` more
+    wait for a worker; anything beyond that is rejected immediately
+    instead of piling up coroutines behind the pool.
+    """
+
+    def __init__(self, backend: str = "process", max_workers: int = 2, max_queue: int = 64):
+        if backend not in EXECUTOR_BACKENDS:
+            raise ValueError(f"Unknown executor backend '{backend}'. Use one of: {', '.join(EXECUTOR_BACKENDS)}")
+
+        self.backend = backend
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self._pool: Optional[Executor] = None
+        self._in_flight = 0
+        self._rejected = 0
+
+    @property
+    def in_flight(self) -> int:
+        """Jobs currently running or waiting for a worker"""
+        return self._in_flight
+
+    @property
+    def queue_depth(self) -> int:
+        """Jobs waiting for a worker"""
+        return max(0, self._in_flight - self.max_workers)
+
+    def _get_pool(self) -> Optional[Executor]:
+        if self.backend == "inline":
+            return None
+        if self._pool is None:
+            if self.backend == "process":
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="image")
+        return self._pool
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        """
+        Run a function on the configured backend
+
+        Args:
+            func: Module-level callable (must be picklable for the process backend)
+            *args: Positional arguments for func
+
+        Returns:
+            The function's return value
+
+        Raises:
+            ExecutorBusyError: If the queue is already full
+        """
+        if self._in_flight >= self.max_workers + self.max_queue:
+            self._rejected += 1
+            raise ExecutorBusyError("Image processing queue is full, try again shortly")
+
+        self._in_flight += 1
+        try:
+            pool = self._get_pool()
+            if pool is None:
+                return func(*args)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(pool, func, *args)
+        finally:
+            self._in_flight -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Return executor counters"""
+        return {
+            "backend": self.backend,
+            "workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "in_flight": self._in_flight,
+            "queue_depth": self.queue_depth,
+            "rejected": self._rejected
+        }
+
+    def shutdown(self) -> None:
+        """Shut down the underlying pool"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+image_executor = BoundedExecutor(IMAGE_EXECUTOR, IMAGE_WORKERS, IMAGE_QUEUE_SIZE)
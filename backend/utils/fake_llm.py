@@ -0,0 +1,214 @@
+"""
+Fake LLM
+In-process stand-in for the AsyncOpenAI client, for offline runs and tests
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import httpx
+import openai
+
+from utils.structured_output import SCHEMA_INSTRUCTION
+
+FAKE_LLM_LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", 200))  # time to first token
+FAKE_LLM_TOKENS_PER_SECOND = float(os.getenv("FAKE_LLM_TOKENS_PER_SECOND", 400))
+# Fault injection: share of calls that fail with a 500, and that are slowed down
+FAKE_LLM_ERROR_RATE = float(os.getenv("FAKE_LLM_ERROR_RATE", 0))
+FAKE_LLM_SLOW_RATE = float(os.getenv("FAKE_LLM_SLOW_RATE", 0))
+FAKE_LLM_SLOW_FACTOR = float(os.getenv("FAKE_LLM_SLOW_FACTOR", 10))  # latency multiplier for slowed calls
+FAKE_LLM_CHARS_PER_TOKEN = 4
+
+FAKE_CODE = """```jsx
+import React from 'react';
+
+export default function Component() {
+  return (
+    <div className="min-h-screen bg-gray-50 flex items-center justify-center">
+      <div className="max-w-md w-full bg-white rounded-lg shadow-lg p-8">
+        <h1 className="text-3xl font-bold text-gray-900 mb-4">Welcome to AI Wonderland</h1>
+        <p className="text-gray-600 mb-6">Image-to-code conversion powered by AI</p>
+        <button className="w-full bg-blue-600 text-white py-3 rounded-lg">Get Started</button>
+      </div>
+    </div>
+  );
+}
+```
+This component renders a centred welcome card."""
+
+# Returned when structured output is requested: a grid of cards, long enough to stream
+FAKE_ELEMENTS = json.dumps({
+    "elements": [
+        {
+            "type": kind,
+            "position": {"x": 10 + 30 * (card % 3), "y": 10 + 20 * (card // 3) + offset},
+            "size": {"width": 25, "height": height},
+            "content": text.format(card + 1),
+            "styling": {
+                "background": background, "color": color, "fontSize": font_size, "fontWeight": None,
+                "fontFamily": None, "border": None, "borderRadius": "0.5rem", "padding": None
+            }
+        }
+        for card in range(12)
+        for kind, offset, height, text, background, color, font_size in (
+            ("heading", 0, 4, "Card {}", None, "#111827", "1.25rem"),
+            ("button", 8, 4, "Open {}", "#2563eb", "#ffffff", "1rem")
+        )
+    ]
+})
+
+
+def count_prompt_tokens(messages: List[Dict[str, Any]]) -> int:
+    """Rough prompt size: text at 4 chars per token plus a flat cost per image"""
+    tokens = 0
+    for message in messages:
+        content = message["content"]
+        parts = content if isinstance(content, list) else [{"type": "text", "text": content}]
+        for part in parts:
+            tokens += len(part.get("text", "")) // FAKE_LLM_CHARS_PER_TOKEN if part["type"] == "text" else 765
+    return tokens
+
+
+def asks_for_schema(messages: List[Dict[str, Any]]) -> bool:
+    """Whether a prompt carries the schema instruction of structured_output.schema_prompt"""
+    for message in messages:
+        content = message["content"]
+        parts = content if isinstance(content, list) else [{"type": "text", "text": content}]
+        if any(part["type"] == "text" and SCHEMA_INSTRUCTION in part.get("text", "") for part in parts):
+            return True
+    return False
+
+
+def replay_key(prompt: str, image: bytes) -> str:
+    """Key a recorded response is replayed under: the prompt and the exact image payload"""
+    return hashlib.sha256(prompt.encode() + b"\0" + hashlib.sha256(image).digest()).hexdigest()
+
+
+def make_usage(prompt_tokens: int, completion_tokens: int) -> SimpleNamespace:
+    return SimpleNamespace(
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+        total_tokens=prompt_tokens + completion_tokens
+    )
+
+
+def server_error(message: str) -> openai.InternalServerError:
+    request = httpx.Request("POST", "http://fake-llm/v1/chat/completions")
+    return openai.InternalServerError(message, response=httpx.Response(500, request=request), body=None)
+
+
+class FakeCompletions:
+    """
+    Implements chat.completions.create with OpenAI-shaped responses
+
+    Calls with a response_format, or with the schema spelled out in the
+    prompt, get `structured_content` (JSON) instead of `content`.
+
+    With fault injection on, a call fails with a 500 after the normal
+    latency (error_rate), or has its latency multiplied by slow_factor
+    (slow_rate), to exercise retries and hedging.
+    """
+
+    def __init__(
+        self,
+        content: str,
+        latency_ms: float,
+        tokens_per_second: float,
+        error_rate: float = 0.0,
+        slow_rate: float = 0.0,
+        slow_factor: float = 1.0,
+        seed: Optional[int] = None,
+        structured_content: str = FAKE_ELEMENTS
+    ):
+        self.content = content
+        self.structured_content = structured_content
+        self.latency_ms = latency_ms
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.slow_factor = slow_factor
+        self.random = random.Random(seed)
+        self.calls = 0
+
+    def _latency_ms(self) -> float:
+        return self.latency_ms * (self.slow_factor if self.random.random() < self.slow_rate else 1)
+
+    async def create(self, model: str, messages: List[Dict[str, Any]], stream: bool = False, **kwargs: Any) -> Any:
+        self.calls += 1
+        prompt_tokens = count_prompt_tokens(messages)
+        structured = kwargs.get("response_format") or asks_for_schema(messages)
+        content = self.structured_content if structured else self.content
+        pieces = [
+            content[start:start + FAKE_LLM_CHARS_PER_TOKEN]
+            for start in range(0, len(content), FAKE_LLM_CHARS_PER_TOKEN)
+        ]
+        latency_ms = self._latency_ms()
+        if self.random.random() < self.error_rate:
+            await asyncio.sleep(latency_ms / 1000)
+            raise server_error("Injected upstream failure")
+
+        if stream:
+            include_usage = (kwargs.get("stream_options") or {}).get("include_usage", False)
+            return self._stream(model, pieces, prompt_tokens, include_usage, latency_ms)
+
+        await asyncio.sleep((latency_ms + len(pieces) / self.tokens_per_second * 1000) / 1000)
+        return SimpleNamespace(
+            id="fake-completion",
+            model=model,
+            created=int(time.time()),
+            choices=[SimpleNamespace(
+                index=0,
+                message=SimpleNamespace(role="assistant", content=content),
+                finish_reason="stop"
+            )],
+            usage=make_usage(prompt_tokens, len(pieces))
+        )
+
+    async def _stream(
+        self,
+        model: str,
+        pieces: List[str],
+        prompt_tokens: int,
+        include_usage: bool,
+        latency_ms: float
+    ) -> AsyncIterator[SimpleNamespace]:
+        await asyncio.sleep(latency_ms / 1000)
+        interval = 1 / self.tokens_per_second
+        for piece in pieces:
+            yield SimpleNamespace(
+                model=model,
+                choices=[SimpleNamespace(index=0, delta=SimpleNamespace(content=piece), finish_reason=None)],
+                usage=None
+            )
+            await asyncio.sleep(interval)
+        yield SimpleNamespace(
+            model=model,
+            choices=[SimpleNamespace(index=0, delta=SimpleNamespace(content=None), finish_reason="stop")],
+            usage=None
+        )
+        if include_usage:
+            yield SimpleNamespace(model=model, choices=[], usage=make_usage(prompt_tokens, len(pieces)))
+
+
+class FakeAsyncOpenAI:
+    """Drop-in for AsyncOpenAI covering client.chat.completions.create"""
+
+    def __init__(
+        self,
+        content: str = FAKE_CODE,
+        latency_ms: float = FAKE_LLM_LATENCY_MS,
+        tokens_per_second: float = FAKE_LLM_TOKENS_PER_SECOND,
+        error_rate: float = FAKE_LLM_ERROR_RATE,
+        slow_rate: float = FAKE_LLM_SLOW_RATE,
+        slow_factor: float = FAKE_LLM_SLOW_FACTOR,
+        seed: Optional[int] = None
+    ):
+        self.chat = SimpleNamespace(completions=FakeCompletions(
+            content, latency_ms, tokens_per_second, error_rate, slow_rate, slow_factor, seed
+        ))
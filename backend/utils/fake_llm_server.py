@@ -0,0 +1,500 @@
+"""
+Fake LLM Server
+OpenAI- and Anthropic-compatible HTTP stand-in with configurable latency, streaming speed and failures
+
+Serves POST /v1/chat/completions and POST /v1/messages, streamed or not,
+so the real SDKs can be pointed at it, either over the network
+(OPENAI_BASE_URL=http://host:port/v1, ANTHROPIC_BASE_URL=http://host:port)
+or in process with LLM_FAKE_SERVER=asgi. Responses are canned code or
+elements, or replayed from a file recorded with LLM_RECORD_PATH.
+
+Usage:
+    python -m utils.fake_llm_server --port 9000 --latency lognormal:800,0.5 --tokens-per-second 60 --rate-limit-rate 0.02
+"""
+
+import argparse
+import asyncio
+import base64
+import functools
+import hashlib
+import importlib
+import json
+import math
+import os
+import random
+import time
+import uuid
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from utils.fake_llm import (
+    FAKE_CODE, FAKE_ELEMENTS, FAKE_LLM_CHARS_PER_TOKEN, FAKE_LLM_ERROR_RATE, FAKE_LLM_LATENCY_MS,
+    FAKE_LLM_SLOW_FACTOR, FAKE_LLM_SLOW_RATE, FAKE_LLM_TOKENS_PER_SECOND, count_prompt_tokens, replay_key
+)
+from utils.structured_output import split_schema_prompt
+
+# Time to first token: constant:MS, uniform:LOW,HIGH, normal:MEAN,STDDEV,
+# lognormal:MEDIAN,SIGMA or recorded (replayed latencies, else the default)
+FAKE_LLM_LATENCY = os.getenv("FAKE_LLM_LATENCY", f"constant:{FAKE_LLM_LATENCY_MS:g}")
+FAKE_LLM_RATE_LIMIT_RATE = float(os.getenv("FAKE_LLM_RATE_LIMIT_RATE", 0))  # share of calls answered with 429
+FAKE_LLM_RPM = int(os.getenv("FAKE_LLM_RPM", 0))  # requests per minute before 429s; 0 is unlimited
+FAKE_LLM_RETRY_AFTER = float(os.getenv("FAKE_LLM_RETRY_AFTER", 1))  # seconds, sent with injected 429s
+FAKE_LLM_REPLAY = os.getenv("FAKE_LLM_REPLAY", "")  # JSONL written with LLM_RECORD_PATH
+FAKE_LLM_SEED = int(os.getenv("FAKE_LLM_SEED", 0))
+LATENCY_DISTRIBUTIONS = ("constant", "uniform", "normal", "lognormal", "recorded")
+
+
+class LatencyDistribution:
+    """Samples latencies in milliseconds from a spec such as lognormal:800,0.5"""
+
+    def __init__(self, spec: str):
+        kind, _, params = spec.partition(":")
+        self.kind = kind.strip()
+        self.params = [float(value) for value in params.split(",") if value.strip()]
+        expected = {"constant": 1, "uniform": 2, "normal": 2, "lognormal": 2, "recorded": 0}.get(self.kind)
+        if expected is None:
+            raise ValueError(f"Unknown latency distribution '{self.kind}'. Use one of: {', '.join(LATENCY_DISTRIBUTIONS)}")
+        if self.kind != "recorded" and len(self.params) != expected:
+            raise ValueError(f"Latency distribution '{self.kind}' takes {expected} parameter(s)")
+        self.spec = spec
+
+    def sample(self, rng: random.Random, recorded_ms: Optional[float] = None) -> float:
+        if self.kind == "recorded":
+            return recorded_ms if recorded_ms is not None else (self.params[0] if self.params else FAKE_LLM_LATENCY_MS)
+        if self.kind == "constant":
+            return self.params[0]
+        if self.kind == "uniform":
+            return rng.uniform(*self.params)
+        if self.kind == "normal":
+            return max(0.0, rng.gauss(*self.params))
+        median, sigma = self.params
+        return rng.lognormvariate(math.log(max(median, 1e-3)), sigma)
+
+
+class FakeServerConfig:
+    """Behaviour of the fake server; defaults come from the FAKE_LLM_* environment"""
+
+    def __init__(
+        self,
+        latency: str = FAKE_LLM_LATENCY,
+        tokens_per_second: float = FAKE_LLM_TOKENS_PER_SECOND,
+        error_rate: float = FAKE_LLM_ERROR_RATE,
+        slow_rate: float = FAKE_LLM_SLOW_RATE,
+        slow_factor: float = FAKE_LLM_SLOW_FACTOR,
+        rate_limit_rate: float = FAKE_LLM_RATE_LIMIT_RATE,
+        rpm: int = FAKE_LLM_RPM,
+        retry_after: float = FAKE_LLM_RETRY_AFTER,
+        replay: str = FAKE_LLM_REPLAY,
+        seed: int = FAKE_LLM_SEED
+    ):
+        self.latency = LatencyDistribution(latency)
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.slow_factor = slow_factor
+        self.rate_limit_rate = rate_limit_rate
+        self.rpm = rpm
+        self.retry_after = retry_after
+        self.replay = replay
+        self.seed = seed
+
+
+class Recordings:
+    """
+    Recorded responses to replay, keyed by prompt and image
+
+    A request gets a recording of its own prompt and image when there is
+    one (several recordings of it are cycled in order); otherwise a
+    recording of the same shape (code or structured), chosen by a hash
+    of the request so the choice is stable across runs.
+    """
+
+    def __init__(self, path: str = ""):
+        self.by_key: Dict[str, List[Dict[str, Any]]] = {}
+        self.by_shape: Dict[bool, List[Dict[str, Any]]] = {False: [], True: []}
+        self._turns: Dict[str, int] = {}
+        if path:
+            with open(path) as file:
+                for line in file:
+                    if line.strip():
+                        record = json.loads(line)
+                        self.by_key.setdefault(record["key"], []).append(record)
+                        self.by_shape[bool(record.get("structured"))].append(record)
+
+    def __len__(self) -> int:
+        return len(self.by_shape[False]) + len(self.by_shape[True])
+
+    def pick(self, key: str, structured: bool, request_digest: str) -> Optional[Dict[str, Any]]:
+        matches = self.by_key.get(key)
+        if matches:
+            turn = self._turns.get(key, 0)
+            self._turns[key] = turn + 1
+            return matches[turn % len(matches)]
+        candidates = self.by_shape[structured]
+        if not candidates:
+            return None
+        return candidates[int(request_digest[:8], 16) % len(candidates)]
+
+
+class RequestBudget:
+    """Fixed one-minute window of requests, for emulating an upstream RPM limit"""
+
+    def __init__(self, rpm: int):
+        self.rpm = rpm
+        self.window_start = time.monotonic()
+        self.used = 0
+
+    def take(self) -> Optional[float]:
+        """None if the request is allowed, else seconds until the window resets"""
+        if self.rpm <= 0:
+            return None
+        now = time.monotonic()
+        if now - self.window_start >= 60:
+            self.window_start, self.used = now, 0
+        if self.used >= self.rpm:
+            return 60 - (now - self.window_start)
+        self.used += 1
+        return None
+
+
+def prompt_text(messages: List[Dict[str, Any]], system: Any = None) -> str:
+    """Text parts of a conversation, images left out"""
+    parts: List[str] = [system] if isinstance(system, str) else []
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, str):
+            parts.append(content)
+        else:
+            parts.extend(part.get("text", "") for part in content or [] if part.get("type") == "text")
+    return "\n".join(parts)
+
+
+def image_payload(messages: List[Dict[str, Any]]) -> bytes:
+    """Decoded bytes of the first image in an OpenAI or Anthropic conversation"""
+    for message in messages:
+        content = message.get("content")
+        for part in content if isinstance(content, list) else []:
+            if part.get("type") == "image_url":
+                return base64.b64decode(part["image_url"]["url"].partition(",")[2])
+            if part.get("type") == "image" and part.get("source", {}).get("type") == "base64":
+                return base64.b64decode(part["source"]["data"])
+    return b""
+
+
+def split_tokens(content: str) -> List[str]:
+    return [content[start:start + FAKE_LLM_CHARS_PER_TOKEN] for start in range(0, len(content), FAKE_LLM_CHARS_PER_TOKEN)]
+
+
+def sse(data: Dict[str, Any], event: Optional[str] = None) -> str:
+    return (f"event: {event}\n" if event else "") + f"data: {json.dumps(data)}\n\n"
+
+
+def create_fake_llm_app(config: Optional[FakeServerConfig] = None) -> FastAPI:
+    """ASGI app serving the OpenAI and Anthropic endpoints with `config`'s behaviour"""
+    config = config or FakeServerConfig()
+    recordings = Recordings(config.replay)
+    budget = RequestBudget(config.rpm)
+    counters = {"requests": 0, "rate_limited": 0, "errors": 0, "replayed": 0, "streamed": 0}
+    app = FastAPI(title="Fake LLM", docs_url=None, redoc_url=None)
+
+    async def plan(api: str, body: Dict[str, Any], raw: bytes) -> Tuple[Optional[JSONResponse], Dict[str, Any]]:
+        """Decide one call's fate: an error response to send, or the content and pacing"""
+        counters["requests"] += 1
+        # One generator per request, so a run is reproducible for a given seed and arrival order
+        rng = random.Random(f"{config.seed}:{counters['requests']}")
+
+        wait = budget.take()
+        if wait is None and rng.random() < config.rate_limit_rate:
+            wait = config.retry_after
+        if wait is not None:
+            counters["rate_limited"] += 1
+            return error_response(api, 429, "rate_limit_error", "Rate limit reached (fake)", wait), {}
+
+        messages = body.get("messages") or []
+        prompt, schema_in_prompt = split_schema_prompt(prompt_text(messages, body.get("system")))
+        structured = bool(body.get("response_format")) or schema_in_prompt
+        record = recordings.pick(replay_key(prompt, image_payload(messages)), structured, hashlib.sha256(raw).hexdigest())
+        if record is not None:
+            counters["replayed"] += 1
+            content = record["content"]
+        else:
+            content = FAKE_ELEMENTS if structured else FAKE_CODE
+
+        latency_ms = config.latency.sample(rng, record.get("latency_ms") if record else None)
+        if rng.random() < config.slow_rate:
+            latency_ms *= config.slow_factor
+        await asyncio.sleep(latency_ms / 1000)
+
+        if rng.random() < config.error_rate:
+            counters["errors"] += 1
+            return error_response(api, 500, "api_error", "Injected upstream failure (fake)"), {}
+
+        pieces = split_tokens(content)
+        max_tokens = body.get("max_tokens") or body.get("max_completion_tokens")
+        finish = "stop"
+        if max_tokens and len(pieces) > max_tokens:
+            pieces, finish = pieces[:max_tokens], "length"
+        return None, {
+            "model": body.get("model", "fake"),
+            "pieces": pieces,
+            "finish": finish,
+            "prompt_tokens": count_prompt_tokens(messages),
+            "interval": 1 / config.tokens_per_second if config.tokens_per_second > 0 else 0.0
+        }
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        raw = await request.body()
+        body = json.loads(raw)
+        failure, reply = await plan("openai", body, raw)
+        if failure is not None:
+            return failure
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        usage = usage_openai(reply["prompt_tokens"], len(reply["pieces"]))
+
+        if not body.get("stream"):
+            await asyncio.sleep(len(reply["pieces"]) * reply["interval"])
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": reply["model"],
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(reply["pieces"])},
+                    "finish_reason": reply["finish"]
+                }],
+                "usage": usage
+            }
+
+        include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+
+        async def events() -> AsyncIterator[str]:
+            counters["streamed"] += 1
+            chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": reply["model"]}
+            for index, piece in enumerate(reply["pieces"]):
+                delta = {"role": "assistant", "content": piece} if index == 0 else {"content": piece}
+                yield sse({**chunk, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]})
+                await asyncio.sleep(reply["interval"])
+            yield sse({**chunk, "choices": [{"index": 0, "delta": {}, "finish_reason": reply["finish"]}]})
+            if include_usage:
+                yield sse({**chunk, "choices": [], "usage": usage})
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.post("/v1/messages")
+    async def messages(request: Request):
+        raw = await request.body()
+        body = json.loads(raw)
+        failure, reply = await plan("anthropic", body, raw)
+        if failure is not None:
+            return failure
+        message_id = f"msg_{uuid.uuid4().hex[:24]}"
+        stop_reason = "end_turn" if reply["finish"] == "stop" else "max_tokens"
+        output_tokens = len(reply["pieces"])
+
+        if not body.get("stream"):
+            await asyncio.sleep(output_tokens * reply["interval"])
+            return {
+                "id": message_id,
+                "type": "message",
+                "role": "assistant",
+                "model": reply["model"],
+                "content": [{"type": "text", "text": "".join(reply["pieces"])}],
+                "stop_reason": stop_reason,
+                "stop_sequence": None,
+                "usage": {"input_tokens": reply["prompt_tokens"], "output_tokens": output_tokens}
+            }
+
+        async def events() -> AsyncIterator[str]:
+            counters["streamed"] += 1
+            yield sse({"type": "message_start", "message": {
+                "id": message_id, "type": "message", "role": "assistant", "model": reply["model"], "content": [],
+                "stop_reason": None, "stop_sequence": None,
+                "usage": {"input_tokens": reply["prompt_tokens"], "output_tokens": 1}
+            }}, "message_start")
+            yield sse({"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}}, "content_block_start")
+            for piece in reply["pieces"]:
+                yield sse({"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": piece}}, "content_block_delta")
+                await asyncio.sleep(reply["interval"])
+            yield sse({"type": "content_block_stop", "index": 0}, "content_block_stop")
+            yield sse({
+                "type": "message_delta",
+                "delta": {"stop_reason": stop_reason, "stop_sequence": None},
+                "usage": {"output_tokens": output_tokens}
+            }, "message_delta")
+            yield sse({"type": "message_stop"}, "message_stop")
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.get("/stats")
+    async def stats():
+        return {**counters, "latency": config.latency.spec, "recordings": len(recordings)}
+
+    return app
+
+
+def usage_openai(prompt_tokens: int, completion_tokens: int) -> Dict[str, int]:
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+
+
+def error_response(api: str, status: int, kind: str, message: str, retry_after: Optional[float] = None) -> JSONResponse:
+    """An error in the provider's own shape, so the SDK raises its usual exception"""
+    if api == "anthropic":
+        body: Dict[str, Any] = {"type": "error", "error": {"type": kind, "message": message}}
+    else:
+        body = {"error": {"message": message, "type": kind, "param": None, "code": kind}}
+    headers = {"retry-after": f"{max(0.0, retry_after):.3g}"} if retry_after is not None else None
+    return JSONResponse(body, status_code=status, headers=headers)
+
+
+@functools.lru_cache(maxsize=None)
+def streaming_transport_class(http: Any) -> type:
+    """
+    StreamingASGITransport built on the httpx package `http`
+
+    SDK versions differ in which httpx package they bundle, and a client
+    only accepts transports, responses and streams from its own, so the
+    classes are made per package.
+    """
+
+    class QueueStream(http.AsyncByteStream):
+        def __init__(self, chunks: asyncio.Queue, task: "asyncio.Task[None]", disconnected: asyncio.Event):
+            self.chunks = chunks
+            self.task = task
+            self.disconnected = disconnected
+
+        async def __aiter__(self) -> AsyncIterator[bytes]:
+            while True:
+                chunk = await self.chunks.get()
+                if chunk is None:
+                    return
+                yield chunk
+
+        async def aclose(self) -> None:
+            self.disconnected.set()
+            if not self.task.done():
+                self.task.cancel()
+                await asyncio.gather(self.task, return_exceptions=True)
+
+    class StreamingASGITransport(http.AsyncBaseTransport):
+        """
+        Transport that calls an ASGI app in process
+
+        Unlike httpx.ASGITransport, which returns only once the app has
+        sent the whole body, the response is returned as soon as its
+        headers are sent and body chunks are forwarded as they come, so
+        streamed tokens keep their timing. Closing the response early
+        disconnects the app.
+        """
+
+        def __init__(self, app: Any):
+            self.app = app
+
+        async def handle_async_request(self, request: Any) -> Any:
+            body = await request.aread()
+            path, _, _ = request.url.raw_path.partition(b"?")
+            scope = {
+                "type": "http",
+                "asgi": {"version": "3.0"},
+                "http_version": "1.1",
+                "method": request.method,
+                "headers": [(name.lower(), value) for name, value in request.headers.raw],
+                "scheme": request.url.scheme,
+                "path": path.decode("ascii"),
+                "raw_path": path,
+                "query_string": request.url.query,
+                "root_path": "",
+                "server": (request.url.host, request.url.port or 80),
+                "client": ("127.0.0.1", 0)
+            }
+            chunks: asyncio.Queue = asyncio.Queue()
+            started = asyncio.Event()
+            disconnected = asyncio.Event()
+            response: Dict[str, Any] = {"status": 500, "headers": []}
+            request_sent = False
+
+            async def receive() -> Dict[str, Any]:
+                nonlocal request_sent
+                if not request_sent:
+                    request_sent = True
+                    return {"type": "http.request", "body": body, "more_body": False}
+                await disconnected.wait()
+                return {"type": "http.disconnect"}
+
+            async def send(message: Dict[str, Any]) -> None:
+                if message["type"] == "http.response.start":
+                    response["status"] = message["status"]
+                    response["headers"] = message.get("headers", [])
+                    started.set()
+                elif message["type"] == "http.response.body":
+                    if message.get("body"):
+                        chunks.put_nowait(message["body"])
+                    if not message.get("more_body", False):
+                        chunks.put_nowait(None)
+
+            async def run() -> None:
+                try:
+                    await self.app(scope, receive, send)
+                finally:
+                    # End the body even if the app failed or never finished it
+                    started.set()
+                    chunks.put_nowait(None)
+
+            task = asyncio.create_task(run())
+            await started.wait()
+            return http.Response(
+                response["status"],
+                headers=response["headers"],
+                stream=QueueStream(chunks, task, disconnected),
+                request=request
+            )
+
+    return StreamingASGITransport
+
+
+def fake_http_client(app: Any, sdk: Any) -> Any:
+    """
+    An SDK's own async HTTP client, sending every request to `app` in process
+
+    Args:
+        app: ASGI app, usually from create_fake_llm_app
+        sdk: The openai or anthropic module
+
+    Returns:
+        Client for the SDK's http_client argument
+    """
+    client_class = sdk.DefaultAsyncHttpxClient
+    base = next(cls for cls in client_class.__mro__ if cls.__name__ == "AsyncClient")
+    http = importlib.import_module(base.__module__.partition(".")[0])
+    return client_class(transport=streaming_transport_class(http)(app), timeout=600.0)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency", default=FAKE_LLM_LATENCY, help="Time to first token distribution")
+    parser.add_argument("--tokens-per-second", type=float, default=FAKE_LLM_TOKENS_PER_SECOND)
+    parser.add_argument("--error-rate", type=float, default=FAKE_LLM_ERROR_RATE)
+    parser.add_argument("--slow-rate", type=float, default=FAKE_LLM_SLOW_RATE)
+    parser.add_argument("--slow-factor", type=float, default=FAKE_LLM_SLOW_FACTOR)
+    parser.add_argument("--rate-limit-rate", type=float, default=FAKE_LLM_RATE_LIMIT_RATE)
+    parser.add_argument("--rpm", type=int, default=FAKE_LLM_RPM)
+    parser.add_argument("--retry-after", type=float, default=FAKE_LLM_RETRY_AFTER)
+    parser.add_argument("--replay", default=FAKE_LLM_REPLAY, help="JSONL recorded with LLM_RECORD_PATH")
+    parser.add_argument("--seed", type=int, default=FAKE_LLM_SEED)
+    args = parser.parse_args()
+
+    import uvicorn
+    app = create_fake_llm_app(FakeServerConfig(
+        args.latency, args.tokens_per_second, args.error_rate, args.slow_rate, args.slow_factor,
+        args.rate_limit_rate, args.rpm, args.retry_after, args.replay, args.seed
+    ))
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Image Analysis
+Decodes an upload once and runs every local analysis on one image pyramid
+"""
+
+import asyncio
+import io
+import time
+from typing import Any, Dict, Optional, Tuple
+from PIL import Image
+from fastapi import UploadFile
+from utils.executor import image_executor
+from utils.image_cache import content_digest
+from utils.image_processor import (
+    JPEG_QUALITY, MAX_DIMENSION, MAX_PIXELS, MIME_TYPES, OUTPUT_FORMAT, PASSTHROUGH_ENABLED,
+    RESIZE_MODE, RESIZE_MODES, downscale, encode_image, needs_no_transform, read_upload, record_timing
+)
+from utils.resize_planner import DETAIL_PRESET, plan_resize
+from utils.processed_image import ProcessedImage
+from utils.color_palette import extract_palette
+from utils.typography import estimate_typography
+from utils.phash_index import dhash
+
+
+async def analyze_upload(
+    file: UploadFile,
+    resize_mode: Optional[str] = None,
+    detail_preset: Optional[str] = None,
+    palette_count: int = 6,
+    perceptual: bool = False
+) -> Tuple[ProcessedImage, Dict[str, Any]]:
+    """
+    Read an upload once and produce the model payload plus local analyses
+
+    Args:
+        file: Uploaded image file
+        resize_mode: Downscale mode (quality, balanced, fast); defaults to IMAGE_RESIZE_MODE
+        detail_preset: Payload size preset (economy, balanced, max); defaults to IMAGE_DETAIL_PRESET
+        palette_count: Maximum number of palette colours
+        perceptual: Cluster the palette in CIE Lab
+
+    Returns:
+        Processed image for the model, and a dict with colors, typography and timings
+    """
+    resize_mode = resize_mode or RESIZE_MODE
+    if resize_mode not in RESIZE_MODES:
+        raise ValueError(f"Unknown resize mode '{resize_mode}'. Use one of: {', '.join(RESIZE_MODES)}")
+
+    started = time.perf_counter()
+    content, header = await read_upload(file)
+    read_ms = (time.perf_counter() - started) * 1000
+
+    # Pyramid levels: analysis (full detail, capped) > model payload > palette sample
+    payload_plan = plan_resize(header.width, header.height, detail_preset or DETAIL_PRESET, MAX_DIMENSION)
+    analysis_plan = plan_resize(header.width, header.height, "max", MAX_DIMENSION)
+    payload_size = (payload_plan.width, payload_plan.height)
+    analysis_size = (max(analysis_plan.width, payload_plan.width), max(analysis_plan.height, payload_plan.height))
+    passthrough = PASSTHROUGH_ENABLED and needs_no_transform(header, payload_size)
+
+    digest_task = asyncio.create_task(asyncio.to_thread(content_digest, content))
+    queued = time.perf_counter()
+    try:
+        result = await image_executor.run(
+            analyze_image, content, header.format, payload_size, analysis_size, JPEG_QUALITY,
+            resize_mode, OUTPUT_FORMAT, passthrough, palette_count, perceptual
+        )
+    finally:
+        digest = await digest_task
+    local_ms = (time.perf_counter() - queued) * 1000
+
+    image = result.pop("image")
+    image.digest = digest
+    image.original_width, image.original_height = header.width, header.height
+    image.image_tokens = {
+        "preset": payload_plan.preset,
+        "tiles": payload_plan.tiles,
+        "estimated_tokens": payload_plan.tokens
+    }
+    record_timing("analyze", time.perf_counter() - started)
+
+    result["timings"] = {"read_ms": round(read_ms, 3), "local_ms": round(local_ms, 3), **result["timings"]}
+    return image.with_upload(file.filename, len(content)), result
+
+
+def analyze_image(
+    content: bytes,
+    image_format: str,
+    payload_size: Tuple[int, int],
+    analysis_size: Tuple[int, int],
+    quality: int,
+    resize_mode: str = "quality",
+    output_format: str = "jpeg",
+    passthrough: bool = False,
+    palette_count: int = 6,
+    perceptual: bool = False
+) -> Dict[str, Any]:
+    """
+    Decode once, build the pyramid, encode the payload and analyse locally
+
+    Runs inside the image executor, so it must stay a module-level
+    function with picklable arguments and return value.
+
+    Args:
+        content: Raw upload bytes
+        image_format: Format identified from the header
+        payload_size: Planned model payload width and height
+        analysis_size: Width and height used for typography
+        quality: JPEG quality for the payload
+        resize_mode: Key into RESIZE_MODES
+        output_format: One of OUTPUT_FORMATS
+        passthrough: Send the upload bytes as the payload instead of re-encoding
+        palette_count: Maximum number of palette colours
+        perceptual: Cluster the palette in CIE Lab
+
+    Returns:
+        Dict with the payload image, colors, typography and per-stage timings
+    """
+    timings = {}
+    clock = time.perf_counter()
+
+    def lap(stage: str) -> None:
+        nonlocal clock
+        now = time.perf_counter()
+        timings[f"{stage}_ms"] = round((now - clock) * 1000, 3)
+        clock = now
+
+    image = Image.open(io.BytesIO(content), formats=[image_format])
+    original_width, original_height = image.size
+    if original_width * original_height > MAX_PIXELS:
+        raise ValueError(f"Image dimensions {original_width}x{original_height} exceed the maximum of {MAX_PIXELS} pixels")
+
+    # Level 0: the analysis image. JPEG drafting happens here, so this is the only decode
+    analysis = downscale(image, analysis_size, resize_mode) if image.size != tuple(analysis_size) else image
+    if analysis.mode != "RGB":
+        analysis = analysis.convert("RGB")
+    # Load now so the payload step cannot draft (and shrink) this level in place
+    analysis.load()
+    lap("decode")
+
+    # Level 1: the model payload, reduced from level 0 rather than the original
+    payload = downscale(analysis, payload_size, resize_mode) if analysis.size != tuple(payload_size) else analysis
+    lap("pyramid")
+
+    if passthrough:
+        encoded, encoded_format = content, image_format
+    else:
+        encoded, encoded_format = encode_image(payload, output_format, quality)
+    processed = ProcessedImage(
+        data=encoded,
+        mime_type=MIME_TYPES[encoded_format],
+        format=encoded_format,
+        width=payload.width,
+        height=payload.height,
+        reencoded=not passthrough,
+        perceptual_hash=dhash(payload)
+    )
+    lap("encode")
+
+    # Level 2 (the palette sample) is taken from the payload inside extract_palette
+    colors = extract_palette(payload, palette_count, perceptual)
+    lap("colors")
+
+    typography = estimate_typography(analysis, original_width / analysis.width)
+    lap("typography")
+
+    return {"image": processed, "colors": colors, "typography": typography, "timings": timings}
@@ -0,0 +1,221 @@
+"""
+Image Cache
+Content-addressed LRU cache for processed images with an optional disk tier
+"""
+
+import asyncio
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+from utils.processed_image import ProcessedImage
+
+IMAGE_CACHE_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MAX_BYTES", 268435456))  # 256MB default, 0 disables
+IMAGE_CACHE_DIR = os.getenv("IMAGE_CACHE_DIR", "")  # empty disables the disk tier
+IMAGE_CACHE_DISK_MAX_BYTES = int(os.getenv("IMAGE_CACHE_DISK_MAX_BYTES", 2147483648))  # 2GB default
+
+
+class BytesLRUCache:
+    """
+    LRU cache bounded by the total size of its values
+
+    Sizes are supplied by a `sizeof` callable so the cache can hold any
+    value type. Safe to use from several threads.
+    """
+
+    def __init__(self, max_bytes: int, sizeof: Callable[[Any], int] = len):
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._sizes: Dict[Hashable, int] = {}
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        size = self._sizeof(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.total_bytes -= self._sizes.pop(key)
+                del self._entries[key]
+            self._entries[key] = value
+            self._sizes[key] = size
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes:
+                old_key, _ = self._entries.popitem(last=False)
+                self.total_bytes -= self._sizes.pop(old_key)
+                self.evictions += 1
+
+    def discard(self, key: Hashable) -> None:
+        with self._lock:
+            if key in self._entries:
+                del self._entries[key]
+                self.total_bytes -= self._sizes.pop(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self.total_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
+
+
+class DiskCache:
+    """
+    Directory of binary files keyed by cache key
+
+    Writes are atomic (temp file + rename) so a crash never leaves a
+    half-written entry behind. Hits refresh a file's mtime, and the least
+    recently used files are removed once the directory grows past
+    `max_bytes`.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.total_bytes = sum(entry.stat().st_size for entry in os.scandir(directory) if entry.name.endswith(".bin"))
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.bin")
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as handle:
+                value = handle.read()
+        except OSError:
+            self.misses += 1
+            return None
+        try:
+            # Eviction removes the oldest mtimes first, so a hit makes the entry recent
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return value
+
+    def put(self, key: str, value: bytes) -> None:
+        path = self._path(key)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as handle:
+            handle.write(value)
+        size = len(value)
+        with self._lock:
+            # An overwrite replaces the old file, so only the difference is new
+            try:
+                previous = os.stat(path).st_size
+            except OSError:
+                previous = 0
+            os.replace(temp_path, path)
+            self.total_bytes += size - previous
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        files = sorted(
+            (entry for entry in os.scandir(self.directory) if entry.name.endswith(".bin")),
+            key=lambda entry: entry.stat().st_mtime
+        )
+        self.total_bytes = sum(entry.stat().st_size for entry in files)
+        for entry in files:
+            if self.total_bytes <= self.max_bytes * 0.9:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+            except OSError:
+                continue
+            self.total_bytes -= size
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "directory": self.directory,
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
+
+
+class ImageCache:
+    """Two-tier cache mapping upload digests plus settings to processed images"""
+
+    def __init__(self, max_bytes: int, directory: str = "", disk_max_bytes: int = 0):
+        self.memory = BytesLRUCache(max_bytes, sizeof=lambda image: image.nbytes)
+        self.disk = DiskCache(directory, disk_max_bytes) if directory else None
+
+    @property
+    def enabled(self) -> bool:
+        return self.memory.max_bytes > 0 or self.disk is not None
+
+    async def get(self, key: str) -> Optional[ProcessedImage]:
+        image = self.memory.get(key)
+        if image is not None or self.disk is None:
+            return image
+        blob = await asyncio.to_thread(self.disk.get, key)
+        if blob is None:
+            return None
+        try:
+            image = ProcessedImage.from_bytes(blob)
+        except ValueError:
+            return None
+        self.memory.put(key, image)
+        return image
+
+    async def put(self, key: str, image: ProcessedImage) -> None:
+        self.memory.put(key, image)
+        if self.disk is not None:
+            await asyncio.to_thread(self.disk.put, key, image.to_bytes())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "memory": self.memory.stats(),
+            "disk": self.disk.stats() if self.disk is not None else None
+        }
+
+
+def content_digest(content: bytes) -> str:
+    """SHA-256 hex digest of raw upload bytes"""
+    return hashlib.sha256(content).hexdigest()
+
+
+def make_cache_key(digest: str, *settings: Any) -> str:
+    """Combine an upload digest with the settings that shape the output"""
+    return "-".join([digest, *(str(setting) for setting in settings)])
+
+
+image_cache = ImageCache(IMAGE_CACHE_MAX_BYTES, IMAGE_CACHE_DIR, IMAGE_CACHE_DISK_MAX_BYTES)
@@ -0,0 +1,157 @@
+"""
+Image Header
+Identifies image format, dimensions and mode from the first bytes of a file
+without decoding any pixel data
+"""
+
+import struct
+from typing import NamedTuple, Optional
+
+
+class ImageHeader(NamedTuple):
+    format: str
+    width: int
+    height: int
+    mode: str
+
+    @property
+    def pixels(self) -> int:
+        return self.width * self.height
+
+
+class IncompleteHeaderError(ValueError):
+    """Raised when more bytes are needed to finish parsing a header"""
+
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+PNG_COLOR_MODES = {0: "L", 2: "RGB", 3: "P", 4: "LA", 6: "RGBA"}
+JPEG_COMPONENT_MODES = {1: "L", 3: "RGB", 4: "CMYK"}
+# SOFn markers carry the frame size; C4 (DHT), C8 (JPG) and CC (DAC) share the range
+JPEG_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def sniff_format(data: bytes) -> Optional[str]:
+    """
+    Identify an image format by its magic bytes
+
+    Args:
+        data: Leading bytes of the file (at least 12 for WebP)
+
+    Returns:
+        Pillow format name, or None if the signature is not recognised
+    """
+    if data.startswith(b"\xff\xd8\xff"):
+        return "JPEG"
+    if data.startswith(PNG_SIGNATURE):
+        return "PNG"
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return "GIF"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "WEBP"
+    return None
+
+
+def parse_header(data: bytes) -> ImageHeader:
+    """
+    Parse format, dimensions and mode from leading file bytes
+
+    Args:
+        data: Leading bytes of the file
+
+    Returns:
+        Parsed image header
+
+    Raises:
+        IncompleteHeaderError: If the header extends past the given bytes
+        ValueError: If the format is unsupported or the header is malformed
+    """
+    if len(data) < 12:
+        raise IncompleteHeaderError("Need more data to identify image")
+
+    image_format = sniff_format(data)
+    if image_format == "JPEG":
+        return _parse_jpeg(data)
+    if image_format == "PNG":
+        return _parse_png(data)
+    if image_format == "GIF":
+        return _parse_gif(data)
+    if image_format == "WEBP":
+        return _parse_webp(data)
+    raise ValueError("Unrecognised image signature")
+
+
+def _parse_png(data: bytes) -> ImageHeader:
+    if len(data) < 33:
+        raise IncompleteHeaderError("Truncated PNG header")
+    if data[12:16] != b"IHDR":
+        raise ValueError("Malformed PNG header")
+    width, height, bit_depth, color_type = struct.unpack(">IIBB", data[16:26])
+    mode = PNG_COLOR_MODES.get(color_type)
+    if mode is None:
+        raise ValueError(f"Unsupported PNG color type {color_type}")
+    if mode == "L" and bit_depth == 1:
+        mode = "1"
+    elif mode == "L" and bit_depth == 16:
+        mode = "I;16"
+    return ImageHeader("PNG", width, height, mode)
+
+
+def _parse_gif(data: bytes) -> ImageHeader:
+    width, height = struct.unpack("<HH", data[6:10])
+    return ImageHeader("GIF", width, height, "P")
+
+
+def _parse_jpeg(data: bytes) -> ImageHeader:
+    offset = 2
+    while True:
+        # Skip fill bytes between segments
+        while offset < len(data) and data[offset] == 0xFF:
+            offset += 1
+        if offset >= len(data):
+            raise IncompleteHeaderError("Truncated JPEG header")
+        marker = data[offset]
+        offset += 1
+
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            continue
+        if marker in (0xD9, 0xDA):
+            raise ValueError("JPEG has no frame header before scan data")
+        if offset + 2 > len(data):
+            raise IncompleteHeaderError("Truncated JPEG header")
+
+        length = struct.unpack(">H", data[offset:offset + 2])[0]
+        if length < 2:
+            raise ValueError("Malformed JPEG segment")
+        if marker in JPEG_SOF_MARKERS:
+            if offset + 8 > len(data):
+                raise IncompleteHeaderError("Truncated JPEG frame header")
+            height, width, components = struct.unpack(">HHB", data[offset + 3:offset + 8])
+            mode = JPEG_COMPONENT_MODES.get(components)
+            if mode is None:
+                raise ValueError(f"Unsupported JPEG component count {components}")
+            return ImageHeader("JPEG", width, height, mode)
+        offset += length
+
+
+def _parse_webp(data: bytes) -> ImageHeader:
+    if len(data) < 30:
+        raise IncompleteHeaderError("Truncated WebP header")
+    chunk = data[12:16]
+    if chunk == b"VP8X":
+        flags = data[20]
+        width = 1 + int.from_bytes(data[24:27], "little")
+        height = 1 + int.from_bytes(data[27:30], "little")
+        return ImageHeader("WEBP", width, height, "RGBA" if flags & 0x10 else "RGB")
+    if chunk == b"VP8L":
+        if data[20] != 0x2F:
+            raise ValueError("Malformed WebP lossless header")
+        bits = int.from_bytes(data[21:25], "little")
+        width = 1 + (bits & 0x3FFF)
+        height = 1 + ((bits >> 14) & 0x3FFF)
+        return ImageHeader("WEBP", width, height, "RGBA" if (bits >> 28) & 1 else "RGB")
+    if chunk == b"VP8 ":
+        if data[23:26] != b"\x9d\x01\x2a":
+            raise ValueError("Malformed WebP lossy header")
+        width, height = struct.unpack("<HH", data[26:30])
+        return ImageHeader("WEBP", width & 0x3FFF, height & 0x3FFF, "RGB")
+    raise ValueError("Unsupported WebP chunk")
@@ -3,77 +3,390 @@ Image Processor
 Handles image upload, validation, and preprocessing
 """
 
-import base64
+import asyncio
 import io
-from typing import Dict, Any
+import time
+from typing import Dict, List, Optional, Tuple
 from PIL import Image
 from fastapi import UploadFile
 import os
+from utils.executor import image_executor, ExecutorBusyError
+from utils.image_cache import image_cache, content_digest, make_cache_key
+from utils.image_header import ImageHeader, IncompleteHeaderError, parse_header
+from utils.resize_planner import DETAIL_PRESET, plan_resize
+from utils.processed_image import ProcessedImage
+from utils.phash_index import dhash
+from utils.metrics import image_path_seconds, payload_bytes, stage_seconds
 
 MAX_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", 10485760))  # 10MB default
 ALLOWED_EXTENSIONS = os.getenv("ALLOWED_EXTENSIONS", ".jpg,.jpeg,.png,.gif,.webp").split(",")
+MAX_DIMENSION = int(os.getenv("IMAGE_MAX_DIMENSION", 2048))  # longest side in pixels
+JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", 90))
+MAX_PIXELS = int(os.getenv("MAX_IMAGE_PIXELS", 40000000))  # decoded pixel budget
+ALLOWED_FORMATS = os.getenv("ALLOWED_IMAGE_FORMATS", "JPEG,PNG,GIF,WEBP").split(",")
+RESIZE_MODE = os.getenv("IMAGE_RESIZE_MODE", "balanced")
+PASSTHROUGH_ENABLED = os.getenv("IMAGE_PASSTHROUGH", "true").lower() == "true"
+OUTPUT_FORMAT = os.getenv("IMAGE_OUTPUT_FORMAT", "auto")  # auto, jpeg, png or webp
+FLAT_COLOR_LIMIT = int(os.getenv("IMAGE_FLAT_COLOR_LIMIT", 2048))  # unique colours on a 256px sample
+WEBP_LOSSLESS_EFFORT = int(os.getenv("IMAGE_WEBP_EFFORT", 80))
+OUTPUT_FORMATS = ("auto", "jpeg", "png", "webp")
+MIME_TYPES = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp", "GIF": "image/gif"}
+HEADER_READ_SIZE = 65536
+UPLOAD_CHUNK_SIZE = 1048576
 
-async def process_image(file: UploadFile) -> Dict[str, Any]:
+# Downscale modes: (JPEG draft oversampling factor, reducing_gap); None disables the step.
+# Drafting lets libjpeg decode at 1/2, 1/4 or 1/8 scale in the DCT domain, and
+# reducing_gap does an integer box reduce before the final LANCZOS pass.
+RESIZE_MODES = {
+    "quality": (None, None),
+    "balanced": (1.5, 3.0),
+    "fast": (1, 2.0)
+}
+
+# Per-path processing counters: passthrough, cache and transform
+PIPELINE_TIMINGS: Dict[str, Dict[str, float]] = {}
+
+# Pillow refuses to open anything past twice this budget, including in executor workers
+Image.MAX_IMAGE_PIXELS = MAX_PIXELS
+
+async def process_image(
+    file: UploadFile,
+    resize_mode: Optional[str] = None,
+    detail_preset: Optional[str] = None
+) -> ProcessedImage:
     """
     Process uploaded image file
     
     Args:
         file: Uploaded image file
+        resize_mode: Downscale mode (quality, balanced, fast); defaults to IMAGE_RESIZE_MODE
+        detail_preset: Output size preset (economy, balanced, max); defaults to IMAGE_DETAIL_PRESET
     
     Returns:
-        Processed image data including base64 encoding
+        Processed image holding the encoded bytes
     """
+    resize_mode = resize_mode or RESIZE_MODE
+    if resize_mode not in RESIZE_MODES:
+        raise ValueError(f"Unknown resize mode '{resize_mode}'. Use one of: {', '.join(RESIZE_MODES)}")
     
-    # Read file content
-    content = await file.read()
+    # Read and validate the header before buffering or decoding anything
+    content, header = await read_upload(file)
     
-    # Validate file size
-    if len(content) > MAX_SIZE:
-        raise ValueError(f"File size exceeds maximum allowed size of {MAX_SIZE} bytes")
+    # Output size is decided from the header alone
+    plan = plan_resize(header.width, header.height, detail_preset or DETAIL_PRESET, MAX_DIMENSION)
+    target_size = (plan.width, plan.height)
     
-    # Validate file extension
-    filename = file.filename.lower()
-    if not any(filename.endswith(ext) for ext in ALLOWED_EXTENSIONS):
-        raise ValueError(f"File type not allowed. Allowed types: {', '.join(ALLOWED_EXTENSIONS)}")
-    
-    try:
-        # Open image with PIL
-        image = Image.open(io.BytesIO(content))
-        
-        # Get image dimensions
-        width, height = image.size
-        
-        # Convert to RGB if necessary
-        if image.mode != "RGB":
-            image = image.convert("RGB")
-        
-        # Resize if too large (max 2048px on longest side)
-        max_dimension = 2048
-        if max(width, height) > max_dimension:
-            ratio = max_dimension / max(width, height)
-            new_width = int(width * ratio)
-            new_height = int(height * ratio)
-            image = image.resize((new_width, new_height), Image.Resampling.LANCZOS)
-            width, height = new_width, new_height
-        
-        # Convert to base64
-        buffered = io.BytesIO()
-        image.save(buffered, format="JPEG", quality=90)
-        image_base64 = base64.b64encode(buffered.getvalue()).decode()
-        
-        return {
-            "base64": image_base64,
-            "dimensions": {
-                "width": width,
-                "height": height
-            },
-            "format": image.format or "JPEG",
-            "filename": file.filename,
-            "size": len(content)
+    started = time.perf_counter()
+    digest = await asyncio.to_thread(content_digest, content)
+    image_tokens = {
+        "preset": plan.preset,
+        "tiles": plan.tiles,
+        "estimated_tokens": plan.tokens
+    }
+
+    if PASSTHROUGH_ENABLED and needs_no_transform(header, target_size):
+        # Already an acceptable JPEG: send the original bytes, no decode or generation loss
+        image = ProcessedImage(
+            data=content,
+            mime_type=MIME_TYPES[header.format],
+            format=header.format,
+            width=header.width,
+            height=header.height,
+            reencoded=False,
+            digest=digest,
+            image_tokens=image_tokens
+        )
+        record_timing("passthrough", time.perf_counter() - started)
+    else:
+        # Identical uploads with identical settings produce identical output
+        cache_key = make_cache_key(digest, f"{plan.width}x{plan.height}", JPEG_QUALITY, resize_mode, OUTPUT_FORMAT)
+        cached = await image_cache.get(cache_key) if image_cache.enabled else None
+
+        if cached is not None:
+            image = cached
+            record_timing("cache", time.perf_counter() - started)
+        else:
+            try:
+                image = await image_executor.run(
+                    transform_image, content, header.format, target_size, JPEG_QUALITY, resize_mode, OUTPUT_FORMAT
+                )
+            except ExecutorBusyError:
+                raise
+            except Exception as e:
+                raise ValueError(f"Error processing image: {str(e)}")
+
+            image.digest = digest
+            image.original_width, image.original_height = header.width, header.height
+            image.image_tokens = image_tokens
+            # Measured in the executor worker, which may be another process
+            for stage, seconds in (image.timings or {}).items():
+                stage_seconds.observe(seconds, stage)
+            image.timings = None
+            if image_cache.enabled:
+                await image_cache.put(cache_key, image)
+            record_timing("transform", time.perf_counter() - started)
+
+    payload_bytes.observe(len(image.data), "image")
+    return image.with_upload(file.filename, len(content))
+
+async def read_upload(file: UploadFile) -> Tuple[bytes, ImageHeader]:
+    """
+    Read an upload, validating its header before the body is buffered
+
+    The format is identified by magic bytes and the pixel count is checked
+    against MAX_PIXELS using only the header, so oversize files and
+    decompression bombs are rejected before any pixel data is decoded.
+
+    Args:
+        file: Uploaded image file
+
+    Returns:
+        Raw upload bytes and the parsed image header
+    """
+    if file.size is not None and file.size > MAX_SIZE:
+        raise ValueError(f"File size exceeds maximum allowed size of {MAX_SIZE} bytes")
+
+    started = time.perf_counter()
+    chunks: List[bytes] = []
+    received = 0
+    header = None
+    read_size = HEADER_READ_SIZE
+
+    while True:
+        chunk = await file.read(read_size)
+        if chunk:
+            chunks.append(chunk)
+            received += len(chunk)
+            if received > MAX_SIZE:
+                raise ValueError(f"File size exceeds maximum allowed size of {MAX_SIZE} bytes")
+
+        if header is None:
+            try:
+                header = parse_header(b"".join(chunks))
+            except IncompleteHeaderError:
+                if not chunk:
+                    raise ValueError("Could not read image header")
+                # Large metadata segments can push the frame header further in
+                read_size = min(read_size * 2, UPLOAD_CHUNK_SIZE)
+                continue
+            validate_header(header)
+            read_size = UPLOAD_CHUNK_SIZE
+        elif not chunk:
+            break
+
+    stage_seconds.observe(time.perf_counter() - started, "upload_read")
+    payload_bytes.observe(received, "upload")
+    return b"".join(chunks), header
+
+def needs_no_transform(header: ImageHeader, target_size: Tuple[int, int]) -> bool:
+    """
+    Check whether an upload can be sent to the model byte-for-byte
+
+    Args:
+        header: Parsed image header
+        target_size: Planned output width and height
+
+    Returns:
+        True for RGB JPEGs that already have the planned size
+    """
+    return header.format == "JPEG" and header.mode == "RGB" and (header.width, header.height) == target_size
+
+def record_timing(path: str, seconds: float) -> None:
+    """Accumulate processing time for one pipeline path"""
+    stats = PIPELINE_TIMINGS.setdefault(path, {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+    elapsed_ms = seconds * 1000
+    stats["count"] += 1
+    stats["total_ms"] += elapsed_ms
+    stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+    image_path_seconds.observe(seconds, path)
+
+def get_pipeline_stats() -> Dict[str, Dict[str, float]]:
+    """Return per-path processing counts and timings"""
+    return {
+        path: {
+            "count": stats["count"],
+            "avg_ms": round(stats["total_ms"] / stats["count"], 3) if stats["count"] else 0.0,
+            "max_ms": round(stats["max_ms"], 3)
         }
-    
-    except Exception as e:
-        raise ValueError(f"Error processing image: {str(e)}")
+        for path, stats in PIPELINE_TIMINGS.items()
+    }
+
+def validate_header(header: ImageHeader) -> None:
+    """
+    Check a parsed header against the allowed formats and pixel budget
+
+    Args:
+        header: Parsed image header
+
+    Raises:
+        ValueError: If the image must be rejected
+    """
+    if header.format not in ALLOWED_FORMATS:
+        raise ValueError(f"File type not allowed. Allowed types: {', '.join(ALLOWED_FORMATS)}")
+    if header.width <= 0 or header.height <= 0:
+        raise ValueError("Image has invalid dimensions")
+    if header.pixels > MAX_PIXELS:
+        raise ValueError(
+            f"Image dimensions {header.width}x{header.height} exceed the maximum of {MAX_PIXELS} pixels"
+        )
+
+def transform_image(
+    content: bytes,
+    image_format: str,
+    target_size: Tuple[int, int],
+    quality: int,
+    resize_mode: str = "quality",
+    output_format: str = "jpeg"
+) -> ProcessedImage:
+    """
+    Decode, resize and re-encode an image
+
+    Runs inside the image executor, so it must stay a module-level
+    function with picklable arguments and return value.
+
+    Args:
+        content: Raw upload bytes
+        image_format: Format identified from the header
+        target_size: Output width and height
+        quality: JPEG quality for the re-encoded image
+        resize_mode: Key into RESIZE_MODES
+        output_format: One of OUTPUT_FORMATS
+
+    Returns:
+        Processed image with the encoded bytes, dimensions, MIME type and
+        decode, resize and encode timings
+    """
+    started = time.perf_counter()
+
+    # Open image with PIL, trusting only the sniffed format
+    image = Image.open(io.BytesIO(content), formats=[image_format])
+
+    # Get image dimensions
+    width, height = image.size
+    if width * height > MAX_PIXELS:
+        raise ValueError(f"Image dimensions {width}x{height} exceed the maximum of {MAX_PIXELS} pixels")
+
+    # Decode now, at draft scale when resizing, so decoding and resizing are timed apart
+    resize = (width, height) != tuple(target_size)
+    if resize:
+        apply_draft(image, tuple(target_size), resize_mode)
+    image.load()
+    decoded = time.perf_counter()
+
+    # Resize to the planned size
+    if resize:
+        image = downscale(image, tuple(target_size), resize_mode)
+        width, height = target_size
+
+    # Convert to RGB if necessary
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    resized = time.perf_counter()
+
+    # Encode; base64 is deferred until a data URL is actually needed
+    encoded, encoded_format = encode_image(image, output_format, quality)
+    timings = {"decode": decoded - started, "resize": resized - decoded, "encode": time.perf_counter() - resized}
+
+    return ProcessedImage(
+        data=encoded,
+        mime_type=MIME_TYPES[encoded_format],
+        format=encoded_format,
+        width=width,
+        height=height,
+        perceptual_hash=dhash(image),
+        timings=timings
+    )
+
+def is_flat_content(image: Image.Image, color_limit: int = FLAT_COLOR_LIMIT) -> bool:
+    """
+    Classify an image as flat UI content rather than photographic
+
+    Counts unique colours on a nearest-neighbour downsample, which keeps
+    real colours instead of blending new ones in at edges.
+
+    Args:
+        image: RGB image
+        color_limit: Maximum unique colours for flat content
+
+    Returns:
+        True if the image has few distinct colours
+    """
+    sample = image
+    if max(image.size) > 256:
+        ratio = 256 / max(image.size)
+        sample = image.resize(
+            (max(1, int(image.width * ratio)), max(1, int(image.height * ratio))),
+            Image.Resampling.NEAREST
+        )
+    return sample.getcolors(maxcolors=color_limit) is not None
+
+def encode_image(image: Image.Image, output_format: str = "auto", quality: int = 90) -> Tuple[bytes, str]:
+    """
+    Encode an RGB image, choosing the format by content when asked
+
+    Flat content (UI, text, diagrams) is encoded losslessly as PNG and
+    WebP and the smaller one wins; photographic content stays JPEG.
+
+    Args:
+        image: RGB image
+        output_format: One of OUTPUT_FORMATS
+        quality: JPEG quality
+
+    Returns:
+        Encoded bytes and the Pillow format name
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format '{output_format}'. Use one of: {', '.join(OUTPUT_FORMATS)}")
+
+    if output_format == "auto":
+        candidates = ["PNG", "WEBP"] if is_flat_content(image) else ["JPEG"]
+    else:
+        candidates = [output_format.upper()]
+
+    best = None
+    for image_format in candidates:
+        buffered = io.BytesIO()
+        if image_format == "JPEG":
+            image.save(buffered, format="JPEG", quality=quality)
+        elif image_format == "WEBP":
+            image.save(buffered, format="WEBP", lossless=True, quality=WEBP_LOSSLESS_EFFORT)
+        else:
+            # Exact palettes are lossless and much smaller than truecolour PNG
+            colors = image.getcolors(maxcolors=256)
+            source = image.convert("P", palette=Image.Palette.ADAPTIVE, colors=len(colors)) if colors else image
+            source.save(buffered, format="PNG", compress_level=6)
+        encoded = buffered.getvalue()
+        if best is None or len(encoded) < len(best[0]):
+            best = (encoded, image_format)
+    return best
+
+def downscale(image: Image.Image, size: Tuple[int, int], resize_mode: str = "quality") -> Image.Image:
+    """
+    Shrink an image to the given size
+
+    Args:
+        image: Opened (not yet loaded) image
+        size: Target width and height
+        resize_mode: Key into RESIZE_MODES
+
+    Returns:
+        Resized image
+    """
+    reducing_gap = RESIZE_MODES[resize_mode][1]
+    apply_draft(image, size, resize_mode)
+
+    # Palette and bilevel images only support nearest-neighbour resampling
+    if image.mode not in ("RGB", "RGBA", "L", "LA"):
+        image = image.convert("RGBA" if "transparency" in image.info or image.mode == "PA" else "RGB")
+
+    return image.resize(size, Image.Resampling.LANCZOS, reducing_gap=reducing_gap)
+
+def apply_draft(image: Image.Image, size: Tuple[int, int], resize_mode: str = "quality") -> None:
+    """Let a JPEG decode at a reduced scale for the resize; no effect once the image is loaded"""
+    draft_factor = RESIZE_MODES[resize_mode][0]
+    if draft_factor is not None and image.format == "JPEG":
+        # Never drafts below draft_factor times the target, so LANCZOS still has detail to work with
+        image.draft("RGB", (int(size[0] * draft_factor), int(size[1] * draft_factor)))
 
 def validate_image_file(file: UploadFile) -> bool:
     """
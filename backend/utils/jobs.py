@@ -0,0 +1,473 @@
+"""
+Jobs
+Background conversion jobs with pluggable stores, async workers and progress events
+"""
+
+import asyncio
+import io
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Set
+
+from fastapi import UploadFile
+from starlette.datastructures import Headers
+from utils.conversion import convert_upload
+from utils.executor import ExecutorBusyError
+from utils.rate_limiter import UpstreamBusyError
+
+JOB_STORE = os.getenv("JOB_STORE", "memory")  # memory or sqlite
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", "jobs.db")  # SQLite file, shared by workers on one host
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 4))  # jobs processed at once per process
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", 1000))  # queued jobs before submissions are refused
+JOB_TTL = int(os.getenv("JOB_TTL", 3600))  # seconds a job is kept after it finishes, or while it waits
+JOB_STALE_SECONDS = int(os.getenv("JOB_STALE_SECONDS", 120))  # running job without a heartbeat is abandoned
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 2))  # runs before an abandoned job is failed
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", 1.0))  # idle workers check the store this often
+JOB_SWEEP_INTERVAL = float(os.getenv("JOB_SWEEP_INTERVAL", 60))
+JOB_BUSY_RETRIES = 10  # waits for a shed conversion before the job fails
+JOB_STORES = ("memory", "sqlite")
+
+JOB_STATUSES = ("queued", "running", "succeeded", "failed")
+FINISHED = ("succeeded", "failed")
+
+
+class JobQueueFullError(RuntimeError):
+    """Raised when too many jobs are already waiting"""
+
+
+class Job:
+    """
+    One conversion job
+
+    `data` holds the upload until the job finishes and is then dropped;
+    `stage` follows queued, decode, llm, done.
+    """
+
+    __slots__ = (
+        "id", "status", "stage", "params", "filename", "content_type", "data",
+        "result", "error", "attempts", "created", "updated", "finished"
+    )
+
+    def __init__(
+        self,
+        id: str,
+        params: Dict[str, Any],
+        filename: Optional[str],
+        content_type: Optional[str],
+        data: Optional[bytes],
+        status: str = "queued",
+        stage: str = "queued",
+        result: Optional[Dict[str, Any]] = None,
+        error: Optional[str] = None,
+        attempts: int = 0,
+        created: float = 0.0,
+        updated: float = 0.0,
+        finished: Optional[float] = None
+    ):
+        self.id = id
+        self.status = status
+        self.stage = stage
+        self.params = params
+        self.filename = filename
+        self.content_type = content_type
+        self.data = data
+        self.result = result
+        self.error = error
+        self.attempts = attempts
+        self.created = created
+        self.updated = updated
+        self.finished = finished
+
+    @property
+    def done(self) -> bool:
+        return self.status in FINISHED
+
+    def view(self) -> Dict[str, Any]:
+        """Public representation, without the upload bytes"""
+        view = {
+            "job_id": self.id,
+            "status": self.status,
+            "stage": self.stage,
+            "filename": self.filename,
+            "attempts": self.attempts,
+            "created": self.created,
+            "updated": self.updated,
+            "finished": self.finished
+        }
+        if self.result is not None:
+            view["result"] = self.result
+        if self.error is not None:
+            view["error"] = self.error
+        return view
+
+
+class JobStore:
+    """
+    Storage for jobs; workers claim queued jobs from it
+
+    Implementations must make claim() atomic, so a job is handed to one
+    worker only, and must keep queued jobs in submission order.
+    """
+
+    async def add(self, job: Job) -> None:
+        raise NotImplementedError
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        raise NotImplementedError
+
+    async def claim(self) -> Optional[Job]:
+        """Mark the oldest queued job running, count the attempt and return it"""
+        raise NotImplementedError
+
+    async def update(self, job_id: str, **fields: Any) -> None:
+        raise NotImplementedError
+
+    async def count(self, status: str) -> int:
+        raise NotImplementedError
+
+    async def sweep(self, now: float) -> Dict[str, int]:
+        """
+        Clean up abandoned jobs
+
+        Finished jobs older than JOB_TTL are deleted, as are queued jobs
+        that waited that long. Running jobs without a heartbeat for
+        JOB_STALE_SECONDS (their worker died) are requeued, or failed once
+        they have used JOB_MAX_ATTEMPTS.
+        """
+        raise NotImplementedError
+
+
+class MemoryJobStore(JobStore):
+    """Jobs in a dict, for a single process"""
+
+    def __init__(self):
+        self._jobs: Dict[str, Job] = {}
+        self._queued: Deque[str] = deque()
+
+    async def add(self, job: Job) -> None:
+        self._jobs[job.id] = job
+        self._queued.append(job.id)
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    async def claim(self) -> Optional[Job]:
+        while self._queued:
+            job = self._jobs.get(self._queued.popleft())
+            if job is not None and job.status == "queued":
+                job.status = "running"
+                job.attempts += 1
+                job.updated = time.time()
+                return job
+        return None
+
+    async def update(self, job_id: str, **fields: Any) -> None:
+        job = self._jobs.get(job_id)
+        if job is None:
+            return
+        for name, value in fields.items():
+            setattr(job, name, value)
+        if fields.get("status") == "queued":
+            self._queued.append(job_id)
+
+    async def count(self, status: str) -> int:
+        return sum(job.status == status for job in self._jobs.values())
+
+    async def sweep(self, now: float) -> Dict[str, int]:
+        removed = requeued = failed = 0
+        for job in list(self._jobs.values()):
+            if (job.done and job.finished < now - JOB_TTL) or (job.status == "queued" and job.created < now - JOB_TTL):
+                del self._jobs[job.id]
+                removed += 1
+            elif job.status == "running" and job.updated < now - JOB_STALE_SECONDS:
+                if job.attempts >= JOB_MAX_ATTEMPTS:
+                    await self.update(
+                        job.id, status="failed", stage="done", error="Job was abandoned by its worker",
+                        data=None, finished=now, updated=now
+                    )
+                    failed += 1
+                else:
+                    await self.update(job.id, status="queued", stage="queued", updated=now)
+                    requeued += 1
+        return {"removed": removed, "requeued": requeued, "failed": failed}
+
+
+class SQLiteJobStore(JobStore):
+    """
+    Jobs in a SQLite database in WAL mode
+
+    Several worker processes on one host can share the file; claim() is
+    a single UPDATE ... RETURNING, so each job goes to one worker.
+    """
+
+    COLUMNS = Job.__slots__
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = self._connection()
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, status TEXT NOT NULL, stage TEXT NOT NULL, params TEXT NOT NULL, "
+            "filename TEXT, content_type TEXT, data BLOB, result TEXT, error TEXT, "
+            "attempts INTEGER NOT NULL, created REAL NOT NULL, updated REAL NOT NULL, finished REAL)"
+        )
+        connection.execute("CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created)")
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    @staticmethod
+    def _encode(name: str, value: Any) -> Any:
+        return json.dumps(value) if name in ("params", "result") and value is not None else value
+
+    def _row_to_job(self, row: tuple) -> Job:
+        values = dict(zip(self.COLUMNS, row))
+        values["params"] = json.loads(values["params"])
+        values["result"] = json.loads(values["result"]) if values["result"] is not None else None
+        return Job(**values)
+
+    def _add(self, job: Job) -> None:
+        self._connection().execute(
+            f"INSERT INTO jobs ({', '.join(self.COLUMNS)}) VALUES ({', '.join('?' * len(self.COLUMNS))})",
+            [self._encode(name, getattr(job, name)) for name in self.COLUMNS]
+        )
+
+    def _get(self, job_id: str) -> Optional[Job]:
+        row = self._connection().execute(
+            f"SELECT {', '.join(self.COLUMNS)} FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        return self._row_to_job(row) if row is not None else None
+
+    def _claim(self) -> Optional[Job]:
+        row = self._connection().execute(
+            "UPDATE jobs SET status = 'running', attempts = attempts + 1, updated = ? "
+            "WHERE id = (SELECT id FROM jobs WHERE status = 'queued' ORDER BY created LIMIT 1) "
+            f"RETURNING {', '.join(self.COLUMNS)}",
+            (time.time(),)
+        ).fetchone()
+        return self._row_to_job(row) if row is not None else None
+
+    def _update(self, job_id: str, fields: Dict[str, Any]) -> None:
+        self._connection().execute(
+            f"UPDATE jobs SET {', '.join(f'{name} = ?' for name in fields)} WHERE id = ?",
+            [*(self._encode(name, value) for name, value in fields.items()), job_id]
+        )
+
+    def _count(self, status: str) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (status,)).fetchone()[0]
+
+    def _sweep(self, now: float) -> Dict[str, int]:
+        connection = self._connection()
+        removed = connection.execute(
+            "DELETE FROM jobs WHERE (status IN ('succeeded', 'failed') AND finished < ?) "
+            "OR (status = 'queued' AND created < ?)",
+            (now - JOB_TTL, now - JOB_TTL)
+        ).rowcount
+        failed = connection.execute(
+            "UPDATE jobs SET status = 'failed', stage = 'done', error = 'Job was abandoned by its worker', "
+            "data = NULL, finished = ?, updated = ? WHERE status = 'running' AND updated < ? AND attempts >= ?",
+            (now, now, now - JOB_STALE_SECONDS, JOB_MAX_ATTEMPTS)
+        ).rowcount
+        requeued = connection.execute(
+            "UPDATE jobs SET status = 'queued', stage = 'queued', updated = ? WHERE status = 'running' AND updated < ?",
+            (now, now - JOB_STALE_SECONDS)
+        ).rowcount
+        return {"removed": removed, "requeued": requeued, "failed": failed}
+
+    async def add(self, job: Job) -> None:
+        await asyncio.to_thread(self._add, job)
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        return await asyncio.to_thread(self._get, job_id)
+
+    async def claim(self) -> Optional[Job]:
+        return await asyncio.to_thread(self._claim)
+
+    async def update(self, job_id: str, **fields: Any) -> None:
+        await asyncio.to_thread(self._update, job_id, fields)
+
+    async def count(self, status: str) -> int:
+        return await asyncio.to_thread(self._count, status)
+
+    async def sweep(self, now: float) -> Dict[str, int]:
+        return await asyncio.to_thread(self._sweep, now)
+
+
+class JobQueue:
+    """
+    Runs submitted conversions on a pool of async workers
+
+    Workers wake as soon as a job is submitted in this process and also
+    poll the store every JOB_POLL_INTERVAL, which picks up jobs submitted
+    by other processes sharing a SQLite store. Progress is published to
+    in-process subscribers (WebSocket clients) on every stage change; a
+    heartbeat keeps `updated` fresh during long model calls so the
+    sweeper can tell a slow job from an abandoned one.
+    """
+
+    def __init__(self, store: JobStore, workers: int = 4, max_queued: int = 1000):
+        self.store = store
+        self.workers = max(1, workers)
+        self.max_queued = max_queued
+        self._wake = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self.submitted = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.last_sweep: Dict[str, int] = {}
+
+    async def submit(
+        self,
+        params: Dict[str, Any],
+        data: bytes,
+        filename: Optional[str] = None,
+        content_type: Optional[str] = None
+    ) -> Job:
+        """
+        Queue a conversion of `data` with convert_upload keyword arguments `params`
+
+        Raises:
+            JobQueueFullError: If max_queued jobs are already waiting
+        """
+        if await self.store.count("queued") >= self.max_queued:
+            raise JobQueueFullError("Job queue is full, try again shortly")
+        now = time.time()
+        job = Job(uuid.uuid4().hex, params, filename, content_type, data, created=now, updated=now)
+        await self.store.add(job)
+        self.submitted += 1
+        self._wake.set()
+        return job
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        return await self.store.get(job_id)
+
+    def subscribe(self, job_id: str) -> asyncio.Queue:
+        """Queue receiving the job's public view on every change in this process"""
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers.setdefault(job_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, job_id: str, queue: asyncio.Queue) -> None:
+        subscribers = self._subscribers.get(job_id)
+        if subscribers is not None:
+            subscribers.discard(queue)
+            if not subscribers:
+                del self._subscribers[job_id]
+
+    async def _set(self, job: Job, **fields: Any) -> None:
+        for name, value in fields.items():
+            setattr(job, name, value)
+        job.updated = time.time()
+        await self.store.update(job.id, updated=job.updated, **fields)
+        view = job.view()
+        for queue in self._subscribers.get(job.id, ()):
+            queue.put_nowait(view)
+
+    async def _heartbeat(self, job: Job) -> None:
+        while True:
+            await asyncio.sleep(JOB_STALE_SECONDS / 4)
+            job.updated = time.time()
+            await self.store.update(job.id, updated=job.updated)
+
+    async def _run(self, job: Job) -> None:
+        await self._set(job, stage="decode")
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        try:
+            for retry in range(JOB_BUSY_RETRIES + 1):
+                upload = UploadFile(
+                    io.BytesIO(job.data),
+                    size=len(job.data),
+                    filename=job.filename,
+                    headers=Headers({"content-type": job.content_type or "application/octet-stream"})
+                )
+                try:
+                    result = await convert_upload(
+                        upload, **job.params, on_stage=lambda stage: self._set(job, stage=stage)
+                    )
+                    break
+                except (ExecutorBusyError, UpstreamBusyError) as e:
+                    # Shed work is retried here rather than failing a job nobody is waiting on
+                    if retry == JOB_BUSY_RETRIES:
+                        raise
+                    await asyncio.sleep(getattr(e, "retry_after", 1.0))
+            await self._set(job, status="succeeded", stage="done", result=result, data=None, finished=time.time())
+            self.succeeded += 1
+        except asyncio.CancelledError:
+            # Shutting down: leave the job for the next worker to pick up
+            await self._set(job, status="queued", stage="queued")
+            raise
+        except Exception as e:
+            await self._set(job, status="failed", stage="done", error=str(e), data=None, finished=time.time())
+            self.failed += 1
+        finally:
+            heartbeat.cancel()
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self.store.claim()
+            if job is None:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), JOB_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(job)
+
+    async def _sweeper(self) -> None:
+        while True:
+            self.last_sweep = await self.store.sweep(time.time())
+            await asyncio.sleep(JOB_SWEEP_INTERVAL)
+
+    def start(self) -> None:
+        """Start the workers and the sweeper on the running loop"""
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+            self._tasks.append(asyncio.create_task(self._sweeper()))
+
+    async def stop(self) -> None:
+        """Cancel the workers; jobs they were running go back to the queue"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def stats(self) -> Dict[str, Any]:
+        return {
+            "store": type(self.store).__name__,
+            "workers": self.workers,
+            "queued": await self.store.count("queued"),
+            "running": await self.store.count("running"),
+            "max_queued": self.max_queued,
+            "submitted": self.submitted,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "last_sweep": self.last_sweep
+        }
+
+
+def create_job_store(kind: str = JOB_STORE) -> JobStore:
+    if kind == "memory":
+        return MemoryJobStore()
+    if kind == "sqlite":
+        return SQLiteJobStore(JOB_DB_PATH)
+    raise ValueError(f"Unknown JOB_STORE '{kind}'. Use one of: {', '.join(JOB_STORES)}")
+
+
+job_queue = JobQueue(create_job_store(), JOB_WORKERS, JOB_QUEUE_SIZE)
@@ -0,0 +1,173 @@
+"""
+LLM Cache
+Caches model responses in memory and in a SQLite database shared by workers
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+from utils.image_cache import BytesLRUCache
+
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", 67108864))  # 64MB default, 0 disables the memory tier
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "")  # SQLite file; empty disables the shared tier
+LLM_CACHE_DB_MAX_BYTES = int(os.getenv("LLM_CACHE_DB_MAX_BYTES", 536870912))  # 512MB default
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", 86400))  # seconds, 0 keeps entries until evicted
+LLM_CACHE_HEADER = "X-LLM-Cache"  # send "bypass" to skip the lookup and refresh the entry
+EVICTION_CHECK_INTERVAL = 64  # writes between size checks
+
+
+class SQLiteCache:
+    """
+    Key-value table in a SQLite database in WAL mode
+
+    WAL lets any number of readers run alongside one writer, so several
+    uvicorn worker processes can share the file. Each thread gets its own
+    connection. Expired rows are dropped on read and during eviction;
+    past `max_bytes` the least recently accessed rows go first.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._writes = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = self._connection()
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "expires REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        connection.execute("CREATE INDEX IF NOT EXISTS llm_cache_accessed ON llm_cache (accessed)")
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def get(self, key: str) -> Optional[Tuple[str, float]]:
+        """Return (value, expires) or None"""
+        now = time.time()
+        connection = self._connection()
+        row = connection.execute("SELECT value, expires FROM llm_cache WHERE key = ?", (key,)).fetchone()
+        if row is None or (row[1] and row[1] <= now):
+            self.misses += 1
+            return None
+        connection.execute("UPDATE llm_cache SET accessed = ? WHERE key = ?", (now, key))
+        self.hits += 1
+        return row[0], row[1]
+
+    def put(self, key: str, value: str, expires: float) -> None:
+        now = time.time()
+        connection = self._connection()
+        connection.execute(
+            "INSERT OR REPLACE INTO llm_cache (key, value, size, expires, accessed) VALUES (?, ?, ?, ?, ?)",
+            (key, value, len(value), expires, now)
+        )
+        with self._lock:
+            self._writes += 1
+            check = self._writes % EVICTION_CHECK_INTERVAL == 0
+        if check:
+            self.evict()
+
+    def evict(self) -> None:
+        """Drop expired rows, then the least recently accessed until under 90% of max_bytes"""
+        connection = self._connection()
+        connection.execute("DELETE FROM llm_cache WHERE expires > 0 AND expires <= ?", (time.time(),))
+        total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes * 0.9
+        removed = 0
+        doomed = []
+        for key, size in connection.execute("SELECT key, size FROM llm_cache ORDER BY accessed"):
+            if removed >= excess:
+                break
+            doomed.append((key,))
+            removed += size
+        connection.executemany("DELETE FROM llm_cache WHERE key = ?", doomed)
+        self.evictions += len(doomed)
+
+    def stats(self) -> Dict[str, Any]:
+        entries, total = self._connection().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache").fetchone()
+        return {
+            "path": self.path,
+            "entries": entries,
+            "bytes": total,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
+
+
+class LLMCache:
+    """Memory LRU in front of an optional shared SQLite tier; values are JSON-serialisable"""
+
+    def __init__(self, max_bytes: int, path: str = "", db_max_bytes: int = 0, ttl: int = 0):
+        self.ttl = ttl
+        # Entries are (expires, value, encoded size)
+        self.memory = BytesLRUCache(max_bytes, sizeof=lambda entry: entry[2])
+        self.disk = SQLiteCache(path, db_max_bytes) if path else None
+
+    @property
+    def enabled(self) -> bool:
+        return self.memory.max_bytes > 0 or self.disk is not None
+
+    async def get(self, key: str) -> Optional[Any]:
+        entry = self.memory.get(key)
+        if entry is not None:
+            if not entry[0] or entry[0] > time.time():
+                return entry[1]
+            self.memory.discard(key)
+        if self.disk is None:
+            return None
+        row = await asyncio.to_thread(self.disk.get, key)
+        if row is None:
+            return None
+        encoded, expires = row
+        value = json.loads(encoded)
+        self.memory.put(key, (expires, value, len(encoded)))
+        return value
+
+    async def put(self, key: str, value: Any) -> None:
+        encoded = json.dumps(value)
+        expires = time.time() + self.ttl if self.ttl else 0.0
+        self.memory.put(key, (expires, value, len(encoded)))
+        if self.disk is not None:
+            await asyncio.to_thread(self.disk.put, key, encoded, expires)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "ttl": self.ttl,
+            "memory": self.memory.stats(),
+            "disk": self.disk.stats() if self.disk is not None else None
+        }
+
+
+def make_llm_cache_key(*parts: Any) -> str:
+    """SHA-256 over the JSON encoding of everything that shapes a response"""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def cache_allowed(header_value: Optional[str]) -> bool:
+    """False when the request asked to bypass the LLM cache"""
+    return (header_value or "").strip().lower() != "bypass"
+
+
+llm_cache = LLMCache(LLM_CACHE_MAX_BYTES, LLM_CACHE_PATH, LLM_CACHE_DB_MAX_BYTES, LLM_CACHE_TTL)
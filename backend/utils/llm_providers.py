@@ -0,0 +1,685 @@
+"""
+LLM Providers
+Vision model providers behind one interface, and a router that picks between them
+"""
+
+import asyncio
+import json
+import os
+import random
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Tuple
+
+import anthropic
+import openai
+from anthropic import AsyncAnthropic
+from openai import AsyncOpenAI
+from utils.processed_image import ProcessedImage
+from utils.metrics import record_llm_call
+from utils.structured_output import openai_structured, schema_prompt
+from utils.rate_limiter import UpstreamBusyError, llm_governor
+from utils.resilience import RETRYABLE_ERRORS, call_with_retries, open_stream_with_retries
+
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "openai")  # openai or fake; shorthand when LLM_PROVIDERS is unset
+LLM_PROVIDERS = os.getenv("LLM_PROVIDERS", "")  # comma-separated: openai, anthropic, stub
+LLM_ROUTING = os.getenv("LLM_ROUTING", "pinned")  # pinned: the model's own provider first; adaptive: best score first
+LLM_FAILOVER = os.getenv("LLM_FAILOVER", "true").lower() in ("1", "true", "yes")
+# Relative preference per provider, e.g. {"openai": 2, "anthropic": 1}
+LLM_PROVIDER_WEIGHTS: Dict[str, float] = json.loads(os.getenv("LLM_PROVIDER_WEIGHTS", "{}"))
+OPENAI_DEFAULT_MODEL = os.getenv("OPENAI_DEFAULT_MODEL", "gpt-4-vision-preview")
+ANTHROPIC_DEFAULT_MODEL = os.getenv("ANTHROPIC_DEFAULT_MODEL", "claude-sonnet-4-5")
+ROUTING_MODES = ("pinned", "adaptive")
+# Append every successful response here as JSONL, for replay by utils.fake_llm_server
+LLM_RECORD_PATH = os.getenv("LLM_RECORD_PATH", "")
+# "asgi" sends the openai and anthropic providers to an in-process utils.fake_llm_server
+LLM_FAKE_SERVER = os.getenv("LLM_FAKE_SERVER", "")
+
+HEALTH_WINDOW = 50  # recent outcomes kept per provider and call kind
+EJECT_MIN_CALLS = 10  # outcomes needed before a provider can be ejected
+EJECT_ERROR_RATE = 0.5
+EJECT_SECONDS = 30.0
+ERROR_COST = 4.0  # each unit of error rate counts as this many extra latencies
+
+RATE_LIMIT_ERRORS = (openai.RateLimitError, anthropic.RateLimitError)
+STATUS_ERRORS = (openai.APIStatusError, anthropic.APIStatusError)
+
+
+def is_client_error(error: BaseException) -> bool:
+    """
+    A 4xx the request itself caused (bad model name, invalid input)
+
+    Another provider would not fix it, and it says nothing about the
+    provider's health. 408 is a timeout and 429 a rate limit, so neither
+    counts.
+    """
+    return isinstance(error, STATUS_ERRORS) and 400 <= error.status_code < 500 and error.status_code not in (408, 429)
+
+
+class Completion:
+    __slots__ = ("text", "model", "provider", "usage")
+
+    def __init__(self, text: str, model: str, provider: str, usage: Optional[Dict[str, int]] = None):
+        self.text = text
+        self.model = model
+        self.provider = provider
+        self.usage = usage
+
+    @property
+    def total_tokens(self) -> Optional[int]:
+        return self.usage["total_tokens"] if self.usage else None
+
+
+class Delta:
+    """One streamed piece: text, or the final token usage"""
+
+    __slots__ = ("text", "usage")
+
+    def __init__(self, text: Optional[str] = None, usage: Optional[Dict[str, int]] = None):
+        self.text = text
+        self.usage = usage
+
+
+def make_usage(prompt_tokens: int, completion_tokens: int) -> Dict[str, int]:
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens
+    }
+
+
+def build_image_messages(image_data: ProcessedImage, prompt: str) -> List[Dict[str, Any]]:
+    """Single user message carrying the prompt and the image as a data URL"""
+    return [
+        {
+            "role": "user",
+            "content": [
+                {"type": "text", "text": prompt},
+                {
+                    "type": "image_url",
+                    "image_url": {
+                        # Base64 data URL, built once per processed image
+                        "url": image_data.data_url
+                    }
+                }
+            ]
+        }
+    ]
+
+
+def estimate_request_tokens(image_data: ProcessedImage, prompt: str, max_tokens: int) -> int:
+    """Tokens a request counts against the per-minute budget: prompt, image and the completion allowance"""
+    image_tokens = (image_data.image_tokens or {}).get("estimated_tokens", 765)
+    return len(prompt) // 4 + image_tokens + max_tokens
+
+
+def record_response(
+    path: str,
+    prompt: str,
+    image_data: ProcessedImage,
+    schema: Optional[Dict[str, Any]],
+    text: str,
+    model: str,
+    provider: str,
+    duration_ms: float,
+    first_chunk_ms: Optional[float] = None
+) -> None:
+    """Append one response to a recording. Blocking; run it in a thread."""
+    from utils.fake_llm import replay_key
+    record = {
+        "key": replay_key(prompt, image_data.data),
+        "structured": schema is not None,
+        "model": model,
+        "provider": provider,
+        "content": text,
+        "latency_ms": round(first_chunk_ms, 3) if first_chunk_ms is not None else None,
+        "duration_ms": round(duration_ms, 3)
+    }
+    with open(path, "a") as file:
+        file.write(json.dumps(record) + "\n")
+
+
+def upstream_rate_limited(model: str, error: Exception) -> UpstreamBusyError:
+    """Turn an upstream 429 into a shed request and hold back further calls for the model"""
+    response = getattr(error, "response", None)
+    headers = response.headers if response is not None else {}
+    try:
+        if "retry-after-ms" in headers:
+            retry_after = float(headers["retry-after-ms"]) / 1000
+        else:
+            retry_after = float(headers.get("retry-after", 1))
+    except ValueError:
+        retry_after = 1.0
+    llm_governor.penalize(model, retry_after)
+    return UpstreamBusyError(f"Upstream rate limit reached for {model}, try again shortly", retry_after)
+
+
+class LLMProvider:
+    """A vision model API that can complete or stream a prompt about one image"""
+
+    name = "base"
+
+    def __init__(self, default_model: str, weight: float = 1.0):
+        self.default_model = default_model
+        self.weight = weight
+
+    def owns(self, model: str) -> bool:
+        """Whether `model` is one of this provider's model names"""
+        raise NotImplementedError
+
+    async def complete(
+        self,
+        model: str,
+        prompt: str,
+        image_data: ProcessedImage,
+        max_tokens: int,
+        schema: Optional[Dict[str, Any]] = None
+    ) -> Completion:
+        raise NotImplementedError
+
+    def stream(
+        self,
+        model: str,
+        prompt: str,
+        image_data: ProcessedImage,
+        max_tokens: int,
+        schema: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[Delta]:
+        """
+        Async generator of text deltas; nothing is sent until it is first iterated
+
+        With `schema`, the output must be JSON matching it (structured output).
+        """
+        raise NotImplementedError
+
+
+class OpenAIProvider(LLMProvider):
+    name = "openai"
+    MODEL_PREFIXES = ("gpt-", "chatgpt-", "o1", "o3", "o4")
+
+    def __init__(self, client: Any, default_model: str = OPENAI_DEFAULT_MODEL, weight: float = 1.0):
+        super().__init__(default_model, weight)
+        self.client = client
+
+    def owns(self, model: str) -> bool:
+        return model.startswith(self.MODEL_PREFIXES)
+
+    async def complete(
+        self,
+        model: str,
+        prompt: str,
+        image_data: ProcessedImage,
+        max_tokens: int,
+        schema: Optional[Dict[str, Any]] = None
+    ) -> Completion:
+        prompt, structured = openai_structured(model, prompt, schema)
+        response = await self.client.chat.completions.create(
+            model=model,
+            messages=build_image_messages(image_data, prompt),
+            max_tokens=max_tokens,
+            **structured,
+        )
+        return Completion(
+            response.choices[0].message.content,
+            model,
+            self.name,
+            make_usage(response.usage.prompt_tokens, response.usage.completion_tokens) if response.usage else None
+        )
+
+    async def stream(
+        self,
+        model: str,
+        prompt: str,
+        image_data: ProcessedImage,
+        max_tokens: int,
+        schema: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[Delta]:
+        prompt, structured = openai_structured(model, prompt, schema)
+        stream = await self.client.chat.completions.create(
+            model=model,
+            messages=build_image_messages(image_data, prompt),
+            max_tokens=max_tokens,
+            stream=True,
+            stream_options={"include_usage": True},
+            **structured,
+        )
+        try:
+            async for chunk in stream:
+                if chunk.usage is not None:
+                    yield Delta(usage=make_usage(chunk.usage.prompt_tokens, chunk.usage.completion_tokens))
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield Delta(chunk.choices[0].delta.content)
+        finally:
+            close = getattr(stream, "close", None) or getattr(stream, "aclose", None)
+            if close is not None:
+                await close()
+
+
+class AnthropicProvider(LLMProvider):
+    name = "anthropic"
+
+    def __init__(self, client: Any, default_model: str = ANTHROPIC_DEFAULT_MODEL, weight: float = 1.0):
+        super().__init__(default_model, weight)
+        self.client = client
+
+    def owns(self, model: str) -> bool:
+        return model.startswith("claude")
+
+    @staticmethod
+    def messages(image_data: ProcessedImage, prompt: str, schema: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        # No response_format here; the schema goes in the prompt and the parser skips any stray text
+        prompt = schema_prompt(prompt, schema)
+        return [
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "image",
+                        "source": {"type": "base64", "media_type": image_data.mime_type, "data": image_data.base64}
+                    },
+                    {"type": "text", "text": prompt}
+                ]
+            }
+        ]
+
+    async def complete(
+        self,
+        model: str,
+        prompt: str,
+        image_data: ProcessedImage,
+        max_tokens: int,
+        schema: Optional[Dict[str, Any]] = None
+    ) -> Completion:
+        response = await self.client.messages.create(
+            model=model,
+            max_tokens=max_tokens,
+            messages=self.messages(image_data, prompt, schema),
+        )
+        text = "".join(block.text for block in response.content if block.type == "text")
+        return Completion(text, model, self.name, make_usage(response.usage.input_tokens, response.usage.output_tokens))
+
+    async def stream(
+        self,
+        model: str,
+        prompt: str,
+        image_data: ProcessedImage,
+        max_tokens: int,
+        schema: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[Delta]:
+        stream = await self.client.messages.create(
+            model=model,
+            max_tokens=max_tokens,
+            messages=self.messages(image_data, prompt, schema),
+            stream=True,
+        )
+        input_tokens = 0
+        try:
+            async for event in stream:
+                if event.type == "message_start":
+                    input_tokens = event.message.usage.input_tokens
+                elif event.type == "content_block_delta" and event.delta.type == "text_delta":
+                    yield Delta(event.delta.text)
+                elif event.type == "message_delta":
+                    yield Delta(usage=make_usage(input_tokens, event.usage.output_tokens))
+        finally:
+            await stream.close()
+
+
+class StubProvider(OpenAIProvider):
+    """Local stand-in with canned output, for offline runs and tests"""
+
+    name = "stub"
+
+    def __init__(self, client: Any = None, default_model: str = "stub", weight: float = 1.0):
+        if client is None:
+            from utils.fake_llm import FakeAsyncOpenAI
+            client = FakeAsyncOpenAI()
+        super().__init__(client, default_model, weight)
+
+    def owns(self, model: str) -> bool:
+        return model.startswith("stub")
+
+
+class ProviderHealth:
+    """Recent latencies and outcomes for one provider and call kind"""
+
+    def __init__(self, window: int = HEALTH_WINDOW):
+        self.outcomes: Deque[Tuple[float, bool]] = deque(maxlen=window)
+        self.ejected_until = 0.0
+        self.ejections = 0
+
+    def record(self, seconds: float, ok: bool) -> None:
+        self.outcomes.append((seconds, ok))
+        if not ok and len(self.outcomes) >= EJECT_MIN_CALLS and self.error_rate >= EJECT_ERROR_RATE:
+            self.ejected_until = time.monotonic() + EJECT_SECONDS
+            self.ejections += 1
+
+    @property
+    def ejected(self) -> bool:
+        return time.monotonic() < self.ejected_until
+
+    @property
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return sum(not ok for _, ok in self.outcomes) / len(self.outcomes)
+
+    @property
+    def latency(self) -> Optional[float]:
+        """Median latency of recent successful calls"""
+        latencies = sorted(seconds for seconds, ok in self.outcomes if ok)
+        return latencies[len(latencies) // 2] if latencies else None
+
+    def stats(self) -> Dict[str, Any]:
+        latency = self.latency
+        return {
+            "calls": len(self.outcomes),
+            "error_rate": round(self.error_rate, 3),
+            "p50_ms": round(latency * 1000, 1) if latency is not None else None,
+            "ejected": self.ejected,
+            "ejections": self.ejections
+        }
+
+
+class ModelRouter:
+    """
+    Chooses a provider per request and fails over to the others
+
+    Each provider is scored per call kind as weight / (latency * (1 +
+    ERROR_COST * error rate))^2 from its recent calls; providers without
+    history borrow the mean latency of the others, so they still get
+    tried. A provider whose recent error rate reaches EJECT_ERROR_RATE is
+    skipped for EJECT_SECONDS unless every provider is ejected.
+
+    In pinned mode the provider owning the requested model goes first; in
+    adaptive mode the first provider is drawn with probability
+    proportional to its score. Either way the rest follow in score order
+    as failover candidates, using their default models. Failover only
+    happens before any output has been produced.
+
+    Only transient failures (RETRYABLE_ERRORS: 5xx, timeouts, connection
+    errors) and upstream rate limits count against a provider's health.
+    Client errors (is_client_error) are raised at once, without failover,
+    so bad requests from one caller cannot eject a provider for everyone.
+    """
+
+    def __init__(
+        self,
+        providers: List[LLMProvider],
+        routing: str = "pinned",
+        failover: bool = True,
+        record_path: str = ""
+    ):
+        if routing not in ROUTING_MODES:
+            raise ValueError(f"Unknown LLM_ROUTING mode '{routing}'. Use one of: {', '.join(ROUTING_MODES)}")
+        if not providers:
+            raise ValueError("At least one LLM provider must be configured")
+        self.providers = providers
+        self.routing = routing
+        self.failover = failover
+        self.record_path = record_path
+        self.failovers = 0
+        self._health: Dict[Tuple[str, str], ProviderHealth] = {}
+
+    def health(self, kind: str, provider: LLMProvider) -> ProviderHealth:
+        health = self._health.get((kind, provider.name))
+        if health is None:
+            health = self._health[(kind, provider.name)] = ProviderHealth()
+        return health
+
+    def _scores(self, kind: str, providers: List[LLMProvider]) -> Dict[str, float]:
+        latencies = {provider.name: self.health(kind, provider).latency for provider in providers}
+        measured = [latency for latency in latencies.values() if latency is not None]
+        fallback = sum(measured) / len(measured) if measured else 1.0
+        scores = {}
+        for provider in providers:
+            latency = latencies[provider.name] or fallback
+            cost = max(latency, 1e-3) * (1 + ERROR_COST * self.health(kind, provider).error_rate)
+            scores[provider.name] = provider.weight / cost ** 2
+        return scores
+
+    def candidates(self, kind: str, model: str) -> List[Tuple[LLMProvider, str]]:
+        """Providers to try in order, each with the model name to send it"""
+        healthy = [provider for provider in self.providers if not self.health(kind, provider).ejected]
+        pool = healthy or self.providers
+        scores = self._scores(kind, pool)
+        ranked = sorted(pool, key=lambda provider: scores[provider.name], reverse=True)
+
+        owner = next((provider for provider in pool if provider.owns(model)), None)
+        if self.routing == "pinned" and owner is not None:
+            first = owner
+        else:
+            first = random.choices(ranked, weights=[scores[provider.name] for provider in ranked])[0]
+
+        order = [first] + [provider for provider in ranked if provider is not first]
+        if not self.failover:
+            order = order[:1]
+        return [(provider, model if provider.owns(model) else provider.default_model) for provider in order]
+
+    async def complete(
+        self,
+        kind: str,
+        model: str,
+        prompt: str,
+        image_data: ProcessedImage,
+        max_tokens: int,
+        schema: Optional[Dict[str, Any]] = None
+    ) -> Completion:
+        """
+        Run one completion through rate limiting, retries and failover
+
+        Args:
+            kind: Call kind (code, elements), which keeps separate health
+            model: Requested model
+            prompt: Prompt text
+            image_data: Image sent with the prompt
+            max_tokens: Completion allowance
+            schema: JSON schema the output must match, for structured output
+
+        Returns:
+            Completion from the first provider that succeeded
+
+        Raises:
+            UpstreamBusyError: If the last candidate was shed or rate limited
+            APIStatusError: At once, for a 4xx caused by the request itself
+            Exception: The last candidate's error when every provider failed
+        """
+        tokens = estimate_request_tokens(image_data, prompt, max_tokens)
+        last_error: Optional[BaseException] = None
+        for index, (provider, provider_model) in enumerate(self.candidates(kind, model)):
+            if index:
+                self.failovers += 1
+            started = time.perf_counter()
+            try:
+                async with llm_governor.permit(provider_model, tokens) as permit:
+                    try:
+                        completion = await call_with_retries(
+                            lambda: provider.complete(provider_model, prompt, image_data, max_tokens, schema),
+                            latency_key=f"{kind}:{provider.name}:{provider_model}",
+                            allow_hedge=lambda: llm_governor.try_reserve(provider_model, tokens)
+                        )
+                    except RATE_LIMIT_ERRORS as e:
+                        raise upstream_rate_limited(provider_model, e) from e
+                    permit.settle(completion.total_tokens)
+            except UpstreamBusyError as e:
+                if e.__cause__ is not None:
+                    # Rejected upstream, not just by our own queue
+                    self.health(kind, provider).record(time.perf_counter() - started, False)
+                record_llm_call(kind, provider.name, provider_model, time.perf_counter() - started, "busy")
+                last_error = e
+                continue
+            except Exception as e:
+                record_llm_call(kind, provider.name, provider_model, time.perf_counter() - started, "error")
+                if is_client_error(e):
+                    raise
+                if isinstance(e, RETRYABLE_ERRORS):
+                    self.health(kind, provider).record(time.perf_counter() - started, False)
+                last_error = e
+                continue
+            self.health(kind, provider).record(time.perf_counter() - started, True)
+            record_llm_call(kind, provider.name, provider_model, time.perf_counter() - started, "success", completion.usage)
+            if self.record_path:
+                await asyncio.to_thread(
+                    record_response, self.record_path, prompt, image_data, schema, completion.text,
+                    completion.model, provider.name, (time.perf_counter() - started) * 1000
+                )
+            return completion
+        raise last_error
+
+    async def stream(
+        self,
+        kind: str,
+        model: str,
+        prompt: str,
+        image_data: ProcessedImage,
+        max_tokens: int,
+        schema: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[Tuple[str, str, Delta]]:
+        """
+        Stream one completion, failing over until the first delta arrives
+
+        Yields:
+            (provider name, model, delta) for each delta of the chosen stream
+
+        Raises:
+            As for complete(); errors after the first delta are raised as is
+        """
+        tokens = estimate_request_tokens(image_data, prompt, max_tokens)
+        last_error: Optional[BaseException] = None
+        for index, (provider, provider_model) in enumerate(self.candidates(kind, model)):
+            if index:
+                self.failovers += 1
+            started = time.perf_counter()
+            streaming = False
+
+            async def open_stream() -> AsyncIterator[Delta]:
+                return provider.stream(provider_model, prompt, image_data, max_tokens, schema)
+
+            try:
+                async with llm_governor.permit(provider_model, tokens) as permit:
+                    try:
+                        # Retries and hedges only cover the wait for the first delta
+                        _, iterator, first = await open_stream_with_retries(
+                            open_stream,
+                            latency_key=f"{kind}:{provider.name}:{provider_model}",
+                            allow_hedge=lambda: llm_governor.try_reserve(provider_model, tokens)
+                        )
+                    except RATE_LIMIT_ERRORS as e:
+                        raise upstream_rate_limited(provider_model, e) from e
+                    self.health(kind, provider).record(time.perf_counter() - started, True)
+                    streaming = True
+
+                    first_chunk_ms = (time.perf_counter() - started) * 1000
+                    usage = None
+                    texts: List[str] = []
+                    if first is not None:
+                        yield provider.name, provider_model, first
+                        texts.append(first.text or "")
+                        async for delta in iterator:
+                            if delta.usage is not None:
+                                usage = delta.usage
+                            if self.record_path and delta.text:
+                                texts.append(delta.text)
+                            yield provider.name, provider_model, delta
+                    permit.settle(usage["total_tokens"] if usage else None)
+                    record_llm_call(kind, provider.name, provider_model, time.perf_counter() - started, "success", usage)
+                    if self.record_path:
+                        await asyncio.to_thread(
+                            record_response, self.record_path, prompt, image_data, schema, "".join(texts),
+                            provider_model, provider.name, (time.perf_counter() - started) * 1000, first_chunk_ms
+                        )
+                    return
+            except UpstreamBusyError as e:
+                record_llm_call(kind, provider.name, provider_model, time.perf_counter() - started, "busy")
+                if streaming:
+                    raise
+                if e.__cause__ is not None:
+                    self.health(kind, provider).record(time.perf_counter() - started, False)
+                last_error = e
+            except Exception as e:
+                record_llm_call(kind, provider.name, provider_model, time.perf_counter() - started, "error")
+                if streaming or is_client_error(e):
+                    raise
+                if isinstance(e, RETRYABLE_ERRORS):
+                    self.health(kind, provider).record(time.perf_counter() - started, False)
+                last_error = e
+        raise last_error
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "routing": self.routing,
+            "failover": self.failover,
+            "failovers": self.failovers,
+            "providers": {
+                provider.name: {
+                    "weight": provider.weight,
+                    "default_model": provider.default_model,
+                    "health": {
+                        kind: health.stats()
+                        for (kind, name), health in self._health.items()
+                        if name == provider.name
+                    }
+                }
+                for provider in self.providers
+            }
+        }
+
+
+_fake_server_app: Any = None
+
+
+def fake_server_options(name: str) -> Dict[str, Any]:
+    """
+    SDK client arguments that route a provider to an in-process fake server
+
+    The real SDK still builds, sends and parses every request, so
+    streaming, error mapping and retry-after handling are exercised
+    without network access or API keys. For a fake server in another
+    process, set OPENAI_BASE_URL or ANTHROPIC_BASE_URL instead.
+    """
+    if not LLM_FAKE_SERVER:
+        return {}
+    if LLM_FAKE_SERVER != "asgi":
+        raise ValueError(f"Unknown LLM_FAKE_SERVER '{LLM_FAKE_SERVER}'. Use asgi, or set OPENAI_BASE_URL / ANTHROPIC_BASE_URL")
+    global _fake_server_app
+    from utils.fake_llm_server import create_fake_llm_app, fake_http_client
+    if _fake_server_app is None:
+        _fake_server_app = create_fake_llm_app()
+    return {
+        "api_key": "fake",
+        "base_url": "http://fake-llm/v1" if name == "openai" else "http://fake-llm",
+        "http_client": fake_http_client(_fake_server_app, openai if name == "openai" else anthropic)
+    }
+
+
+
+def build_providers(names: str) -> List[LLMProvider]:
+    """Instantiate the comma-separated providers, each with its configured weight"""
+    providers: List[LLMProvider] = []
+    for name in (part.strip() for part in names.split(",")):
+        if not name:
+            continue
+        weight = float(LLM_PROVIDER_WEIGHTS.get(name, 1.0))
+        if name == "openai":
+            # Retries and deadlines are handled by utils.resilience, not the SDK
+            options = {"api_key": os.getenv("OPENAI_API_KEY"), "max_retries": 0, **fake_server_options(name)}
+            providers.append(OpenAIProvider(AsyncOpenAI(**options), weight=weight))
+        elif name == "anthropic":
+            options = {"api_key": os.getenv("ANTHROPIC_API_KEY"), "max_retries": 0, **fake_server_options(name)}
+            providers.append(AnthropicProvider(AsyncAnthropic(**options), weight=weight))
+        elif name == "stub":
+            providers.append(StubProvider(weight=weight))
+        else:
+            raise ValueError(f"Unknown LLM provider '{name}'. Use any of: openai, anthropic, stub")
+    return providers
+
+
+def default_provider_names() -> str:
+    if LLM_PROVIDERS:
+        return LLM_PROVIDERS
+    if LLM_PROVIDER == "fake":
+        return "stub"
+    return "openai,anthropic" if os.getenv("ANTHROPIC_API_KEY") else "openai"
+
+
+llm_router = ModelRouter(build_providers(default_provider_names()), LLM_ROUTING, LLM_FAILOVER, LLM_RECORD_PATH)
@@ -0,0 +1,293 @@
+"""
+Metrics
+Dependency-free counters and histograms rendered in the Prometheus text format
+"""
+
+import inspect
+import math
+import time
+from bisect import bisect_left
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+from fastapi.responses import JSONResponse
+
+# Seconds, from a cache hit to a slow vision call
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+# Bytes, 1KB to 16MB in powers of four
+SIZE_BUCKETS = tuple(1024 * 4 ** power for power in range(8))
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LabelValues = Tuple[str, ...]
+Samples = Dict[LabelValues, float]
+
+
+def format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+def escape_label(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(names: Tuple[str, ...], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    """A named metric family with fixed label names"""
+
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+
+    async def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    """
+    Monotonic count per label combination
+
+    inc() is a single dict update, so it is cheap enough for hot paths.
+    Updates are not locked: record from the event loop thread only.
+    """
+
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Samples = {}
+
+    def inc(self, *label_values: str, amount: float = 1.0) -> None:
+        self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def value(self, *label_values: str) -> float:
+        return self._values.get(label_values, 0.0)
+
+    async def render(self) -> List[str]:
+        lines = self.header()
+        for values, total in sorted(self._values.items()):
+            lines.append(f"{self.name}{format_labels(self.labels, values)} {format_value(total)}")
+        return lines
+
+
+class Histogram(Metric):
+    """
+    Bucketed observations per label combination
+
+    Each series keeps one count per bucket plus sum and count;
+    observe() is a bisect and three additions, and buckets are only
+    made cumulative when rendered.
+    """
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = LATENCY_BUCKETS
+    ):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        series = self._series.get(label_values)
+        if series is None:
+            # One slot per bucket, one for +Inf, then sum and count
+            series = self._series[label_values] = [0.0] * (len(self.buckets) + 3)
+        series[bisect_left(self.buckets, value)] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def time(self, *label_values: str) -> "Timer":
+        """Context manager observing the seconds spent inside it"""
+        return Timer(self, label_values)
+
+    def count(self, *label_values: str) -> int:
+        series = self._series.get(label_values)
+        return int(series[-1]) if series else 0
+
+    async def render(self) -> List[str]:
+        lines = self.header()
+        for values, series in sorted(self._series.items()):
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (math.inf,), series):
+                cumulative += count
+                labels = format_labels(self.labels, values, f'le="{format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {format_value(cumulative)}")
+            labels = format_labels(self.labels, values)
+            lines.append(f"{self.name}_sum{labels} {format_value(series[-2])}")
+            lines.append(f"{self.name}_count{labels} {format_value(series[-1])}")
+        return lines
+
+
+class Timer:
+    __slots__ = ("histogram", "label_values", "started")
+
+    def __init__(self, histogram: Histogram, label_values: LabelValues):
+        self.histogram = histogram
+        self.label_values = label_values
+        self.started = 0.0
+
+    def __enter__(self) -> "Timer":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.histogram.observe(time.perf_counter() - self.started, *self.label_values)
+
+
+class Collected(Metric):
+    """
+    Gauge or counter read from existing state when scraped
+
+    Nothing is recorded on the hot path: `collect` returns the current
+    samples (or an awaitable of them) keyed by label values, e.g. from
+    a component's stats().
+    """
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Tuple[str, ...],
+        collect: Callable[[], Union[Samples, Awaitable[Samples]]],
+        type: str = "gauge"
+    ):
+        super().__init__(name, documentation, labels)
+        self.collect = collect
+        self.type = type
+
+    async def render(self) -> List[str]:
+        samples = self.collect()
+        if inspect.isawaitable(samples):
+            samples = await samples
+        lines = self.header()
+        for values, value in sorted(samples.items()):
+            if value is not None:
+                lines.append(f"{self.name}{format_labels(self.labels, values)} {format_value(value)}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labels: Tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labels))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labels: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = LATENCY_BUCKETS
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    def collected(
+        self,
+        name: str,
+        documentation: str,
+        labels: Tuple[str, ...],
+        collect: Callable[[], Union[Samples, Awaitable[Samples]]],
+        type: str = "gauge"
+    ) -> Collected:
+        return self.register(Collected(name, documentation, labels, collect, type))
+
+    async def render(self) -> str:
+        """Every metric in the Prometheus text exposition format"""
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            try:
+                lines.extend(await metric.render())
+            except Exception:
+                # One broken collector must not take the whole scrape down
+                continue
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+stage_seconds = registry.histogram(
+    "image_to_code_stage_seconds",
+    "Time spent per pipeline stage: upload_read, decode, resize, encode, llm, serialize",
+    ("stage",)
+)
+image_path_seconds = registry.histogram(
+    "image_to_code_image_path_seconds",
+    "Image processing time per path: passthrough, cache, transform, analyze, tile",
+    ("path",)
+)
+payload_bytes = registry.histogram(
+    "image_to_code_payload_bytes",
+    "Payload sizes: upload (raw file), image (encoded image sent to the model), response (JSON body)",
+    ("kind",),
+    SIZE_BUCKETS
+)
+llm_request_seconds = registry.histogram(
+    "llm_request_seconds",
+    "Upstream model call time per provider and model, including retries, until the response is complete",
+    ("kind", "provider", "model", "outcome")
+)
+llm_tokens = registry.counter(
+    "llm_tokens_total",
+    "Tokens reported by providers per model; type is prompt or completion",
+    ("provider", "model", "type")
+)
+mock_fallbacks = registry.counter(
+    "llm_mock_fallbacks_total",
+    "Responses replaced by mock output after an upstream failure",
+    ("kind",)
+)
+
+
+def record_llm_call(
+    kind: str,
+    provider: str,
+    model: str,
+    seconds: float,
+    outcome: str,
+    usage: Optional[Dict[str, int]] = None
+) -> None:
+    """Observe one upstream call and the tokens it used"""
+    llm_request_seconds.observe(seconds, kind, provider, model, outcome)
+    if outcome == "success":
+        stage_seconds.observe(seconds, "llm")
+    if usage:
+        llm_tokens.inc(provider, model, "prompt", amount=usage.get("prompt_tokens") or 0)
+        llm_tokens.inc(provider, model, "completion", amount=usage.get("completion_tokens") or 0)
+
+
+class MeteredJSONResponse(JSONResponse):
+    """JSONResponse that records serialization time and body size"""
+
+    def render(self, content: Any) -> bytes:
+        started = time.perf_counter()
+        body = super().render(content)
+        stage_seconds.observe(time.perf_counter() - started, "serialize")
+        payload_bytes.observe(len(body), "response")
+        return body
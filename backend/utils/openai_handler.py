@@ -1,34 +1,59 @@
 """
 OpenAI Handler
-Manages interactions with OpenAI API for image-to-code generation
+Manages vision model calls for image-to-code generation, through the provider router
 """
 
+import asyncio
 import os
-import base64
-from typing import Dict, Any, List, Optional
-import openai
-from openai import AsyncOpenAI
+import time
+from typing import Dict, Any, List, Optional, AsyncIterator
+from utils.processed_image import ProcessedImage
+from utils.code_fences import FenceStripper, strip_code_fences
+from utils.image_cache import content_digest
+from utils.llm_cache import llm_cache, make_llm_cache_key
+from utils.singleflight import SingleFlight
+from utils.rate_limiter import UpstreamBusyError
+from utils.llm_providers import llm_router
+from utils.metrics import mock_fallbacks
+from utils.ui_elements import ELEMENTS_SCHEMA, ElementArrayParser, parse_elements
 
-# Initialize OpenAI client
-client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# Bump when a prompt template or response handling changes so old cache entries stop matching
+CODE_PROMPT_VERSION = 1
+ELEMENTS_PROMPT_VERSION = 2
+# Needs structured outputs (json_schema) for a strict schema; other models get it in the prompt
+ELEMENTS_MODEL = os.getenv("ELEMENTS_MODEL", "gpt-4o")
 
-async def generate_code_from_image(
-    image_data: Dict[str, Any],
+ELEMENTS_PROMPT = """Analyze this UI image and identify all UI elements, in reading order (top to bottom, left to right).
+
+For each element, provide:
+- type (button, input, text, heading, image, container, nav, etc.)
+- position: x, y of the top-left corner as a percentage of the image
+- size: width and height as a percentage of the image
+- content: text content, or null
+- styling: colors, fonts, borders and spacing as CSS values, null where not visible
+
+Return a JSON object with an "elements" array."""
+
+# Identical requests already in flight share one upstream call
+llm_flight = SingleFlight()
+
+def build_code_prompt(
     framework: str = "react",
     include_styling: bool = True,
-    model: str = "gpt-4-vision-preview"
-) -> Dict[str, Any]:
+    hints: Optional[str] = None,
+    seed_code: Optional[str] = None
+) -> str:
     """
-    Generate code from image using OpenAI Vision API
+    Build the code generation prompt
     
     Args:
-        image_data: Processed image data
         framework: Target framework
         include_styling: Whether to include CSS/Tailwind
-        model: OpenAI model to use
+        hints: Locally measured facts about the image to add to the prompt
+        seed_code: Code generated earlier for a near-identical image, to adapt rather than rewrite
     
     Returns:
-        Generated code and metadata
+        Prompt text
     """
     
     # Prepare prompt based on framework
@@ -56,40 +81,88 @@ Requirements:
 - Return only the code, no explanations
 """
     
-    try:
-        # Encode image to base64
-        image_base64 = image_data.get("base64")
-        
-        # Call OpenAI Vision API
-        response = await client.chat.completions.create(
-            model=model,
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": full_prompt},
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{image_base64}"
-                            }
-                        }
-                    ]
-                }
-            ],
-            max_tokens=4096,
-        )
-        
-        code = response.choices[0].message.content
-        
-        return {
-            "code": code,
-            "model": model,
+    if hints:
+        full_prompt += f"\n{hints}\n"
+    
+    if seed_code:
+        full_prompt += f"""
+A nearly identical image previously produced the code below. Start from it and change only what differs in this image:
+
+{seed_code}
+"""
+    
+    return full_prompt
+
+async def response_cache_key(kind: str, image_data: ProcessedImage, model: str, *settings: Any) -> str:
+    """Cache key over the exact image payload, the model and everything that shapes the prompt"""
+    image_digest = await asyncio.to_thread(content_digest, image_data.data)
+    return make_llm_cache_key(kind, image_digest, image_data.width, image_data.height, model, *settings)
+
+async def generate_code_from_image(
+    image_data: ProcessedImage,
+    framework: str = "react",
+    include_styling: bool = True,
+    model: str = "gpt-4-vision-preview",
+    hints: Optional[str] = None,
+    seed_code: Optional[str] = None,
+    use_cache: bool = True
+) -> Dict[str, Any]:
+    """
+    Generate code from image using OpenAI Vision API
+    
+    Args:
+        image_data: Processed image data
+        framework: Target framework
+        include_styling: Whether to include CSS/Tailwind
+        model: Requested model; its provider is preferred, others may serve on failover
+        hints: Locally measured facts about the image to add to the prompt
+        seed_code: Code generated earlier for a near-identical image, to adapt rather than rewrite
+        use_cache: Look the response up in the LLM cache first (it is stored either way)
+    
+    Concurrent calls for the same image and settings share one upstream
+    request, even when use_cache is off.
+    
+    Returns:
+        Generated code and metadata
+    
+    Raises:
+        UpstreamBusyError: If the call was shed locally or rate limited upstream
+    """
+    
+    full_prompt = build_code_prompt(framework, include_styling, hints, seed_code)
+    cache_key = await response_cache_key(
+        "code", image_data, model, CODE_PROMPT_VERSION, framework, include_styling, full_prompt
+    )
+    
+    if use_cache and llm_cache.enabled:
+        cached = await llm_cache.get(cache_key)
+        if cached is not None:
+            return {**cached, "cached": True}
+    
+    async def request_code() -> Dict[str, Any]:
+        # Rate limiting, retries and provider failover happen in the router
+        completion = await llm_router.complete("code", model, full_prompt, image_data, 4096)
+        result = {
+            "code": completion.text,
+            "model": completion.model,
+            "provider": completion.provider,
             "framework": framework
         }
+        # Only real responses are cached; the mock fallback below never is
+        if llm_cache.enabled:
+            await llm_cache.put(cache_key, result)
+        return result
+    
+    try:
+        # The result is shared with coalesced callers, so hand out a copy
+        return dict(await llm_flight.do(cache_key, request_code))
     
+    except UpstreamBusyError:
+        # Shed with 503 by the route rather than passed off as generated code
+        raise
     except Exception as e:
         # Fallback to mock code for testing
+        mock_fallbacks.inc("code")
         return {
             "code": generate_mock_code(framework),
             "model": "mock",
@@ -97,58 +170,275 @@ Requirements:
             "error": str(e)
         }
 
-async def extract_ui_elements(image_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+async def stream_code_from_image(
+    image_data: ProcessedImage,
+    framework: str = "react",
+    include_styling: bool = True,
+    model: str = "gpt-4-vision-preview",
+    hints: Optional[str] = None,
+    use_cache: bool = True
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Stream generated code as it is produced
+    
+    Markdown fences are stripped incrementally, so only code is forwarded.
+    
+    Args:
+        image_data: Processed image data
+        framework: Target framework
+        include_styling: Whether to include CSS/Tailwind
+        model: Requested model; its provider is preferred, others may serve on failover
+        hints: Locally measured facts about the image to add to the prompt
+        use_cache: Serve a cached response as a single chunk when there is one
+    
+    Yields:
+        {"type": "code", "text": ...} events, then one {"type": "done", ...}
+        event with model, usage and timings, or an {"type": "error", ...}
+        event (with status 503 and retry_after when the call was shed)
+    """
+    
+    full_prompt = build_code_prompt(framework, include_styling, hints)
+    started = time.perf_counter()
+    first_chunk_ms = None
+    usage = None
+    stripper = FenceStripper()
+    raw_chunks: List[str] = []
+    
+    # Shares entries with generate_code_from_image, which stores the raw response
+    cache_key = None
+    if llm_cache.enabled:
+        cache_key = await response_cache_key(
+            "code", image_data, model, CODE_PROMPT_VERSION, framework, include_styling, full_prompt
+        )
+        cached = await llm_cache.get(cache_key) if use_cache else None
+        if cached is not None:
+            yield {"type": "code", "text": strip_code_fences(cached["code"])}
+            yield {
+                "type": "done",
+                "model": cached["model"],
+                "provider": cached.get("provider"),
+                "framework": framework,
+                "usage": None,
+                "cached": True,
+                "timings": {
+                    "first_chunk_ms": round((time.perf_counter() - started) * 1000, 3),
+                    "total_ms": round((time.perf_counter() - started) * 1000, 3)
+                }
+            }
+            return
+    
+    try:
+        used_model, used_provider = model, None
+        async for used_provider, used_model, delta in llm_router.stream("code", model, full_prompt, image_data, 4096):
+            if delta.usage is not None:
+                usage = delta.usage
+            if not delta.text:
+                continue
+            raw_chunks.append(delta.text)
+            text = stripper.feed(delta.text)
+            if text:
+                if first_chunk_ms is None:
+                    first_chunk_ms = (time.perf_counter() - started) * 1000
+                yield {"type": "code", "text": text}
+        
+        text = stripper.finish()
+        if text:
+            yield {"type": "code", "text": text}
+        error = None
+        if cache_key is not None:
+            await llm_cache.put(cache_key, {
+                "code": "".join(raw_chunks),
+                "model": used_model,
+                "provider": used_provider,
+                "framework": framework
+            })
+    
+    except UpstreamBusyError as e:
+        # Shed, not failed: tell the client when to retry instead of sending mock code
+        yield {"type": "error", "error": str(e), "status": 503, "retry_after": e.retry_after_header}
+        return
+    except Exception as e:
+        if first_chunk_ms is not None:
+            # Part of the code already went out; a mock tail would corrupt it
+            yield {"type": "error", "error": str(e)}
+            return
+        # Fallback to mock code for testing
+        mock_fallbacks.inc("code")
+        yield {"type": "code", "text": generate_mock_code(framework)}
+        used_model, used_provider, error = "mock", None, str(e)
+    
+    done = {
+        "type": "done",
+        "model": used_model,
+        "provider": used_provider,
+        "framework": framework,
+        "usage": usage,
+        "cached": False,
+        "timings": {
+            "first_chunk_ms": round(first_chunk_ms, 3) if first_chunk_ms is not None else None,
+            "total_ms": round((time.perf_counter() - started) * 1000, 3)
+        }
+    }
+    if error:
+        done["error"] = error
+    yield done
+
+async def extract_ui_elements(image_data: ProcessedImage, use_cache: bool = True) -> List[Dict[str, Any]]:
     """
     Extract UI elements from image using AI
     
+    The model is asked for JSON-schema structured output, which is parsed
+    and validated into UIElement records; malformed items are dropped.
+    
     Args:
         image_data: Processed image data
+        use_cache: Look the response up in the LLM cache first (it is stored either way)
     
     Returns:
         List of detected UI elements
+    
+    Raises:
+        UpstreamBusyError: If the call was shed locally or rate limited upstream
     """
     
-    image_base64 = image_data.get("base64")
+    model = ELEMENTS_MODEL
+    cache_key = await response_cache_key("elements", image_data, model, ELEMENTS_PROMPT_VERSION, ELEMENTS_PROMPT)
     
-    prompt = """Analyze this UI image and identify all UI elements.
+    if use_cache and llm_cache.enabled:
+        cached = await llm_cache.get(cache_key)
+        if cached is not None:
+            return [element.to_dict() for element in parse_elements(cached["content"])[0]]
     
-For each element, provide:
-- type (button, input, text, image, container, nav, etc.)
-- position (approximate x, y coordinates as percentage)
-- size (width and height as percentage)
-- content (text content if any)
-- styling (colors, fonts, borders)
+    async def request_elements() -> Dict[str, Any]:
+        completion = await llm_router.complete(
+            "elements", model, ELEMENTS_PROMPT, image_data, 2048, schema=ELEMENTS_SCHEMA
+        )
+        result = {"content": completion.text, "model": completion.model, "provider": completion.provider}
+        parser = ElementArrayParser()
+        elements = parser.feed(completion.text)
+        # A truncated or unparseable response is not worth replaying
+        if parser.done and llm_cache.enabled:
+            await llm_cache.put(cache_key, result)
+        return {**result, "elements": elements}
+    
+    try:
+        elements = (await llm_flight.do(cache_key, request_elements))["elements"]
+        return [element.to_dict() for element in elements]
+    
+    except UpstreamBusyError:
+        raise
+    except Exception as e:
+        mock_fallbacks.inc("elements")
+        return generate_mock_elements()
 
-Return a JSON array of elements."""
+async def stream_ui_elements(image_data: ProcessedImage, use_cache: bool = True) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Stream UI elements as each one is completed by the model
+    
+    The structured output is parsed incrementally, so every element is
+    forwarded as soon as its closing brace arrives rather than when the
+    whole completion ends.
+    
+    Args:
+        image_data: Processed image data
+        use_cache: Serve a cached response at once when there is one
+    
+    Yields:
+        {"type": "element", "index": ..., "element": {...}} events, then one
+        {"type": "done", ...} event with counts, model, usage and timings, or
+        an {"type": "error", ...} event (with status 503 and retry_after when
+        the call was shed)
+    """
+    
+    model = ELEMENTS_MODEL
+    started = time.perf_counter()
+    first_element_ms = None
+    usage = None
+    parser = ElementArrayParser()
+    raw_chunks: List[str] = []
+    count = 0
+    
+    # Shares entries with extract_ui_elements, which stores the raw response
+    cache_key = None
+    if llm_cache.enabled:
+        cache_key = await response_cache_key("elements", image_data, model, ELEMENTS_PROMPT_VERSION, ELEMENTS_PROMPT)
+        cached = await llm_cache.get(cache_key) if use_cache else None
+        if cached is not None:
+            elements, rejected = parse_elements(cached["content"])
+            for index, element in enumerate(elements):
+                yield {"type": "element", "index": index, "element": element.to_dict()}
+            elapsed_ms = round((time.perf_counter() - started) * 1000, 3)
+            yield {
+                "type": "done",
+                "count": len(elements),
+                "rejected": rejected,
+                "complete": True,
+                "model": cached["model"],
+                "provider": cached.get("provider"),
+                "usage": None,
+                "cached": True,
+                "timings": {"first_element_ms": elapsed_ms, "total_ms": elapsed_ms}
+            }
+            return
     
     try:
-        response = await client.chat.completions.create(
-            model="gpt-4-vision-preview",
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": prompt},
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{image_base64}"
-                            }
-                        }
-                    ]
-                }
-            ],
-            max_tokens=2048,
-        )
+        used_model, used_provider = model, None
+        async for used_provider, used_model, delta in llm_router.stream(
+            "elements", model, ELEMENTS_PROMPT, image_data, 2048, schema=ELEMENTS_SCHEMA
+        ):
+            if delta.usage is not None:
+                usage = delta.usage
+            if not delta.text:
+                continue
+            raw_chunks.append(delta.text)
+            for element in parser.feed(delta.text):
+                if first_element_ms is None:
+                    first_element_ms = (time.perf_counter() - started) * 1000
+                yield {"type": "element", "index": count, "element": element.to_dict()}
+                count += 1
         
-        # Parse response to extract elements
-        content = response.choices[0].message.content
-        
-        # Mock elements for testing
-        return generate_mock_elements()
+        error = None
+        if cache_key is not None and parser.done:
+            await llm_cache.put(cache_key, {
+                "content": "".join(raw_chunks),
+                "model": used_model,
+                "provider": used_provider
+            })
     
+    except UpstreamBusyError as e:
+        yield {"type": "error", "error": str(e), "status": 503, "retry_after": e.retry_after_header}
+        return
     except Exception as e:
-        return generate_mock_elements()
+        if count:
+            # Elements already went out; mock ones after them would be wrong
+            yield {"type": "error", "error": str(e)}
+            return
+        # Fallback to mock elements for testing
+        mock_fallbacks.inc("elements")
+        mock_elements = generate_mock_elements()
+        for index, element in enumerate(mock_elements):
+            yield {"type": "element", "index": index, "element": element}
+        count = len(mock_elements)
+        used_model, used_provider, error = "mock", None, str(e)
+        parser.done = True
+    
+    done = {
+        "type": "done",
+        "count": count,
+        "rejected": parser.rejected,
+        "complete": parser.done,
+        "model": used_model,
+        "provider": used_provider,
+        "usage": usage,
+        "cached": False,
+        "timings": {
+            "first_element_ms": round(first_element_ms, 3) if first_element_ms is not None else None,
+            "total_ms": round((time.perf_counter() - started) * 1000, 3)
+        }
+    }
+    if error:
+        done["error"] = error
+    yield done
 
 def generate_mock_code(framework: str) -> str:
     """Generate mock code for testing"""
@@ -0,0 +1,271 @@
+"""
+Page Tiler
+Splits tall page screenshots into sections and generates code per section
+"""
+
+import asyncio
+import io
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from PIL import Image
+from fastapi import UploadFile
+from utils.executor import image_executor
+from utils.image_cache import content_digest
+from utils.image_processor import (
+    JPEG_QUALITY, MAX_DIMENSION, MAX_PIXELS, MIME_TYPES, OUTPUT_FORMAT, RESIZE_MODE, RESIZE_MODES,
+    downscale, encode_image, read_upload, record_timing
+)
+from utils.resize_planner import DETAIL_PRESET, plan_resize
+from utils.processed_image import ProcessedImage
+from utils.phash_index import dhash
+from utils.openai_handler import generate_code_from_image
+from utils.rate_limiter import UpstreamBusyError
+from utils.code_fences import strip_code_fences
+from utils.section_fragments import stitch_html, stitch_jsx, stitch_vue
+
+TILE_MIN_ASPECT = float(os.getenv("PAGE_TILE_MIN_ASPECT", 2.0))  # height / width before a page is split
+TILE_SECTION_ASPECT = float(os.getenv("PAGE_TILE_SECTION_ASPECT", 1.0))  # target section height / width
+TILE_MAX_SECTIONS = int(os.getenv("PAGE_TILE_MAX_SECTIONS", 12))
+TILE_CONCURRENCY = int(os.getenv("PAGE_TILE_CONCURRENCY", 4))  # section LLM calls in flight per request
+ANALYSIS_REDUCE = 4  # row variance is measured on a 1/4 scale grayscale copy
+BAND_ROWS = 9  # smoothing window, in reduced rows, so cuts land in blank bands rather than between two lines
+
+SECTION_HINTS = {
+    "react": "Return only the JSX for this section as a fragment body: no imports, no component declaration, no export.",
+    "nextjs": "Return only the JSX for this section as a fragment body: no imports, no component declaration, no export.",
+    "vue": "Return only the template markup for this section: no <template>, <script> or <style> wrappers.",
+    "html": "Return only the HTML for this section, with any CSS in a <style> element: no <html>, <head> or <body> wrappers.",
+    "tailwind": "Return only the HTML for this section: no <html>, <head> or <body> wrappers."
+}
+
+
+async def tile_upload(
+    file: UploadFile,
+    resize_mode: Optional[str] = None,
+    detail_preset: Optional[str] = None
+) -> List[ProcessedImage]:
+    """
+    Read a page screenshot and split it into model-ready sections
+
+    Pages shorter than PAGE_TILE_MIN_ASPECT come back as a single section.
+
+    Args:
+        file: Uploaded image file
+        resize_mode: Downscale mode (quality, balanced, fast); defaults to IMAGE_RESIZE_MODE
+        detail_preset: Size preset applied to each section; defaults to IMAGE_DETAIL_PRESET
+
+    Returns:
+        Processed sections from top to bottom
+    """
+    resize_mode = resize_mode or RESIZE_MODE
+    if resize_mode not in RESIZE_MODES:
+        raise ValueError(f"Unknown resize mode '{resize_mode}'. Use one of: {', '.join(RESIZE_MODES)}")
+
+    started = time.perf_counter()
+    content, header = await read_upload(file)
+    digest = await asyncio.to_thread(content_digest, content)
+    sections = await image_executor.run(
+        tile_page, content, header.format, detail_preset or DETAIL_PRESET,
+        JPEG_QUALITY, resize_mode, OUTPUT_FORMAT
+    )
+    record_timing("tile", time.perf_counter() - started)
+
+    for section in sections:
+        section.digest = digest
+    return [section.with_upload(file.filename, len(content)) for section in sections]
+
+
+def tile_page(
+    content: bytes,
+    image_format: str,
+    detail_preset: str,
+    quality: int,
+    resize_mode: str = "quality",
+    output_format: str = "jpeg"
+) -> List[ProcessedImage]:
+    """
+    Decode a page once, cut it at blank bands and encode each section
+
+    Runs inside the image executor, so it must stay a module-level
+    function with picklable arguments and return value.
+
+    Args:
+        content: Raw upload bytes
+        image_format: Format identified from the header
+        detail_preset: Size preset applied to each section
+        quality: JPEG quality
+        resize_mode: Key into RESIZE_MODES
+        output_format: One of OUTPUT_FORMATS
+
+    Returns:
+        One processed image per section; original_width/height hold the crop size
+    """
+    image = Image.open(io.BytesIO(content), formats=[image_format])
+    width, height = image.size
+    if width * height > MAX_PIXELS:
+        raise ValueError(f"Image dimensions {width}x{height} exceed the maximum of {MAX_PIXELS} pixels")
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+
+    cuts = find_cuts(image) if height / width >= TILE_MIN_ASPECT else []
+    bounds = list(zip([0, *cuts], [*cuts, height]))
+
+    sections = []
+    for top, bottom in bounds:
+        crop = image.crop((0, top, width, bottom))
+        plan = plan_resize(width, bottom - top, detail_preset, MAX_DIMENSION)
+        if crop.size != (plan.width, plan.height):
+            crop = downscale(crop, (plan.width, plan.height), resize_mode)
+        encoded, encoded_format = encode_image(crop, output_format, quality)
+        sections.append(ProcessedImage(
+            data=encoded,
+            mime_type=MIME_TYPES[encoded_format],
+            format=encoded_format,
+            width=plan.width,
+            height=plan.height,
+            original_width=width,
+            original_height=bottom - top,
+            image_tokens={"preset": plan.preset, "tiles": plan.tiles, "estimated_tokens": plan.tokens},
+            perceptual_hash=dhash(crop)
+        ))
+    return sections
+
+
+def find_cuts(image: Image.Image) -> List[int]:
+    """
+    Choose horizontal cut rows in low-content bands
+
+    Each cut is searched for within 0.6-1.4x the target section height
+    below the previous one, at the band with the lowest smoothed row
+    variance. Among equally quiet rows, the one closest to the target
+    height wins.
+
+    Args:
+        image: Loaded page image
+
+    Returns:
+        Cut rows in image coordinates, top to bottom
+    """
+    width, height = image.size
+    sections = min(TILE_MAX_SECTIONS, max(1, round(height / (width * TILE_SECTION_ASPECT))))
+    if sections <= 1:
+        return []
+    target = height / sections / ANALYSIS_REDUCE
+
+    gray = np.asarray(image.convert("L").reduce(ANALYSIS_REDUCE), dtype=np.float32)
+    variance = gray.var(axis=1)
+    score = np.convolve(variance, np.ones(BAND_ROWS, dtype=np.float32) / BAND_ROWS, mode="same")
+    rows = len(score)
+
+    cuts = []
+    position = 0.0
+    while rows - position > target * 1.4 and len(cuts) < TILE_MAX_SECTIONS - 1:
+        low = int(position + target * 0.6)
+        high = min(rows - int(target * 0.4), int(position + target * 1.4))
+        if high <= low:
+            break
+        window = score[low:high]
+        quiet = np.flatnonzero(window <= window.min() * 1.05 + 1e-3)
+        ideal = position + target - low
+        cut = low + int(quiet[np.abs(quiet - ideal).argmin()])
+        cuts.append(cut * ANALYSIS_REDUCE)
+        position = cut
+    return cuts
+
+
+async def generate_tiled_code(
+    sections: List[ProcessedImage],
+    framework: str = "react",
+    include_styling: bool = True,
+    model: str = "gpt-4-vision-preview",
+    hints: Optional[str] = None,
+    concurrency: int = TILE_CONCURRENCY,
+    use_cache: bool = True
+) -> Dict[str, Any]:
+    """
+    Generate code for every section concurrently and stitch the results
+
+    At most `concurrency` section requests are in flight, so latency
+    tracks the slowest section rather than the page length.
+
+    Args:
+        sections: Processed sections from top to bottom
+        framework: Target framework
+        include_styling: Whether to include CSS/Tailwind
+        model: OpenAI model to use
+        hints: Extra prompt hints shared by every section
+        concurrency: Maximum concurrent section requests
+        use_cache: Look section responses up in the LLM cache first
+
+    Returns:
+        Stitched code and metadata in the shape of generate_code_from_image
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    total = len(sections)
+
+    async def generate(index: int, section: ProcessedImage) -> Dict[str, Any]:
+        section_hint = (
+            f"This image is section {index + 1} of {total} of one tall page, cut at blank space. "
+            + SECTION_HINTS.get(framework, SECTION_HINTS["react"])
+        )
+        async with semaphore:
+            return await generate_code_from_image(
+                image_data=section,
+                framework=framework,
+                include_styling=include_styling,
+                model=model,
+                hints=f"{hints}\n{section_hint}" if hints else section_hint,
+                use_cache=use_cache
+            )
+
+    tasks = [asyncio.ensure_future(generate(index, section)) for index, section in enumerate(sections)]
+    try:
+        results = await asyncio.gather(*tasks)
+    except UpstreamBusyError:
+        # One shed section sheds the page; stop the rest from holding upstream slots
+        for task in tasks:
+            task.cancel()
+        raise
+
+    fragments = [
+        strip_code_fences(result["code"]) if result["model"] != "mock" else None
+        for result in results
+    ]
+    failed = sum(fragment is None for fragment in fragments)
+    result = {
+        "code": stitch_sections(framework, fragments) if failed < total else results[0]["code"],
+        "model": model if failed < total else "mock",
+        "framework": framework,
+        "sections": total,
+        "failed_sections": failed,
+        "cached_sections": sum(bool(item.get("cached")) for item in results)
+    }
+    errors = [item["error"] for item in results if "error" in item]
+    if errors:
+        result["error"] = errors[0]
+    return result
+
+
+def stitch_sections(framework: str, fragments: List[Optional[str]]) -> str:
+    """
+    Join section fragments into one component for the target framework
+
+    Sections that failed to generate (None) become comments so the page
+    keeps its order and the gap is visible. Fragments that came back as
+    whole modules or documents are reduced first (see section_fragments).
+
+    Args:
+        framework: Target framework
+        fragments: Section code from top to bottom, None for failures
+
+    Returns:
+        Complete component or document source
+    """
+    if framework in ("react", "nextjs"):
+        return stitch_jsx(framework, fragments)
+    if framework == "vue":
+        return stitch_vue(fragments)
+    return stitch_html(framework, fragments)
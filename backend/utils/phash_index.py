@@ -0,0 +1,185 @@
+"""
+Perceptual Hash Index
+Finds previously processed images that look nearly identical to a new one
+"""
+
+import io
+import itertools
+import os
+import threading
+from array import array
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+PHASH_REUSE = os.getenv("PHASH_REUSE", "off")  # off, return or seed
+PHASH_MAX_DISTANCE = int(os.getenv("PHASH_MAX_DISTANCE", 4))  # differing bits out of 64
+PHASH_INDEX_SIZE = int(os.getenv("PHASH_INDEX_SIZE", 100000))  # entries kept before the oldest are replaced
+REUSE_MODES = ("off", "return", "seed")
+
+HASH_BITS = 64
+CHUNK_BITS = 16
+CHUNKS = HASH_BITS // CHUNK_BITS
+CHUNK_MASK = (1 << CHUNK_BITS) - 1
+MAX_CHUNK_RADIUS = 2  # keeps the probe count per chunk at 137 or fewer
+
+
+def dhash(image: Image.Image) -> int:
+    """
+    64-bit difference hash
+
+    The image is reduced to 9x8 grayscale and each bit records whether a
+    pixel is brighter than its right-hand neighbour. Cursors, timestamps
+    and other small edits rarely flip more than a few bits.
+
+    Args:
+        image: Image to hash
+
+    Returns:
+        Hash as an unsigned 64-bit integer
+    """
+    small = np.asarray(image.convert("L").resize((9, 8), Image.Resampling.BOX), dtype=np.int16)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+def dhash_from_bytes(data: bytes) -> int:
+    """
+    Decode an encoded image and hash it
+
+    Module-level so it can run in the image executor. JPEGs are drafted at
+    1/8 scale since only a 9x8 thumbnail is needed.
+    """
+    image = Image.open(io.BytesIO(data))
+    image.draft("RGB", (64, 64))
+    return dhash(image)
+
+
+def flip_masks(radius: int) -> List[int]:
+    """XOR masks for every way of flipping at most `radius` bits of a chunk"""
+    return [
+        sum(1 << position for position in positions)
+        for distance in range(radius + 1)
+        for positions in itertools.combinations(range(CHUNK_BITS), distance)
+    ]
+
+
+FLIP_MASKS = [flip_masks(radius) for radius in range(MAX_CHUNK_RADIUS + 1)]
+
+
+class HammingIndex:
+    """
+    Multi-index hashing over 64-bit hashes
+
+    Each hash is split into four 16-bit chunks with one table per chunk.
+    If two hashes are within distance r, at least one chunk pair is within
+    r // 4 (pigeonhole), so a search only probes chunk values within that
+    radius and verifies the candidates with a vectorised popcount.
+
+    Capacity is fixed; once full, the oldest entry is replaced. Safe to use
+    from several threads.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._hashes = np.zeros(capacity, dtype=np.uint64)
+        self._values: List[Any] = [None] * capacity
+        self._tables: List[Dict[int, array]] = [{} for _ in range(CHUNKS)]
+        self._lock = threading.Lock()
+        self._next = 0
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @staticmethod
+    def _chunks(value: int) -> List[int]:
+        return [(value >> (CHUNK_BITS * index)) & CHUNK_MASK for index in range(CHUNKS)]
+
+    def add(self, value: int, item: Any) -> None:
+        """Index `item` under the hash `value`"""
+        with self._lock:
+            slot = self._next
+            if self._size == self.capacity:
+                # Ring buffer is full: unlink the entry being replaced
+                for table, chunk in zip(self._tables, self._chunks(int(self._hashes[slot]))):
+                    bucket = table[chunk]
+                    bucket.remove(slot)
+                    if not bucket:
+                        del table[chunk]
+            else:
+                self._size += 1
+
+            self._hashes[slot] = value
+            self._values[slot] = item
+            for table, chunk in zip(self._tables, self._chunks(value)):
+                bucket = table.get(chunk)
+                if bucket is None:
+                    table[chunk] = bucket = array("I")
+                bucket.append(slot)
+            self._next = (slot + 1) % self.capacity
+
+    def search(
+        self,
+        value: int,
+        max_distance: int,
+        accept: Optional[Callable[[Any], bool]] = None
+    ) -> Optional[Tuple[int, Any]]:
+        """
+        Find the closest indexed item within `max_distance` bits
+
+        Args:
+            value: Hash to look up
+            max_distance: Largest Hamming distance to accept
+            accept: Optional filter applied to candidate items
+
+        Returns:
+            (distance, item) for the nearest accepted match, or None
+        """
+        radius = max_distance // CHUNKS
+        if radius > MAX_CHUNK_RADIUS:
+            raise ValueError(f"max_distance must be below {(MAX_CHUNK_RADIUS + 1) * CHUNKS}")
+        masks = FLIP_MASKS[radius]
+
+        with self._lock:
+            buckets = [
+                bucket
+                for table, chunk in zip(self._tables, self._chunks(value))
+                for mask in masks
+                if (bucket := table.get(chunk ^ mask)) is not None
+            ]
+            if not buckets:
+                self.misses += 1
+                return None
+
+            slots = np.unique(np.concatenate([np.frombuffer(bucket, dtype=np.uint32) for bucket in buckets]))
+            distances = np.bitwise_count(self._hashes[slots] ^ np.uint64(value))
+            close = distances <= max_distance
+            slots, distances = slots[close], distances[close]
+
+            for index in np.argsort(distances, kind="stable"):
+                item = self._values[slots[index]]
+                if accept is None or accept(item):
+                    self.hits += 1
+                    return int(distances[index]), item
+
+            self.misses += 1
+            return None
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": self._size,
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+
+if PHASH_REUSE not in REUSE_MODES:
+    raise ValueError(f"Unknown PHASH_REUSE mode '{PHASH_REUSE}'. Use one of: {', '.join(REUSE_MODES)}")
+
+# Generated code keyed by the perceptual hash of the image it came from
+code_index = HammingIndex(PHASH_INDEX_SIZE)
@@ -0,0 +1,163 @@
+"""
+Processed Image
+Holds an encoded image once and derives base64 and data URLs lazily
+"""
+
+import binascii
+import json
+from typing import Any, Dict, Optional
+
+# Multiple of 3 so chunks encode without padding
+BASE64_CHUNK_SIZE = 3 * 65536
+
+
+class ProcessedImage:
+    """
+    Encoded image ready to send to a vision model
+
+    The encoded bytes are stored once and never copied by this class. The
+    data URL is built on first use, in chunks from a memoryview of those
+    bytes, and cached. Copies made with `with_upload` share both the bytes
+    and that cached data URL.
+    """
+
+    __slots__ = (
+        "data",
+        "mime_type",
+        "format",
+        "width",
+        "height",
+        "reencoded",
+        "filename",
+        "size",
+        "digest",
+        "original_width",
+        "original_height",
+        "image_tokens",
+        "perceptual_hash",
+        "timings",
+        "_data_url",
+        "_origin"
+    )
+
+    def __init__(
+        self,
+        data: bytes,
+        mime_type: str,
+        format: str,
+        width: int,
+        height: int,
+        reencoded: bool = True,
+        filename: Optional[str] = None,
+        size: int = 0,
+        digest: Optional[str] = None,
+        original_width: Optional[int] = None,
+        original_height: Optional[int] = None,
+        image_tokens: Optional[Dict[str, Any]] = None,
+        perceptual_hash: Optional[int] = None,
+        timings: Optional[Dict[str, float]] = None
+    ):
+        self.data = data
+        self.mime_type = mime_type
+        self.format = format
+        self.width = width
+        self.height = height
+        self.reencoded = reencoded
+        self.filename = filename
+        self.size = size
+        self.digest = digest
+        self.original_width = original_width if original_width is not None else width
+        self.original_height = original_height if original_height is not None else height
+        self.image_tokens = image_tokens
+        self.perceptual_hash = perceptual_hash
+        self.timings = timings
+        self._data_url: Optional[str] = None
+        self._origin: Optional["ProcessedImage"] = None
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Only the payload crosses process boundaries; derived strings are rebuilt on demand
+        return {name: getattr(self, name) for name in self.__slots__ if not name.startswith("_")}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        for name, value in state.items():
+            setattr(self, name, value)
+        self._data_url = None
+        self._origin = None
+
+    @property
+    def dimensions(self) -> Dict[str, int]:
+        return {"width": self.width, "height": self.height}
+
+    @property
+    def original_dimensions(self) -> Dict[str, int]:
+        return {"width": self.original_width, "height": self.original_height}
+
+    @property
+    def data_url_prefix(self) -> str:
+        return f"data:{self.mime_type};base64,"
+
+    @property
+    def data_url(self) -> str:
+        """data: URL for the encoded image, built once"""
+        if self._origin is not None:
+            return self._origin.data_url
+        if self._data_url is None:
+            # Encode chunk by chunk into one preallocated buffer so the only
+            # full-size temporaries are that buffer and the final str
+            prefix = self.data_url_prefix.encode("ascii")
+            view = memoryview(self.data)
+            buffer = bytearray(len(prefix) + (len(view) + 2) // 3 * 4)
+            buffer[:len(prefix)] = prefix
+            position = len(prefix)
+            for start in range(0, len(view), BASE64_CHUNK_SIZE):
+                encoded = binascii.b2a_base64(view[start:start + BASE64_CHUNK_SIZE], newline=False)
+                buffer[position:position + len(encoded)] = encoded
+                position += len(encoded)
+            self._data_url = buffer.decode("ascii")
+        return self._data_url
+
+    @property
+    def base64(self) -> str:
+        """Base64 payload without the data: URL prefix"""
+        return self.data_url[len(self.data_url_prefix):]
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held once the data URL exists"""
+        return len(self.data) + (len(self.data) + 2) // 3 * 4 + 256
+
+    def with_upload(self, filename: Optional[str], size: int) -> "ProcessedImage":
+        """
+        Copy for a new upload that shares this image's buffers
+
+        Args:
+            filename: Name of the new upload
+            size: Size of the new upload in bytes
+
+        Returns:
+            ProcessedImage sharing data and the cached data URL
+        """
+        copy = ProcessedImage.__new__(ProcessedImage)
+        for name in self.__slots__:
+            setattr(copy, name, getattr(self, name))
+        copy.filename = filename
+        copy.size = size
+        copy._data_url = None
+        copy._origin = self._origin or self
+        return copy
+
+    def to_bytes(self) -> bytes:
+        """Serialise to a JSON header line followed by the encoded bytes"""
+        header = {
+            name: getattr(self, name)
+            for name in self.__slots__
+            if not name.startswith("_") and name not in ("data", "timings")
+        }
+        return json.dumps(header).encode() + b"\n" + self.data
+
+    @classmethod
+    def from_bytes(cls, blob: bytes) -> "ProcessedImage":
+        """Inverse of to_bytes"""
+        split = blob.index(b"\n")
+        header = json.loads(blob[:split])
+        return cls(data=blob[split + 1:], **header)
@@ -0,0 +1,252 @@
+"""
+Rate Limiter
+Keeps upstream model calls within request and token budgets per model
+"""
+
+import asyncio
+import json
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 8))  # upstream calls in flight
+LLM_QUEUE_SIZE = int(os.getenv("LLM_QUEUE_SIZE", 32))  # calls waiting for a slot or budget
+LLM_MAX_WAIT = float(os.getenv("LLM_MAX_WAIT", 30))  # seconds of budget wait before a call is shed
+LLM_RPM = float(os.getenv("LLM_RPM", 500))  # requests per minute per model, 0 for no limit
+LLM_TPM = float(os.getenv("LLM_TPM", 0))  # tokens per minute per model, 0 for no limit
+# Per-model overrides, e.g. {"gpt-4o": {"rpm": 500, "tpm": 30000}}
+LLM_MODEL_LIMITS: Dict[str, Dict[str, float]] = json.loads(os.getenv("LLM_MODEL_LIMITS", "{}"))
+
+
+class UpstreamBusyError(RuntimeError):
+    """Raised when an upstream model call is shed instead of queued"""
+
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self) -> str:
+        """Whole seconds for the Retry-After header"""
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at `per_minute / 60` per second
+
+    Reservations may drive the level negative; the debt is the time the
+    caller has to wait, which keeps callers in arrival order without a
+    separate queue. A cancelled caller refunds its reservation.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` could be taken, without taking it"""
+        self._refill()
+        return max(0.0, (min(amount, self.capacity) - self.level) / self.rate)
+
+    def reserve(self, amount: float) -> float:
+        """Take `amount` (capped at the capacity) and return the seconds to wait before using it"""
+        self._refill()
+        self.level -= min(amount, self.capacity)
+        return max(0.0, -self.level / self.rate)
+
+    def refund(self, amount: float) -> None:
+        self.level = min(self.capacity, self.level + amount)
+
+    def available(self) -> float:
+        """Current level; negative while callers are waiting off a debt"""
+        self._refill()
+        return self.level
+
+
+class ModelBudget:
+    """Requests-per-minute and tokens-per-minute buckets for one model"""
+
+    def __init__(self, rpm: float, tpm: float):
+        self.requests = TokenBucket(rpm) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm) if tpm > 0 else None
+        self.blocked_until = 0.0  # set after an upstream 429
+
+    def wait_time(self, tokens: int) -> float:
+        return max(
+            self.blocked_until - time.monotonic(),
+            self.requests.wait_time(1) if self.requests else 0.0,
+            self.tokens.wait_time(tokens) if self.tokens else 0.0
+        )
+
+    def reserve(self, tokens: int) -> float:
+        return max(
+            self.blocked_until - time.monotonic(),
+            self.requests.reserve(1) if self.requests else 0.0,
+            self.tokens.reserve(tokens) if self.tokens else 0.0
+        )
+
+    def refund(self, tokens: int) -> None:
+        if self.requests:
+            self.requests.refund(1)
+        if self.tokens:
+            self.tokens.refund(tokens)
+
+
+class UpstreamPermit:
+    """Handle for a granted call, used to settle the token estimate afterwards"""
+
+    __slots__ = ("budget", "estimated_tokens")
+
+    def __init__(self, budget: ModelBudget, estimated_tokens: int):
+        self.budget = budget
+        self.estimated_tokens = estimated_tokens
+
+    def settle(self, actual_tokens: Optional[int]) -> None:
+        """Correct the token bucket once the response reports real usage"""
+        if actual_tokens is not None and self.budget.tokens:
+            self.budget.tokens.refund(self.estimated_tokens - actual_tokens)
+
+
+class UpstreamGovernor:
+    """
+    Admission control for upstream model calls
+
+    A call first reserves its request and token budget for the model,
+    sleeping off any debt, then takes one of `max_concurrency` slots.
+    At most `max_queue` calls may be waiting at once, and a call whose
+    budget wait would exceed `max_wait` is not queued at all; both are
+    rejected with UpstreamBusyError instead of piling up coroutines.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 8,
+        max_queue: int = 32,
+        max_wait: float = 30.0,
+        rpm: float = 0,
+        tpm: float = 0,
+        model_limits: Optional[Dict[str, Dict[str, float]]] = None
+    ):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max(0, max_queue)
+        self.max_wait = max_wait
+        self.rpm = rpm
+        self.tpm = tpm
+        self.model_limits = model_limits or {}
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        self._budgets: Dict[str, ModelBudget] = {}
+        self._waiting = 0
+        self._running = 0
+        self._rejected = 0
+        self._throttled = 0
+
+    def _budget(self, model: str) -> ModelBudget:
+        budget = self._budgets.get(model)
+        if budget is None:
+            limits = self.model_limits.get(model, {})
+            budget = ModelBudget(limits.get("rpm", self.rpm), limits.get("tpm", self.tpm))
+            self._budgets[model] = budget
+        return budget
+
+    @property
+    def queue_depth(self) -> int:
+        """Calls waiting for budget or a slot"""
+        return self._waiting
+
+    def check_capacity(self, model: str, tokens: int = 0) -> None:
+        """
+        Raise UpstreamBusyError if a call for `model` would be shed right now
+
+        Lets a route refuse before it commits to a streaming response.
+        """
+        wait = self._budget(model).wait_time(tokens)
+        # A full queue only matters if this call would have to join it
+        if self._waiting >= self.max_queue and (self._waiting or self._running >= self.max_concurrency):
+            self._rejected += 1
+            raise UpstreamBusyError("Model request queue is full, try again shortly", max(1.0, wait))
+        if wait > self.max_wait:
+            self._rejected += 1
+            raise UpstreamBusyError(f"Rate limit for {model} reached, try again shortly", wait)
+
+    def try_reserve(self, model: str, tokens: int = 0) -> bool:
+        """Take budget for an extra call (a hedge) only if it is available right now"""
+        budget = self._budget(model)
+        if budget.wait_time(tokens) > 0:
+            return False
+        budget.reserve(tokens)
+        return True
+
+    @asynccontextmanager
+    async def permit(self, model: str, tokens: int = 0) -> AsyncIterator[UpstreamPermit]:
+        """
+        Wait for budget and a concurrency slot, then hold the slot for the call
+
+        Args:
+            model: Model the call is for
+            tokens: Estimated tokens the call will consume
+
+        Yields:
+            Permit whose settle() corrects the token estimate
+
+        Raises:
+            UpstreamBusyError: If the call is shed
+        """
+        self.check_capacity(model, tokens)
+        budget = self._budget(model)
+
+        self._waiting += 1
+        try:
+            delay = budget.reserve(tokens)
+            try:
+                if delay > 0:
+                    self._throttled += 1
+                    await asyncio.sleep(delay)
+                await self._slots.acquire()
+            except asyncio.CancelledError:
+                # Cancelled before the call was made, so it never used its reservation
+                budget.refund(tokens)
+                raise
+        finally:
+            self._waiting -= 1
+
+        self._running += 1
+        try:
+            yield UpstreamPermit(budget, tokens)
+        finally:
+            self._running -= 1
+            self._slots.release()
+
+    def penalize(self, model: str, seconds: float) -> None:
+        """Hold back calls for `model` after the upstream answered 429"""
+        budget = self._budget(model)
+        budget.blocked_until = max(budget.blocked_until, time.monotonic() + seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "running": self._running,
+            "queue_depth": self._waiting,
+            "rejected": self._rejected,
+            "throttled": self._throttled,
+            "models": {
+                model: {
+                    "requests_available": round(budget.requests.available(), 1) if budget.requests else None,
+                    "tokens_available": round(budget.tokens.available()) if budget.tokens else None
+                }
+                for model, budget in self._budgets.items()
+            }
+        }
+
+
+llm_governor = UpstreamGovernor(LLM_MAX_CONCURRENCY, LLM_QUEUE_SIZE, LLM_MAX_WAIT, LLM_RPM, LLM_TPM, LLM_MODEL_LIMITS)
@@ -0,0 +1,263 @@
+"""
+Resilience
+Deadlines, retries with jittered backoff and hedged requests for upstream calls
+"""
+
+import asyncio
+import os
+import random
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+import anthropic
+import openai
+
+LLM_ATTEMPT_TIMEOUT = float(os.getenv("LLM_ATTEMPT_TIMEOUT", 90))  # seconds per attempt (to first chunk when streaming)
+LLM_MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", 3))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", 0.5))  # seconds, doubled per retry
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", 8))
+LLM_HEDGE = os.getenv("LLM_HEDGE", "false").lower() in ("1", "true", "yes")
+LLM_HEDGE_QUANTILE = float(os.getenv("LLM_HEDGE_QUANTILE", 0.95))  # launch the hedge at this latency quantile
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", 20))  # latencies needed before hedging starts
+LATENCY_WINDOW = 512  # recent latencies kept per model and call kind
+
+# Transient failures worth another attempt. Rate limits are left to the governor.
+RETRYABLE_ERRORS = (
+    asyncio.TimeoutError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+    anthropic.APITimeoutError,
+    anthropic.APIConnectionError,
+    anthropic.InternalServerError,
+    anthropic.OverloadedError
+)
+
+
+class LatencyTracker:
+    """Sliding window of recent latencies per key, for choosing hedge delays"""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.window = window
+        self._samples: Dict[str, Deque[float]] = {}
+
+    def record(self, key: str, seconds: float) -> None:
+        samples = self._samples.get(key)
+        if samples is None:
+            samples = self._samples[key] = deque(maxlen=self.window)
+        samples.append(seconds)
+
+    def quantile(self, key: str, q: float, min_samples: int = 1) -> Optional[float]:
+        """Latency at quantile `q`, or None with fewer than `min_samples` samples"""
+        samples = self._samples.get(key)
+        if not samples or len(samples) < min_samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            key: {
+                "samples": len(samples),
+                "p50_ms": round(self.quantile(key, 0.50) * 1000, 1),
+                "p95_ms": round(self.quantile(key, 0.95) * 1000, 1),
+                "p99_ms": round(self.quantile(key, 0.99) * 1000, 1)
+            }
+            for key, samples in self._samples.items()
+            if samples
+        }
+
+
+class ResilienceCounters:
+    def __init__(self):
+        self.attempts = 0
+        self.retries = 0
+        self.timeouts = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def stats(self) -> Dict[str, int]:
+        return dict(vars(self))
+
+
+latency_tracker = LatencyTracker()
+counters = ResilienceCounters()
+
+
+def backoff_delay(retry: int, base: float = LLM_BACKOFF_BASE, cap: float = LLM_BACKOFF_MAX) -> float:
+    """Full-jitter exponential backoff: uniform between 0 and min(cap, base * 2^retry)"""
+    return random.uniform(0, min(cap, base * 2 ** retry))
+
+
+def hedge_delay(key: str, enabled: bool = LLM_HEDGE) -> Optional[float]:
+    """When to launch a hedge for `key`, or None if hedging is off or there is too little history"""
+    if not enabled:
+        return None
+    return latency_tracker.quantile(key, LLM_HEDGE_QUANTILE, LLM_HEDGE_MIN_SAMPLES)
+
+
+async def close_quietly(task: "asyncio.Task[Any]") -> None:
+    """Cancel a losing attempt and release any stream it already opened"""
+    task.cancel()
+    try:
+        result = await task
+    except BaseException:
+        return
+    stream = result[0] if isinstance(result, tuple) else None
+    close = getattr(stream, "close", None) or getattr(stream, "aclose", None)
+    if close is not None:
+        try:
+            await close()
+        except Exception:
+            pass
+
+
+async def race(
+    attempt: Callable[[], Awaitable[Any]],
+    delay: Optional[float],
+    allow_hedge: Callable[[], bool] = lambda: True
+) -> Any:
+    """
+    Run `attempt`, and a second copy if the first is still pending after `delay`
+
+    The first copy to succeed wins and the other is cancelled. If one copy
+    fails while the other is still running, the survivor's outcome counts.
+
+    Args:
+        attempt: Zero-argument coroutine function for one attempt
+        delay: Seconds before hedging, or None to never hedge
+        allow_hedge: Checked when the delay expires, e.g. for spare upstream budget
+
+    Returns:
+        Result of the winning attempt
+    """
+    first = asyncio.ensure_future(attempt())
+    pending = {first}
+    try:
+        if delay is not None:
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if not done and allow_hedge():
+                counters.hedges += 1
+                pending.add(asyncio.ensure_future(attempt()))
+        while len(pending) > 1:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is not first:
+                        counters.hedge_wins += 1
+                    return task.result()
+            if not pending:
+                # Both failed: report the original attempt's error
+                return first.result()
+        survivor = pending.pop()
+        return await survivor
+    finally:
+        for task in pending:
+            await close_quietly(task)
+
+
+async def call_with_retries(
+    attempt: Callable[[], Awaitable[Any]],
+    latency_key: str,
+    timeout: float = LLM_ATTEMPT_TIMEOUT,
+    max_attempts: int = LLM_MAX_ATTEMPTS,
+    hedge: bool = LLM_HEDGE,
+    allow_hedge: Callable[[], bool] = lambda: True
+) -> Any:
+    """
+    Call `attempt` under a deadline, retrying transient failures
+
+    Each try gets `timeout` seconds. Errors in RETRYABLE_ERRORS (including
+    the deadline) are retried up to `max_attempts` in total, sleeping a
+    full-jitter exponential backoff in between; anything else is raised
+    at once. With hedging on, a try that outlives the recent p95 for
+    `latency_key` is raced against a duplicate.
+
+    Args:
+        attempt: Zero-argument coroutine function for one upstream call
+        latency_key: Latency history the hedge delay comes from
+        timeout: Deadline per try, in seconds
+        max_attempts: Total tries, at least 1
+        hedge: Whether to hedge slow tries
+        allow_hedge: Checked before each hedge is launched
+
+    Returns:
+        Result of the first successful try
+    """
+    async def timed_attempt() -> Any:
+        counters.attempts += 1
+        started = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(attempt(), timeout)
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            # Hedge losers and timed-out tries were at least this slow; dropping
+            # them would pull the p95 down exactly when upstream slows
+            latency_tracker.record(latency_key, time.perf_counter() - started)
+            raise
+        latency_tracker.record(latency_key, time.perf_counter() - started)
+        return result
+
+    for retry in range(max(1, max_attempts)):
+        try:
+            return await race(timed_attempt, hedge_delay(latency_key, hedge), allow_hedge)
+        except RETRYABLE_ERRORS as e:
+            timed_out = isinstance(e, asyncio.TimeoutError)
+            if timed_out:
+                counters.timeouts += 1
+            if retry + 1 >= max_attempts:
+                if timed_out:
+                    raise asyncio.TimeoutError(f"No upstream response within {timeout:g}s, {retry + 1} attempt(s)") from e
+                raise
+            counters.retries += 1
+            await asyncio.sleep(backoff_delay(retry))
+
+
+async def open_stream_with_retries(
+    open_stream: Callable[[], Awaitable[Any]],
+    latency_key: str,
+    timeout: float = LLM_ATTEMPT_TIMEOUT,
+    max_attempts: int = LLM_MAX_ATTEMPTS,
+    hedge: bool = LLM_HEDGE,
+    allow_hedge: Callable[[], bool] = lambda: True
+) -> Tuple[Any, AsyncIterator[Any], Any]:
+    """
+    Open a streaming call and wait for its first chunk, with retries and hedging
+
+    Only the time to the first chunk is guarded: once output has started
+    it is forwarded as is, since a retry would duplicate it. A hedge races
+    two streams to their first chunk and closes the slower one.
+
+    Args:
+        open_stream: Zero-argument coroutine function returning an async-iterable stream
+        latency_key: Latency history (time to first chunk) the hedge delay comes from
+        timeout: Deadline for the first chunk, in seconds
+        max_attempts: Total tries, at least 1
+        hedge: Whether to hedge slow starts
+        allow_hedge: Checked before each hedge is launched
+
+    Returns:
+        (stream, iterator, first chunk); the chunk is None for an empty stream
+    """
+    async def first_chunk() -> Tuple[Any, AsyncIterator[Any], Any]:
+        stream = await open_stream()
+        iterator = stream.__aiter__()
+        try:
+            return stream, iterator, await iterator.__anext__()
+        except StopAsyncIteration:
+            return stream, iterator, None
+        except BaseException:
+            close = getattr(stream, "close", None) or getattr(stream, "aclose", None)
+            if close is not None:
+                await close()
+            raise
+
+    return await call_with_retries(first_chunk, latency_key, timeout, max_attempts, hedge, allow_hedge)
+
+
+def get_resilience_stats() -> Dict[str, Any]:
+    return {
+        "hedging": LLM_HEDGE,
+        "counters": counters.stats(),
+        "latency": latency_tracker.stats()
+    }
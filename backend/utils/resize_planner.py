@@ -0,0 +1,115 @@
+"""
+Resize Planner
+Chooses output dimensions that minimise vision-model image tiles
+"""
+
+import math
+import os
+from typing import NamedTuple, Tuple
+
+# Vision models fit images into a 2048px square, scale the shortest side down
+# to 768px and then bill per 512px tile on top of a fixed base cost
+TILE_SIZE = 512
+MODEL_MAX_SIDE = 2048
+MODEL_SHORT_SIDE = 768
+BASE_TOKENS = 85
+TILE_TOKENS = 170
+
+DETAIL_PRESET = os.getenv("IMAGE_DETAIL_PRESET", "balanced")
+
+# min_scale is relative to what the model would see anyway; min_short_side
+# keeps body text legible after downscaling
+DETAIL_PRESETS = {
+    "economy": {"min_scale": 0.5, "min_short_side": 512},
+    "balanced": {"min_scale": 0.75, "min_short_side": 640},
+    "max": {"min_scale": 1.0, "min_short_side": MODEL_SHORT_SIDE}
+}
+
+
+class ResizePlan(NamedTuple):
+    width: int
+    height: int
+    tiles: int
+    tokens: int
+    preset: str
+
+
+def model_view_size(width: int, height: int) -> Tuple[int, int]:
+    """
+    Size the vision model scales an image to before tiling
+
+    Args:
+        width: Image width in pixels
+        height: Image height in pixels
+
+    Returns:
+        Width and height as seen by the model
+    """
+    scale = min(1.0, MODEL_MAX_SIDE / max(width, height))
+    scale *= min(1.0, MODEL_SHORT_SIDE / (min(width, height) * scale))
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+def estimate_tokens(width: int, height: int) -> Tuple[int, int]:
+    """
+    Estimate tile count and image token cost for an image
+
+    Args:
+        width: Image width in pixels
+        height: Image height in pixels
+
+    Returns:
+        Tile count and estimated image tokens
+    """
+    view_width, view_height = model_view_size(width, height)
+    tiles = math.ceil(view_width / TILE_SIZE) * math.ceil(view_height / TILE_SIZE)
+    return tiles, BASE_TOKENS + TILE_TOKENS * tiles
+
+
+def plan_resize(width: int, height: int, preset: str = DETAIL_PRESET, max_dimension: int = MODEL_MAX_SIDE) -> ResizePlan:
+    """
+    Pick output dimensions for an image
+
+    The "max" preset keeps the longest side at max_dimension. The other
+    presets never send more pixels than the model would keep, then shrink
+    further onto tile boundaries while staying above the preset's
+    legibility floor.
+
+    Args:
+        width: Source width in pixels
+        height: Source height in pixels
+        preset: Key into DETAIL_PRESETS
+        max_dimension: Upper bound on the longest side
+
+    Returns:
+        Planned output size with its tile count and token estimate
+    """
+    if preset not in DETAIL_PRESETS:
+        raise ValueError(f"Unknown detail preset '{preset}'. Use one of: {', '.join(DETAIL_PRESETS)}")
+
+    cap = min(1.0, max_dimension / max(width, height))
+    capped_width, capped_height = max(1, int(width * cap)), max(1, int(height * cap))
+
+    if preset == "max":
+        tiles, tokens = estimate_tokens(capped_width, capped_height)
+        return ResizePlan(capped_width, capped_height, tiles, tokens, preset)
+
+    view_width, view_height = model_view_size(capped_width, capped_height)
+    floor = DETAIL_PRESETS[preset]
+    min_scale = max(floor["min_scale"], min(1.0, floor["min_short_side"] / min(view_width, view_height)))
+
+    # Each candidate grid gives the largest scale that fits the image inside it
+    best = None
+    for columns in range(1, math.ceil(view_width / TILE_SIZE) + 1):
+        for rows in range(1, math.ceil(view_height / TILE_SIZE) + 1):
+            scale = min(1.0, columns * TILE_SIZE / view_width, rows * TILE_SIZE / view_height)
+            if scale < min_scale:
+                continue
+            candidate = (columns * rows, -scale)
+            if best is None or candidate < best:
+                best = candidate
+
+    scale = -best[1] if best is not None else 1.0
+    out_width, out_height = max(1, int(view_width * scale)), max(1, int(view_height * scale))
+    tiles, tokens = estimate_tokens(out_width, out_height)
+    return ResizePlan(out_width, out_height, tiles, tokens, preset)
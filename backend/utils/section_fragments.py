@@ -0,0 +1,326 @@
+"""
+Section Fragments
+Reduces code generated for one section of a page to what can be stitched into the page
+
+Section prompts ask for bare markup, but models (and the fake and stub
+providers) often return a whole module anyway: imports, a component
+declaration and an export, or a full HTML document. Pasted as is into a
+page component that is invalid, so each fragment is reduced to its
+markup and the parts the page needs (imports, scripts, styles) are
+hoisted out.
+"""
+
+import re
+import textwrap
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+IDENTIFIER = r"[A-Za-z_$][\w$]*"
+
+IMPORT = re.compile(r"""^[ \t]*import\b[^;'"]*?(['"])([^'"\n]+)\1[ \t]*;?[ \t]*(?:\n|$)""", re.M)
+NAMED_SPECIFIERS = re.compile(r"\{([^}]*)\}")
+USE_CLIENT = re.compile(r"""^[ \t]*(['"])use client\1[ \t]*;?[ \t]*(?:\n|$)""", re.M)
+EXPORT_DEFAULT_NAME = re.compile(
+    rf"^[ \t]*export\s+default\s+(?!function\b|class\b|async\b)({IDENTIFIER})[ \t]*;?[ \t]*(?:\n|$)", re.M
+)
+EXPORT_PREFIX = re.compile(r"^export\s+(?:default\s+)?(?=(?:async\s+)?function\b|class\b|const\b|let\b|var\b)", re.M)
+# Top-level declarations start in column 0
+DECLARATION = re.compile(
+    rf"^(export\s+default\s+)?(?:export\s+)?(?:async\s+)?"
+    rf"(?:function\s*\*?\s*({IDENTIFIER})|(?:const|let|var|class)\s+({IDENTIFIER}))",
+    re.M
+)
+# What may follow the returned JSX of a component that does nothing else
+COMPONENT_TAIL = re.compile(r"^[\s;)}]*$")
+
+TEMPLATE_OPEN = re.compile(r"<template\b[^>]*>", re.I)
+TEMPLATE_CLOSE = re.compile(r"</template\s*>", re.I)
+SCRIPT_BLOCK = re.compile(r"<script\b([^>]*)>([\s\S]*?)</script\s*>", re.I)
+STYLE_BLOCK = re.compile(r"<style\b[^>]*>[\s\S]*?</style\s*>", re.I)
+LINK_TAG = re.compile(r"<link\b[^>]*>", re.I)
+DOCTYPE = re.compile(r"<!DOCTYPE[^>]*>", re.I)
+HEAD_BLOCK = re.compile(r"<head\b[^>]*>([\s\S]*?)</head\s*>", re.I)
+BODY_BLOCK = re.compile(r"<body\b[^>]*>([\s\S]*?)(?:</body\s*>|$)", re.I)
+HTML_TAGS = re.compile(r"</?html\b[^>]*>", re.I)
+TAILWIND_CDN = "cdn.tailwindcss.com"
+
+
+class JsxFragment(NamedTuple):
+    """
+    One React section
+
+    `body` is bare JSX, or for a standalone fragment the component source
+    (exports removed) declaring `component`, which keeps its own state
+    or helpers and is rendered instead of being inlined.
+    """
+
+    body: str
+    standalone: bool
+    component: Optional[str]
+    declarations: Tuple[str, ...]
+    imports: Tuple[str, ...]
+    react_names: Tuple[str, ...]
+    client: bool
+
+
+def indent(code: str, spaces: int) -> str:
+    prefix = " " * spaces
+    return "\n".join(prefix + line if line.strip() else "" for line in code.splitlines())
+
+
+def clean_block(code: str) -> str:
+    """Drop surrounding blank lines and common indentation"""
+    return textwrap.dedent(code.strip("\n")).strip()
+
+
+def split_imports(code: str) -> Tuple[str, List[str], Set[str]]:
+    """Code without its import statements, the non-React imports, and names imported from react"""
+    imports: List[str] = []
+    react_names: Set[str] = set()
+    for match in IMPORT.finditer(code):
+        if match.group(2) == "react":
+            specifiers = NAMED_SPECIFIERS.search(match.group(0))
+            if specifiers:
+                react_names.update(name.strip() for name in specifiers.group(1).split(",") if name.strip())
+        else:
+            imports.append(match.group(0).strip())
+    return IMPORT.sub("", code), imports, react_names
+
+
+def matching_paren(code: str, start: int) -> Optional[int]:
+    """Index of the parenthesis closing the one at `start`, or None if it is never closed"""
+    depth = 0
+    for index in range(start, len(code)):
+        if code[index] == "(":
+            depth += 1
+        elif code[index] == ")":
+            depth -= 1
+            if depth == 0:
+                return index
+    return None
+
+
+def returned_jsx(code: str, name: str) -> Optional[str]:
+    """
+    The JSX a component returns, if returning it is all the component does
+
+    Handles `function Name() { return (...) }`, `const Name = () => (...)`
+    and `const Name = () => { return ... }`, with or without parentheses
+    around the JSX.
+    """
+    head = re.compile(
+        rf"^(?:function\s+{re.escape(name)}\s*\([^)]*\)\s*\{{\s*return\b"
+        rf"|(?:const|let|var)\s+{re.escape(name)}\s*=\s*(?:\([^)]*\)|{IDENTIFIER})\s*=>\s*(?:\{{\s*return\b)?)\s*",
+        re.M
+    )
+    match = head.search(code)
+    if match is None or code[:match.start()].strip():
+        return None
+    start = match.end()
+    if code.startswith("(", start):
+        end = matching_paren(code, start)
+        if end is None:
+            return None
+        jsx, tail = code[start + 1:end], code[end + 1:]
+    elif code.startswith("<", start):
+        end = code.rfind(">") + 1
+        jsx, tail = code[start:end], code[end:]
+    else:
+        return None
+    jsx = clean_block(jsx)
+    if not jsx.startswith("<") or not COMPONENT_TAIL.match(tail):
+        return None
+    return jsx
+
+
+def reduce_jsx(code: str) -> JsxFragment:
+    """
+    Reduce a React section to bare JSX, or to a standalone component
+
+    Imports are taken out for the page to hoist. A module whose only
+    declaration is a component that just returns JSX is reduced to that
+    JSX. Anything more (hooks, helpers, several components) cannot be
+    inlined, so the module is kept as a standalone component with its
+    exports removed.
+    """
+    client = bool(USE_CLIENT.search(code))
+    code, imports, react_names = split_imports(USE_CLIENT.sub("", code))
+    code = code.strip()
+
+    declarations = [(match.group(2) or match.group(3), bool(match.group(1))) for match in DECLARATION.finditer(code)]
+    if not declarations:
+        # Already bare markup, as the section prompt asks
+        return JsxFragment(clean_block(code), False, None, (), tuple(imports), tuple(sorted(react_names)), client)
+
+    default_export = EXPORT_DEFAULT_NAME.search(code)
+    code = EXPORT_PREFIX.sub("", EXPORT_DEFAULT_NAME.sub("", code)).strip()
+    names = tuple(name for name, _ in declarations)
+    component = (
+        default_export.group(1) if default_export
+        else next((name for name, is_default in declarations if is_default), None)
+        or next((name for name in reversed(names) if name[0].isupper()), names[-1])
+    )
+
+    if len(names) == 1:
+        jsx = returned_jsx(code, component)
+        if jsx is not None:
+            return JsxFragment(jsx, False, None, (), tuple(imports), tuple(sorted(react_names)), client)
+    return JsxFragment(code, True, component, names, tuple(imports), tuple(sorted(react_names)), client)
+
+
+def rename(code: str, old: str, new: str) -> str:
+    """Rename an identifier, leaving property accesses (obj.old) alone"""
+    return re.sub(rf"(?<![\w$.]){re.escape(old)}(?![\w$])", new, code)
+
+
+def unique(items: List[str]) -> List[str]:
+    return list(dict.fromkeys(items))
+
+
+def stitch_jsx(framework: str, fragments: List[Optional[str]]) -> str:
+    """One React (or Next.js) page rendering each section in order"""
+    reduced = {index: reduce_jsx(fragment) for index, fragment in enumerate(fragments, start=1) if fragment is not None}
+
+    # Standalone sections may declare the same names (often all "Component")
+    declared: Dict[str, int] = {}
+    for fragment in reduced.values():
+        for name in fragment.declarations:
+            declared[name] = declared.get(name, 0) + 1
+
+    blocks = []
+    for index in range(1, len(fragments) + 1):
+        fragment = reduced.get(index)
+        if fragment is None:
+            body = f"{{/* Section {index} could not be generated */}}"
+        elif not fragment.standalone:
+            body = fragment.body
+        else:
+            code = fragment.body
+            for name in fragment.declarations:
+                if name == fragment.component:
+                    code = rename(code, name, f"Section{index}")
+                elif declared[name] > 1:
+                    code = rename(code, name, f"{name}{index}")
+            blocks.append(code)
+            continue
+        blocks.append(f"function Section{index}() {{\n  return (\n    <>\n{indent(body, 6)}\n    </>\n  );\n}}")
+
+    react_names = sorted({name for fragment in reduced.values() for name in fragment.react_names})
+    named = f"{{ {', '.join(react_names)} }}" if react_names else ""
+    header: List[str] = []
+    if framework == "react":
+        header.append(f"import React, {named} from 'react';" if named else "import React from 'react';")
+    elif named:
+        header.append(f"import {named} from 'react';")
+    header.extend(unique([line for fragment in reduced.values() for line in fragment.imports]))
+    # Next.js server components cannot use hooks; keep the directive a section asked for
+    directive = "'use client';\n\n" if any(fragment.client for fragment in reduced.values()) else ""
+
+    usages = "\n".join(f"      <Section{index} />" for index in range(1, len(fragments) + 1))
+    return (
+        directive
+        + ("\n".join(header) + "\n\n" if header else "")
+        + "\n\n".join(blocks)
+        + f"\n\nexport default function Page() {{\n  return (\n    <main>\n{usages}\n    </main>\n  );\n}}\n"
+    )
+
+
+def reduce_vue(code: str) -> Tuple[str, Optional[str], Optional[str], List[str]]:
+    """
+    Split a Vue section into template markup, <script setup> body, other script and styles
+
+    Only <script setup> bodies can be merged into the page's; an Options
+    API script is returned separately so the page can say it was left out.
+    """
+    setup: List[str] = []
+    options: List[str] = []
+    for attributes, body in SCRIPT_BLOCK.findall(code):
+        if body.strip():
+            (setup if re.search(r"\bsetup\b", attributes) else options).append(clean_block(body))
+    styles = [block.strip() for block in STYLE_BLOCK.findall(code)]
+
+    opening = TEMPLATE_OPEN.search(code)
+    closings = list(TEMPLATE_CLOSE.finditer(code))
+    if opening and closings and closings[-1].start() > opening.end():
+        markup = code[opening.end():closings[-1].start()]
+    else:
+        markup = STYLE_BLOCK.sub("", SCRIPT_BLOCK.sub("", code))
+    return (
+        clean_block(markup),
+        "\n\n".join(setup) or None,
+        "\n\n".join(options) or None,
+        styles
+    )
+
+
+def stitch_vue(fragments: List[Optional[str]]) -> str:
+    """One single-file component with every section's template, setup script and styles"""
+    sections: List[str] = []
+    scripts: List[str] = []
+    styles: List[str] = []
+    for index, fragment in enumerate(fragments, start=1):
+        if fragment is None:
+            sections.append(f"<!-- Section {index} could not be generated -->")
+            continue
+        markup, setup, options, section_styles = reduce_vue(fragment)
+        if options:
+            markup = f"<!-- Section {index}: its Options API script was not merged -->\n{markup}"
+        sections.append(f"<section data-section=\"{index}\">\n{indent(markup, 2)}\n</section>")
+        if setup:
+            scripts.append(setup)
+        styles.extend(section_styles)
+
+    # Imports go first, once each, ahead of every section's setup code
+    body, imports, _ = split_imports("\n\n".join(scripts))
+    script = "\n\n".join(part for part in ("\n".join(unique(imports)), body.strip()) if part)
+    markup = indent("\n".join(sections), 4)
+    page = f"<template>\n  <main>\n{markup}\n  </main>\n</template>\n\n"
+    page += f"<script setup>\n{script}\n</script>\n" if script else "<script setup>\n</script>\n"
+    for style in unique(styles):
+        page += f"\n{style}\n"
+    return page
+
+
+def reduce_html(code: str) -> Tuple[str, List[str]]:
+    """
+    Body markup of an HTML section and the head assets it relies on
+
+    A full document is cut down to its <body>; <style>, <link> and
+    <script> elements from its <head> are returned for the page's head.
+    """
+    code = DOCTYPE.sub("", code)
+    assets: List[str] = []
+    head = HEAD_BLOCK.search(code)
+    if head:
+        contents = head.group(1)
+        blocks = [(match.start(), match.group(0)) for pattern in (STYLE_BLOCK, LINK_TAG) for match in pattern.finditer(contents)]
+        blocks += [(match.start(), match.group(0)) for match in SCRIPT_BLOCK.finditer(contents)]
+        assets = [block.strip() for _, block in sorted(blocks)]
+        code = code[:head.start()] + code[head.end():]
+    body = BODY_BLOCK.search(code)
+    markup = body.group(1) if body else HTML_TAGS.sub("", code)
+    return clean_block(markup), assets
+
+
+def stitch_html(framework: str, fragments: List[Optional[str]]) -> str:
+    """One HTML document with each section's body markup and head assets"""
+    sections: List[str] = []
+    assets: List[str] = []
+    for index, fragment in enumerate(fragments, start=1):
+        if fragment is None:
+            sections.append(f"  <!-- Section {index} could not be generated -->")
+            continue
+        markup, section_assets = reduce_html(fragment)
+        sections.append(f"  <section data-section=\"{index}\">\n{indent(markup, 4)}\n  </section>")
+        assets.extend(section_assets)
+
+    head = []
+    if framework == "tailwind":
+        head.append(f'<script src="https://{TAILWIND_CDN}"></script>')
+    head.extend(asset for asset in unique(assets) if TAILWIND_CDN not in asset)
+    head_markup = "".join(f"{indent(asset, 2)}\n" for asset in head)
+    return (
+        "<!DOCTYPE html>\n<html lang=\"en\">\n<head>\n"
+        "  <meta charset=\"UTF-8\">\n"
+        "  <meta name=\"viewport\" content=\"width=device-width, initial-scale=1.0\">\n"
+        f"{head_markup}</head>\n<body>\n<main>\n" + "\n".join(sections) + "\n</main>\n</body>\n</html>\n"
+    )
@@ -0,0 +1,79 @@
+"""
+Single Flight
+Coalesces concurrent identical calls onto one shared upstream task
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+
+class Flight:
+    """One shared in-flight call and the number of callers awaiting it"""
+
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time
+
+    The first caller for a key starts the call as a separate task and
+    later callers with the same key await that task instead of starting
+    their own. Each caller awaits through asyncio.shield, so a caller that
+    is cancelled (its client disconnected) only stops waiting; the shared
+    task keeps running for the others and is cancelled once the last
+    caller has gone. Exceptions are delivered to every caller.
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, Flight] = {}
+        self.leaders = 0
+        self.coalesced = 0
+        self.cancelled = 0
+
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Await the in-flight call for `key`, starting it with `func` if there is none
+
+        Args:
+            key: Identity of the call; equal keys must produce equal results
+            func: Zero-argument coroutine function making the upstream call
+
+        Returns:
+            The shared result, which callers must not mutate
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = Flight(asyncio.ensure_future(func()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+            self.leaders += 1
+        else:
+            self.coalesced += 1
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # Nobody is left to use the result; later callers start afresh
+                self._forget(key, flight)
+                flight.task.cancel()
+                self.cancelled += 1
+
+    def _forget(self, key: str, flight: Flight) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "in_flight": len(self._flights),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "cancelled": self.cancelled
+        }
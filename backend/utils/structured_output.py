@@ -0,0 +1,54 @@
+"""
+Structured Output
+Asks a model for JSON matching a schema, natively or through the prompt
+"""
+
+import json
+from typing import Any, Dict, Optional, Tuple
+
+# Appended to the prompt for providers without a response_format equivalent
+SCHEMA_INSTRUCTION = "\n\nRespond with only JSON matching this schema:\n"
+
+# OpenAI models that accept a json_schema response_format; older ones
+# (gpt-4-vision-preview, gpt-4-turbo, gpt-3.5) reject it outright
+JSON_SCHEMA_MODEL_PREFIXES = ("gpt-4o", "gpt-4.1", "gpt-5", "o1", "o3", "o4")
+JSON_SCHEMA_UNSUPPORTED = ("gpt-4o-2024-05-13", "chatgpt-4o-latest")
+
+
+def supports_json_schema(model: str) -> bool:
+    return model.startswith(JSON_SCHEMA_MODEL_PREFIXES) and not model.startswith(JSON_SCHEMA_UNSUPPORTED)
+
+
+def openai_response_format(schema: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Strict JSON-schema response_format arguments for chat.completions.create, or none"""
+    if schema is None:
+        return {}
+    return {
+        "response_format": {
+            "type": "json_schema",
+            "json_schema": {"name": schema.get("title", "response"), "schema": schema, "strict": True}
+        }
+    }
+
+
+def openai_structured(model: str, prompt: str, schema: Optional[Dict[str, Any]]) -> Tuple[str, Dict[str, Any]]:
+    """
+    Prompt and extra create() arguments asking an OpenAI model for `schema`
+
+    Models with structured outputs get a strict response_format; the rest
+    get the schema spelled out in the prompt, as other providers do.
+    """
+    if schema is not None and not supports_json_schema(model):
+        return schema_prompt(prompt, schema), {}
+    return prompt, openai_response_format(schema)
+
+
+def schema_prompt(prompt: str, schema: Optional[Dict[str, Any]]) -> str:
+    """The prompt with the schema spelled out, for providers that cannot enforce it"""
+    return prompt if schema is None else f"{prompt}{SCHEMA_INSTRUCTION}{json.dumps(schema)}"
+
+
+def split_schema_prompt(text: str) -> Tuple[str, bool]:
+    """Inverse of schema_prompt: the original prompt and whether a schema was appended"""
+    prompt, instruction, _ = text.partition(SCHEMA_INSTRUCTION)
+    return prompt, bool(instruction)
@@ -0,0 +1,360 @@
+"""
+Typography
+Estimates text sizes, weights and line heights locally from a screenshot
+"""
+
+import io
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image, ImageChops, ImageFilter
+
+BACKGROUND_REDUCE = 4  # the local background is estimated at 1/4 resolution
+BACKGROUND_RADIUS = 3  # box blur radius at that resolution (about 12px full size)
+MIN_INK_CONTRAST = 24  # floor for the Otsu threshold on the contrast map
+MAX_TEXT_RUN = 48  # longer horizontal ink runs are rules and borders, not glyphs
+MIN_X_HEIGHT = 3
+MAX_X_HEIGHT = 160
+MIN_WEIGHT_X_HEIGHT = 5  # below this antialiasing swamps the stroke width
+X_HEIGHT_RATIO = 0.53  # x-height / font size for common UI sans-serif faces
+LEVEL_RATIO = 1.15  # sizes within this ratio of each other share a level
+SPLIT_DEPTH = 4
+
+ANTIALIAS_WIDTH = 1.0  # pixels the contrast mask adds to every stroke
+
+# (stroke width - antialiasing) / x-height upper bounds for each weight class
+WEIGHT_CLASSES = [
+    (0.12, "light", 300),
+    (0.21, "normal", 400),
+    (0.25, "medium", 500),
+    (0.28, "semibold", 600),
+    (float("inf"), "bold", 700)
+]
+
+DEFAULT_BODY = {"size": "16px", "weight": "normal", "font": "sans-serif", "line_height": "1.5"}
+
+
+def estimate_typography_from_bytes(data: bytes, scale: float = 1.0) -> Dict[str, Any]:
+    """
+    Decode an encoded image and estimate its typography
+
+    Module-level so it can run in the image executor.
+
+    Args:
+        data: Encoded image bytes
+        scale: Factor from these pixels back to the original upload's pixels
+
+    Returns:
+        Typography details, see `estimate_typography`
+    """
+    return estimate_typography(Image.open(io.BytesIO(data)), scale)
+
+
+def estimate_page_typography_from_bytes(sections: List[Tuple[bytes, float]]) -> Dict[str, Any]:
+    """
+    Estimate typography over a page that was cut into sections
+
+    Module-level so it can run in the image executor. Lines are measured in
+    each section's pixels, then moved into the first section's pixels before
+    clustering, so sections downscaled by different amounts share levels and
+    paragraphs keep their line spacing. A single section gives the same
+    result as `estimate_typography_from_bytes`.
+
+    Args:
+        sections: (encoded image bytes, scale back to original pixels) from top to bottom
+
+    Returns:
+        Typography details for the whole page, see `estimate_typography`
+    """
+    page_scale = sections[0][1]
+    lines = []
+    top = 0.0
+    for data, scale in sections:
+        image = Image.open(io.BytesIO(data))
+        relative = scale / page_scale
+        for line in measure_lines(image):
+            lines.append({
+                "x_height": line["x_height"] * relative,
+                # Keeps (stroke - antialiasing) / x-height, which decides the weight
+                "stroke": (line["stroke"] - ANTIALIAS_WIDTH) * relative + ANTIALIAS_WIDTH,
+                "baseline": top + line["baseline"] * relative,
+                "left": line["left"] * relative,
+                "width": line["width"] * relative
+            })
+        top += image.height * relative
+    return summarise(lines, page_scale)
+
+
+def estimate_typography(image: Image.Image, scale: float = 1.0) -> Dict[str, Any]:
+    """
+    Estimate typography from a UI screenshot
+
+    Text is found by binarising local contrast (so dark-on-light and
+    light-on-dark text are both ink), removing long rules, and splitting
+    the ink into lines with alternating horizontal and vertical projection
+    profiles. Each line yields an x-height, a stroke width and a baseline;
+    lines are then clustered by size into body, heading and small levels.
+
+    Args:
+        image: Screenshot to analyse
+        scale: Factor from these pixels back to the original upload's pixels
+
+    Returns:
+        Headings, body and small text levels with sizes in original pixels
+    """
+    return summarise(measure_lines(image), scale)
+
+
+def measure_lines(image: Image.Image) -> List[Dict[str, float]]:
+    """Every text line found in a screenshot, see `measure_line`"""
+    mask = ink_mask(image)
+    return [line for line in (measure_line(mask, box) for box in split_regions(mask)) if line is not None]
+
+
+def ink_mask(image: Image.Image) -> np.ndarray:
+    """
+    Binary mask of text-like ink
+
+    Args:
+        image: Image to binarise
+
+    Returns:
+        Boolean array, True where a pixel stands out from its surroundings
+    """
+    gray = image.convert("L")
+    # The background is smooth, so blur a reduced copy and scale it back up
+    background = gray.reduce(BACKGROUND_REDUCE).filter(ImageFilter.BoxBlur(BACKGROUND_RADIUS))
+    background = background.resize(gray.size, Image.Resampling.BILINEAR)
+    contrast = ImageChops.difference(gray, background)
+    threshold = max(MIN_INK_CONTRAST, otsu_threshold(contrast.histogram()))
+    return remove_long_runs(np.asarray(contrast) > threshold, MAX_TEXT_RUN)
+
+
+def otsu_threshold(histogram: List[int]) -> int:
+    """Otsu's threshold for a 256-bin histogram"""
+    histogram = np.asarray(histogram, dtype=np.float64)
+    levels = np.arange(256)
+    weight_low = np.cumsum(histogram)
+    weight_high = weight_low[-1] - weight_low
+    sum_low = np.cumsum(histogram * levels)
+    mean_low = sum_low / np.maximum(weight_low, 1)
+    mean_high = (sum_low[-1] - sum_low) / np.maximum(weight_high, 1)
+    between = weight_low * weight_high * (mean_low - mean_high) ** 2
+    return int(between.argmax())
+
+
+def remove_long_runs(mask: np.ndarray, max_run: int) -> np.ndarray:
+    """
+    Clear horizontal runs of True longer than `max_run`
+
+    Borders, dividers and underlines form long runs; glyph strokes do not.
+    """
+    height, width = mask.shape
+    padded = np.zeros((height, width + 2), dtype=np.int8)
+    padded[:, 1:-1] = mask
+    # Edges index a (height, width + 1) grid; a run never crosses a row
+    edges = np.diff(padded, axis=1).ravel()
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    long_runs = np.flatnonzero(ends - starts > max_run)
+    if long_runs.size == 0:
+        return mask
+
+    mask = mask.copy()
+    for start, end in zip(starts[long_runs].tolist(), ends[long_runs].tolist()):
+        row, column = divmod(start, width + 1)
+        mask[row, column:column + end - start] = False
+    return mask
+
+
+def runs(profile: np.ndarray, max_gap: int) -> List[Tuple[int, int]]:
+    """
+    Spans of a 1-D boolean profile, merging gaps of at most `max_gap`
+
+    Returns:
+        (start, end) pairs with end exclusive
+    """
+    indices = np.flatnonzero(profile)
+    if indices.size == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(indices) > max_gap + 1)
+    starts = np.concatenate([[indices[0]], indices[breaks + 1]])
+    ends = np.concatenate([indices[breaks], [indices[-1]]]) + 1
+    return list(zip(starts.tolist(), ends.tolist()))
+
+
+def split_regions(mask: np.ndarray) -> List[Tuple[int, int, int, int]]:
+    """
+    Split an ink mask into single text lines
+
+    Alternates row and column projection cuts (a recursive XY-cut) until
+    each region is one line of text or the depth limit is reached.
+
+    Returns:
+        (top, bottom, left, right) boxes
+    """
+    boxes = []
+    stack = [(0, mask.shape[0], 0, mask.shape[1], 0)]
+    while stack:
+        top, bottom, left, right, depth = stack.pop()
+        region = mask[top:bottom, left:right]
+        bands = runs(region.any(axis=1), 1)
+        if len(bands) > 1 and depth < SPLIT_DEPTH:
+            stack.extend((top + start, top + end, left, right, depth + 1) for start, end in bands)
+            continue
+        if not bands:
+            continue
+        start, end = bands[0]
+        top, bottom = top + start, top + end
+        # Word gaps are well under one line height; wider gaps separate columns
+        columns = runs(mask[top:bottom, left:right].any(axis=0), max(2, bottom - top))
+        if len(columns) > 1 and depth < SPLIT_DEPTH:
+            stack.extend((top, bottom, left + start, left + end, depth + 1) for start, end in columns)
+            continue
+        boxes.extend((top, bottom, left + start, left + end) for start, end in columns)
+    return boxes
+
+
+def measure_line(mask: np.ndarray, box: Tuple[int, int, int, int]) -> Optional[Dict[str, float]]:
+    """
+    Measure one text line, or None if the region does not look like text
+
+    Args:
+        mask: Ink mask
+        box: (top, bottom, left, right) of the line
+
+    Returns:
+        x-height, stroke width, baseline, left edge and width in mask pixels
+    """
+    top, bottom, left, right = box
+    region = mask[top:bottom, left:right]
+    height, width = region.shape
+    ink = int(region.sum())
+    if height < MIN_X_HEIGHT or ink == 0:
+        return None
+
+    # The x-height band holds the densest rows; ascenders and descenders are
+    # sparse. Compare against the 75th percentile, not the peak, so serif feet
+    # and crossbars do not shrink the band
+    density = region.sum(axis=1)
+    core = runs(density >= np.percentile(density, 75) * 0.5, 0)
+    core_start, core_end = max(core, key=lambda span: span[1] - span[0])
+    x_height = core_end - core_start
+    if not MIN_X_HEIGHT <= x_height <= MAX_X_HEIGHT or width < x_height * 1.5:
+        return None
+
+    fill = ink / (height * width)
+    horizontal_runs = int((region[:, 1:] & ~region[:, :-1]).sum() + region[:, 0].sum())
+    if not 0.05 <= fill <= 0.75 or horizontal_runs < height:
+        return None
+
+    return {
+        "x_height": float(x_height),
+        "stroke": ink / horizontal_runs,
+        "baseline": float(top + core_end),
+        "left": float(left),
+        "width": float(width)
+    }
+
+
+def weight_class(stroke_ratio: float) -> Tuple[str, int]:
+    """Map stroke width / x-height to a named weight and numeric weight"""
+    for bound, name, numeric in WEIGHT_CLASSES:
+        if stroke_ratio < bound:
+            return name, numeric
+    return WEIGHT_CLASSES[-1][1], WEIGHT_CLASSES[-1][2]
+
+
+def weighted_median(values: np.ndarray, weights: np.ndarray) -> float:
+    order = np.argsort(values)
+    cumulative = np.cumsum(weights[order])
+    return float(values[order][np.searchsorted(cumulative, cumulative[-1] / 2)])
+
+
+def line_height_ratio(lines: List[Dict[str, float]]) -> Optional[float]:
+    """
+    Median baseline-to-baseline distance over font size for stacked lines
+
+    Only consecutive lines sharing a left edge and a similar x-height are
+    treated as one paragraph.
+    """
+    ordered = sorted(lines, key=lambda line: (line["left"], line["baseline"]))
+    ratios = []
+    for upper, lower in zip(ordered, ordered[1:]):
+        size = upper["x_height"] / X_HEIGHT_RATIO
+        gap = lower["baseline"] - upper["baseline"]
+        if abs(upper["left"] - lower["left"]) <= upper["x_height"] and 0.9 * size <= gap <= 2.5 * size:
+            ratios.append(gap / size)
+    return float(np.median(ratios)) if ratios else None
+
+
+def summarise(lines: List[Dict[str, float]], scale: float) -> Dict[str, Any]:
+    """Cluster measured lines into typography levels"""
+    if not lines:
+        return {"headings": [], "body": dict(DEFAULT_BODY), "small": [], "lines_detected": 0}
+
+    # Group sorted sizes wherever the step between neighbours exceeds LEVEL_RATIO
+    lines = sorted(lines, key=lambda line: line["x_height"])
+    groups = [[lines[0]]]
+    for line in lines[1:]:
+        if line["x_height"] > groups[-1][-1]["x_height"] * LEVEL_RATIO:
+            groups.append([])
+        groups[-1].append(line)
+
+    levels = []
+    for group in groups:
+        widths = np.array([line["width"] for line in group])
+        x_height = weighted_median(np.array([line["x_height"] for line in group]), widths)
+        strokes = np.array([(line["stroke"] - ANTIALIAS_WIDTH) / line["x_height"] for line in group])
+        stroke_ratio = weighted_median(strokes, widths)
+        weight, numeric_weight = weight_class(stroke_ratio) if x_height >= MIN_WEIGHT_X_HEIGHT else ("normal", 400)
+        levels.append({
+            "size": f"{round(x_height / X_HEIGHT_RATIO * scale)}px",
+            "weight": weight,
+            "font_weight": numeric_weight,
+            "font": "sans-serif",
+            "x_height": f"{round(x_height * scale)}px",
+            "lines": len(group),
+            "_amount": float(widths.sum()),
+            "_lines": group
+        })
+
+    # Body text is the level covering the most line width
+    body_index = max(range(len(levels)), key=lambda index: levels[index]["_amount"])
+    body = levels[body_index]
+    ratio = line_height_ratio(body["_lines"])
+    body["line_height"] = f"{ratio:.2f}".rstrip("0").rstrip(".") if ratio else DEFAULT_BODY["line_height"]
+
+    for level in levels:
+        del level["_amount"], level["_lines"]
+
+    headings = levels[body_index + 1:][::-1][:6]
+    for index, heading in enumerate(headings, start=1):
+        heading["level"] = f"h{index}"
+    small = levels[:body_index][::-1]
+
+    return {
+        "headings": [{"level": heading.pop("level"), **heading} for heading in headings],
+        "body": body,
+        "small": small,
+        "lines_detected": len(lines)
+    }
+
+
+def typography_hint(typography: Dict[str, Any]) -> str:
+    """
+    One-paragraph prompt hint describing measured typography
+
+    Args:
+        typography: Output of `estimate_typography`
+
+    Returns:
+        Hint text, empty when no text was detected
+    """
+    if not typography.get("lines_detected"):
+        return ""
+    body = typography["body"]
+    parts = [f"body text {body['size']} {body['weight']} with line-height {body['line_height']}"]
+    parts.extend(f"{heading['level']} {heading['size']} {heading['weight']}" for heading in typography["headings"])
+    parts.extend(f"small text {level['size']} {level['weight']}" for level in typography["small"][:2])
+    return "Measured typography (in image pixels): " + "; ".join(parts) + "."
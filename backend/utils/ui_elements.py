@@ -0,0 +1,231 @@
+"""
+UI Elements
+Structured-output schema, typed records and an incremental parser for extracted UI elements
+"""
+
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+STYLE_KEYS = ("background", "color", "fontSize", "fontWeight", "fontFamily", "border", "borderRadius", "padding")
+
+# JSON schema for structured output. OpenAI's strict mode needs an object root,
+# every property required and no extra keys, so absent styles are null.
+ELEMENTS_SCHEMA: Dict[str, Any] = {
+    "title": "ui_elements",
+    "type": "object",
+    "properties": {
+        "elements": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "type": {"type": "string"},
+                    "position": {
+                        "type": "object",
+                        "properties": {"x": {"type": "number"}, "y": {"type": "number"}},
+                        "required": ["x", "y"],
+                        "additionalProperties": False
+                    },
+                    "size": {
+                        "type": "object",
+                        "properties": {"width": {"type": "number"}, "height": {"type": "number"}},
+                        "required": ["width", "height"],
+                        "additionalProperties": False
+                    },
+                    "content": {"type": ["string", "null"]},
+                    "styling": {
+                        "type": "object",
+                        "properties": {key: {"type": ["string", "null"]} for key in STYLE_KEYS},
+                        "required": list(STYLE_KEYS),
+                        "additionalProperties": False
+                    }
+                },
+                "required": ["type", "position", "size", "content", "styling"],
+                "additionalProperties": False
+            }
+        }
+    },
+    "required": ["elements"],
+    "additionalProperties": False
+}
+
+_STRING_END = re.compile(r'["\\]')
+_STRUCTURAL = re.compile(r'["\[\]{}]')
+
+
+def percent(value: Any, name: str) -> float:
+    """A coordinate as a percentage of the image, clamped to 0-100"""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"Element {name} is not a number")
+    return round(min(100.0, max(0.0, float(value))), 2)
+
+
+class UIElement:
+    """
+    One validated UI element
+
+    Coordinates are percentages of the image; styling keeps only the
+    properties that were set, as (name, value) pairs.
+    """
+
+    __slots__ = ("type", "x", "y", "width", "height", "content", "styling")
+
+    def __init__(
+        self,
+        type: str,
+        x: float,
+        y: float,
+        width: float,
+        height: float,
+        content: Optional[str] = None,
+        styling: Tuple[Tuple[str, str], ...] = ()
+    ):
+        self.type = type
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.content = content
+        self.styling = styling
+
+    @classmethod
+    def from_json(cls, item: Any) -> "UIElement":
+        """
+        Validate one decoded array item
+
+        Raises:
+            ValueError: If the item is not an element with a type, position and size
+        """
+        if not isinstance(item, dict):
+            raise ValueError("Element is not an object")
+        kind = item.get("type")
+        if not isinstance(kind, str) or not kind.strip():
+            raise ValueError("Element has no type")
+        position = item.get("position")
+        size = item.get("size")
+        if not isinstance(position, dict) or not isinstance(size, dict):
+            raise ValueError("Element has no position or size")
+
+        content = item.get("content")
+        styling = item.get("styling")
+        styles = tuple(
+            (name, str(value))
+            for name, value in (styling.items() if isinstance(styling, dict) else ())
+            if isinstance(value, (str, int, float)) and not isinstance(value, bool) and value != ""
+        )
+        return cls(
+            kind.strip().lower(),
+            percent(position.get("x"), "x"),
+            percent(position.get("y"), "y"),
+            percent(size.get("width"), "width"),
+            percent(size.get("height"), "height"),
+            content if isinstance(content, str) and content else None,
+            styles
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        element: Dict[str, Any] = {
+            "type": self.type,
+            "position": {"x": self.x, "y": self.y},
+            "size": {"width": self.width, "height": self.height}
+        }
+        if self.content is not None:
+            element["content"] = self.content
+        element["styling"] = dict(self.styling)
+        return element
+
+
+class ElementArrayParser:
+    """
+    Pulls complete elements out of a streamed JSON array, chunk by chunk
+
+    The first array in the text is the element list, whether it is the
+    "elements" member of the structured-output object or a bare array
+    (providers without schema support); text around it, such as a
+    Markdown fence, is skipped. Each item is decoded and validated as
+    soon as its closing brace arrives. The scan jumps between structural
+    characters with a regex, so it is linear in the response, and only
+    the unfinished item is kept in memory. Items that fail validation
+    are counted in `rejected` and dropped.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0  # next index of _buffer to scan
+        self._depth = 0  # nesting inside the element array; 1 is between items
+        self._in_string = False
+        self._item_start: Optional[int] = None
+        self.done = False  # the array was closed, so nothing was cut off
+        self.rejected = 0
+
+    def feed(self, text: str) -> List[UIElement]:
+        """Add streamed text and return the elements it completed"""
+        if self.done:
+            return []
+        buffer = self._buffer + text
+        pos = self._pos
+        elements: List[UIElement] = []
+
+        while True:
+            if self._in_string:
+                match = _STRING_END.search(buffer, pos)
+                if match is None:
+                    pos = len(buffer)
+                    break
+                if match.group() == "\\":
+                    if match.end() >= len(buffer):
+                        # The escaped character is in the next chunk
+                        pos = match.start()
+                        break
+                    pos = match.end() + 1
+                    continue
+                self._in_string = False
+                pos = match.end()
+                continue
+
+            match = _STRUCTURAL.search(buffer, pos)
+            if match is None:
+                pos = len(buffer)
+                break
+            char = match.group()
+            pos = match.end()
+            if char == '"':
+                self._in_string = True
+            elif char in "[{":
+                if self._depth == 1 and char == "{":
+                    self._item_start = match.start()
+                if self._depth or char == "[":
+                    self._depth += 1
+            elif self._depth:
+                self._depth -= 1
+                if self._depth == 1 and self._item_start is not None:
+                    element = self._decode(buffer[self._item_start:pos])
+                    if element is not None:
+                        elements.append(element)
+                    self._item_start = None
+                elif self._depth == 0:
+                    self.done = True
+                    break
+
+        # Keep only the unfinished item, or nothing
+        keep = self._item_start if self._item_start is not None else pos
+        self._buffer = buffer[keep:]
+        self._pos = pos - keep
+        if self._item_start is not None:
+            self._item_start = 0
+        return elements
+
+    def _decode(self, fragment: str) -> Optional[UIElement]:
+        try:
+            return UIElement.from_json(json.loads(fragment))
+        except ValueError:
+            self.rejected += 1
+            return None
+
+
+def parse_elements(content: str) -> Tuple[List[UIElement], int]:
+    """Elements in a complete response, and how many items were rejected"""
+    parser = ElementArrayParser()
+    elements = parser.feed(content)
+    return elements, parser.rejected